@@ -0,0 +1,260 @@
+"""
+Заказы для администратора прямо в боте
+
+/orders открывает список заказов с inline-клавиатурой: фильтр по статусу,
+листание страниц и карточка заказа с кнопками смены статуса. Страницы
+листаются по ключу (created_at, id) последнего показанного заказа, а не
+через OFFSET, поэтому сотая страница стоит столько же, сколько первая. Вся
+страница — один запрос с JOIN пользователя и плана, без ленивых загрузок.
+
+Статус меняется через transition_order с версией, которую видел
+администратор: если заказ успели изменить или его держит оператор в
+очереди (work_queue.py), смены не будет. Уведомление покупателю и
+освобождение места в семье — как в админке (after_staff_transition).
+"""
+
+import logging
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import aliased, joinedload
+
+from app import app
+from config import ADMIN_ID, ADMIN_ORDERS_PAGE_SIZE
+from messages import text, user_locale, plan_title
+from models import db, Order, OrderStatus, SubscriptionPlan, User, ORDER_TRANSITIONS
+from transitions import transition_order, TransitionConflict, after_staff_transition
+from work_queue import not_claimed_by_other, release_values
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_PREFIX = "ao:"
+ALL = '-'
+# Короткие коды статусов: callback_data ограничена 64 байтами
+STATUS_CODES = {
+    OrderStatus.CREATED: 'c',
+    OrderStatus.AWAITING_PAYMENT: 'w',
+    OrderStatus.PAID: 'p',
+    OrderStatus.PROCESSING: 'r',
+    OrderStatus.COMPLETED: 'd',
+    OrderStatus.CANCELLED: 'x',
+    OrderStatus.REFUNDED: 'f',
+}
+CODE_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+FILTERS_PER_ROW = 4
+
+PAGE_COLUMNS = (
+    Order.id, Order.status, Order.total_amount, Order.created_at, Order.user_id,
+    User.first_name, User.username, Order.plan_id, SubscriptionPlan.name.label('plan_name'),
+)
+
+
+def _callback(action, status_code, order_id='', *extra):
+    return ':'.join(('ao', action, status_code, order_id, *map(str, extra)))
+
+
+def _date(value):
+    return value.strftime('%d.%m.%Y %H:%M') if value else '—'
+
+
+def _status(status, locale):
+    return text(f'status_{status.value}', locale)
+
+
+def _name(first_name, username, user_id, locale):
+    if username:
+        return text('user_label', locale, first_name=first_name or '', username=username)
+    return first_name or str(user_id)
+
+
+def _page_query(status, cursor_id, direction, limit):
+    """Страница заказов: direction 'older', 'newer' или 'at' относительно cursor_id"""
+    query = (select(*PAGE_COLUMNS)
+             .join(User, User.id == Order.user_id)
+             .join(SubscriptionPlan, SubscriptionPlan.id == Order.plan_id))
+    if status is not None:
+        query = query.where(Order.status == status)
+    newest_first = (Order.created_at.desc(), Order.id.desc())
+    if cursor_id is None:
+        return query.order_by(*newest_first).limit(limit)
+
+    # Ключ заказа-курсора берется подзапросом по первичному ключу
+    cursor = aliased(Order)
+    cursor_key = tuple_(
+        select(cursor.created_at).where(cursor.id == cursor_id).scalar_subquery(), cursor_id
+    )
+    key = tuple_(Order.created_at, Order.id)
+    if direction == 'newer':
+        return query.where(key > cursor_key).order_by(Order.created_at, Order.id).limit(limit)
+    condition = key <= cursor_key if direction == 'at' else key < cursor_key
+    return query.where(condition).order_by(*newest_first).limit(limit)
+
+
+def load_page(status=None, cursor_id=None, direction='older', page_size=ADMIN_ORDERS_PAGE_SIZE):
+    """Заказы страницы и есть ли страницы новее и старше"""
+    rows = db.session.execute(_page_query(status, cursor_id, direction, page_size + 1)).all()
+    if direction == 'newer':
+        if len(rows) <= page_size:
+            # Дошли до самых новых: показываем первую страницу целиком
+            return load_page(status, page_size=page_size)
+        return list(reversed(rows[:page_size])), True, True
+    has_older = len(rows) > page_size
+    has_newer = cursor_id is not None and direction == 'older'
+    if direction == 'at' and rows:
+        # Страница начинается с заказа-курсора; новее он или нет, скажет первая строка
+        first = select(Order.id).where(tuple_(Order.created_at, Order.id) > (rows[0].created_at, rows[0].id))
+        if status is not None:
+            first = first.where(Order.status == status)
+        has_newer = db.session.execute(first.limit(1)).first() is not None
+    return rows[:page_size], has_newer, has_older
+
+
+def render_page(rows, has_newer, has_older, status, locale):
+    """Текст и клавиатура страницы списка"""
+    status_code = STATUS_CODES[status] if status is not None else ALL
+    filter_label = _status(status, locale) if status is not None else text('filter_all', locale)
+    if rows:
+        lines = [text('admin_orders_header', locale, filter=filter_label)]
+        lines.extend(
+            text('admin_order_line', locale, order_id=row.id, status=_status(row.status, locale),
+                 amount=row.total_amount, plan_name=plan_title(row.plan_id, row.plan_name, locale),
+                 name=_name(row.first_name, row.username, row.user_id, locale), created=_date(row.created_at))
+            for row in rows
+        )
+        page_text = '\n\n'.join(lines)
+    else:
+        page_text = text('admin_orders_empty', locale)
+
+    filters = [(ALL, text('filter_all', locale))]
+    filters.extend((code, _status(option, locale)) for option, code in STATUS_CODES.items())
+    filter_buttons = [
+        InlineKeyboardButton(text=f"• {label}" if code == status_code else label,
+                             callback_data=_callback('l', code))
+        for code, label in filters
+    ]
+    keyboard = [filter_buttons[i:i + FILTERS_PER_ROW] for i in range(0, len(filter_buttons), FILTERS_PER_ROW)]
+    keyboard.extend(
+        [InlineKeyboardButton(
+            text=text('btn_order_row', locale, order_id=row.id, status=_status(row.status, locale),
+                      amount=row.total_amount),
+            callback_data=_callback('o', status_code, row.id)
+        )]
+        for row in rows
+    )
+    navigation = []
+    if has_newer:
+        navigation.append(InlineKeyboardButton(text=text('btn_first_page', locale),
+                                               callback_data=_callback('l', status_code)))
+        navigation.append(InlineKeyboardButton(text=text('btn_newer', locale),
+                                               callback_data=_callback('p', status_code, rows[0].id)))
+    if has_older:
+        navigation.append(InlineKeyboardButton(text=text('btn_older', locale),
+                                               callback_data=_callback('n', status_code, rows[-1].id)))
+    if navigation:
+        keyboard.append(navigation)
+    return page_text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def load_order(order_id):
+    """Заказ вместе с пользователем и планом, одним запросом"""
+    return db.session.execute(
+        select(Order)
+        .options(joinedload(Order.user), joinedload(Order.subscription_plan))
+        .where(Order.id == order_id)
+    ).scalar()
+
+
+def render_order(order, status_code, locale):
+    """Карточка заказа с кнопками допустимых переходов статуса"""
+    user = order.user
+    plan = order.subscription_plan
+    detail = text(
+        'admin_order_detail', locale, order_id=order.id, status=_status(order.status, locale),
+        name=_name(user.first_name, user.username, user.id, locale), user_id=user.id,
+        plan_name=plan_title(plan.id, plan.name, locale), amount=order.total_amount,
+        login=order.spotify_login or '—', created=_date(order.created_at), updated=_date(order.updated_at),
+        notes=order.admin_notes or '—',
+    )
+    targets = [status for status in STATUS_CODES if status in ORDER_TRANSITIONS.get(order.status, ())]
+    keyboard = [
+        [InlineKeyboardButton(text=text('btn_set_status', locale, status=_status(target, locale)),
+                              callback_data=_callback('s', status_code, order.id, STATUS_CODES[target],
+                                                      order.version))]
+        for target in targets
+    ]
+    keyboard.append([
+        InlineKeyboardButton(text=text('btn_to_orders', locale), callback_data=_callback('a', status_code, order.id)),
+        InlineKeyboardButton(text=text('btn_refresh', locale), callback_data=_callback('o', status_code, order.id)),
+    ])
+    return detail, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def change_status(order_id, new_status, version):
+    """Сменить статус заказа из бота; None, если заказ изменили или занял оператор"""
+    try:
+        # Оператор в админке у бота не заведен: заказ, который держит оператор, не трогаем
+        changed = transition_order(db.session, order_id, new_status, expected_version=version,
+                                   conditions=(not_claimed_by_other(None),), **release_values())
+    except TransitionConflict:
+        db.session.rollback()
+        return None
+    after_staff_transition(db.session, changed)
+    db.session.commit()
+    return changed
+
+
+async def _show(message, screen_text, keyboard):
+    try:
+        await message.edit_text(screen_text, reply_markup=keyboard, parse_mode="Markdown")
+    except TelegramBadRequest as e:
+        if 'message is not modified' not in str(e):
+            raise
+
+
+async def cmd_admin_orders(message: types.Message):
+    """Команда /orders: список заказов (только для администратора)"""
+    if message.from_user.id != ADMIN_ID:
+        return
+    locale = user_locale(message.from_user)
+    with app.app_context():
+        page_text, keyboard = render_page(*load_page(), None, locale)
+    await message.answer(page_text, reply_markup=keyboard, parse_mode="Markdown")
+
+
+async def handle_admin_orders_callback(callback_query: types.CallbackQuery):
+    """Кнопки списка и карточки заказа"""
+    if callback_query.from_user.id != ADMIN_ID or callback_query.message is None:
+        await callback_query.answer()
+        return
+    parts = callback_query.data.split(':')
+    action, status_code = parts[1], parts[2]
+    order_id = parts[3] if len(parts) > 3 and parts[3] else None
+    status = CODE_STATUSES.get(status_code)
+    locale = user_locale(callback_query.from_user)
+    alert = None
+
+    with app.app_context():
+        if action == 's':
+            changed = change_status(order_id, CODE_STATUSES[parts[4]], int(parts[5]))
+            if changed is None:
+                alert = text('alert_status_conflict', locale)
+            else:
+                alert = text('alert_status_changed', locale, status=_status(changed.status, locale))
+                logger.info(f"Администратор сменил статус заказа {order_id} на {changed.status.value} из бота")
+            action = 'o'
+
+        if action == 'o':
+            order = load_order(order_id)
+            if order is None:
+                await callback_query.answer(text('alert_order_not_found', locale), show_alert=True)
+                return
+            screen_text, keyboard = render_order(order, status_code, locale)
+        else:
+            direction = {'n': 'older', 'p': 'newer', 'a': 'at'}.get(action, 'older')
+            screen_text, keyboard = render_page(*load_page(status, order_id, direction), status, locale)
+
+    await _show(callback_query.message, screen_text, keyboard)
+    await callback_query.answer(alert)
+
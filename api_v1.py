@@ -0,0 +1,165 @@
+"""
+Versioned JSON API for orders, users and payments
+
+    GET /api/v1/orders?fields[orders]=id,status&include=user&fields[user]=username
+    GET /api/v1/orders/ORDER_00001?include=user,plan
+    GET /api/v1/payments?filter[status]=completed&page=2&per_page=200
+
+Sparse fieldsets and includes follow JSON:API naming; responses are plain
+{"data": [...], "page": n, "next_page": n | null}. Pages are read one row
+past the page size to know whether another page exists, so no COUNT(*) is
+run. Serialization is in serializers.py.
+"""
+
+from flask import Response, request
+from sqlalchemy import and_
+
+from app import app, db
+from models import OrderStatus, PaymentStatus
+from replica import replica_reads
+from routes import login_required
+from serializers import RESOURCES, FieldError, Projection, dumps
+
+API_PREFIX = '/api/v1'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _bool(value):
+    return value.lower() in ('1', 'true', 'yes')
+
+
+# Filters accepted per resource: filter[name]=value -> column == parse(value)
+FILTERS = {
+    'orders': {
+        'status': ('status', OrderStatus),
+        'user_id': ('user_id', int),
+        'plan_id': ('plan_id', str),
+    },
+    'users': {
+        'is_banned': ('is_banned', _bool),
+        'language_code': ('language_code', str),
+    },
+    'payments': {
+        'status': ('status', PaymentStatus),
+        'order_id': ('order_id', str),
+        'user_id': ('user_id', int),
+    },
+}
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def _error(message, status=400):
+    return json_response({'error': message}, status)
+
+
+def _csv(value):
+    return [part.strip() for part in value.split(',') if part.strip()] if value else []
+
+
+def _projection(resource_name):
+    include = _csv(request.args.get('include'))
+    fields_by_include = {name: _csv(request.args.get(f'fields[{name}]')) for name in include}
+    return Projection(resource_name, _csv(request.args.get(f'fields[{resource_name}]')),
+                      include, fields_by_include)
+
+
+def _filters(resource_name):
+    resource = RESOURCES[resource_name]
+    conditions = []
+    for name, (field, parse) in FILTERS[resource_name].items():
+        value = request.args.get(f'filter[{name}]')
+        if value is None:
+            continue
+        try:
+            conditions.append(resource.fields[field] == parse(value))
+        except ValueError:
+            raise FieldError(f"Invalid value for filter[{name}]")
+    return conditions
+
+
+def _list(resource_name):
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    try:
+        projection = _projection(resource_name)
+        conditions = _filters(resource_name)
+    except FieldError as e:
+        return _error(str(e))
+
+    query = projection.query
+    if conditions:
+        query = query.where(and_(*conditions))
+    query = (query.order_by(*projection.resource.order_by)
+             .offset((page - 1) * per_page)
+             .limit(per_page + 1))
+    rows = db.session.execute(query).all()
+    has_next = len(rows) > per_page
+    return json_response({
+        'data': projection.serialize_all(rows[:per_page]),
+        'page': page,
+        'next_page': page + 1 if has_next else None,
+    })
+
+
+def _detail(resource_name, key):
+    try:
+        projection = _projection(resource_name)
+    except FieldError as e:
+        return _error(str(e))
+    id_column = projection.resource.fields['id']
+    row = db.session.execute(projection.query.where(id_column == key)).first()
+    if row is None:
+        return _error('Not found', 404)
+    return json_response({'data': projection.serialize(row)})
+
+
+@app.route(f'{API_PREFIX}/orders')
+@login_required
+@replica_reads
+def api_v1_orders():
+    """List orders"""
+    return _list('orders')
+
+
+@app.route(f'{API_PREFIX}/orders/<order_id>')
+@login_required
+@replica_reads
+def api_v1_order(order_id):
+    """One order"""
+    return _detail('orders', order_id)
+
+
+@app.route(f'{API_PREFIX}/users')
+@login_required
+@replica_reads
+def api_v1_users():
+    """List users"""
+    return _list('users')
+
+
+@app.route(f'{API_PREFIX}/users/<int:user_id>')
+@login_required
+@replica_reads
+def api_v1_user(user_id):
+    """One user"""
+    return _detail('users', user_id)
+
+
+@app.route(f'{API_PREFIX}/payments')
+@login_required
+@replica_reads
+def api_v1_payments():
+    """List payments"""
+    return _list('payments')
+
+
+@app.route(f'{API_PREFIX}/payments/<int:payment_id>')
+@login_required
+@replica_reads
+def api_v1_payment(payment_id):
+    """One payment"""
+    return _detail('payments', payment_id)
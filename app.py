@@ -3,33 +3,40 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
-import logging
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+from config import SQL_PROFILING
+from logging_setup import init_flask_logging
+from replica import RoutingSession
+import db_pool
+import sqlite_mode
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
 # create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1) # needed for url_for to generate with https
+init_flask_logging(app)
+# per-request SQL timing, Server-Timing headers and slow-query log (see sql_profiling.py)
+if SQL_PROFILING:
+    import sql_profiling
+    sql_profiling.init_app(app)
 
 # configure the database, relative to the app instance folder
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# pool sized from the worker count and max_connections, idle-time pinging, metrics (see db_pool.py)
+db_pool.configure_app(app)
+# single-node deployments: tuned SQLite with a single-writer queue (see sqlite_mode.py)
+sqlite_mode.configure_app(app)
+# optional read replica for admin views, statistics and exports (see replica.py)
+app.config["SQLALCHEMY_REPLICA_URI"] = os.environ.get("DATABASE_REPLICA_URL")
+app.config["REPLICA_MAX_LAG"] = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "5"))
+app.config["REPLICA_CHECK_INTERVAL"] = float(os.environ.get("REPLICA_CHECK_INTERVAL", "10"))
 # initialize the app with the extension, flask-sqlalchemy >= 3.0.x
 db.init_app(app)
 
-with app.app_context():
-    # Make sure to import the models here or their tables won't be created
-    import models  # noqa: F401
-    db.create_all()
-    # Initialize default data
-    models.init_default_data()
+# Register models. Schema creation and seeding are not done on import;
+# run `python manage.py init-db` once per deploy instead.
+import models  # noqa: F401,E402
@@ -0,0 +1,165 @@
+"""
+Time-based archival of orders and payments
+
+Completed, cancelled and refunded orders untouched for longer than the
+retention age are moved, together with their payments, from the hot
+`orders`/`payments` tables into `orders_archive`/`payments_archive`. Rows
+move in small batches, each in its own short transaction, so live traffic
+never waits behind a long lock. On PostgreSQL the archive tables are
+partitioned by month and partitions are created on demand.
+
+Admin views and exports read archived rows only when asked to
+(include_archived), so everyday COUNT/SUM and list queries stay on the
+small hot tables.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import String, cast, delete, func, insert, literal, select, text, union_all
+from app import db
+from models import Order, Payment, OrderArchive, PaymentArchive, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "500"))
+
+TERMINAL_STATUSES = (OrderStatus.COMPLETED, OrderStatus.CANCELLED, OrderStatus.REFUNDED)
+
+# Columns copied verbatim; archived_at is filled by the INSERT
+ORDER_COLUMNS = [column.name for column in Order.__table__.columns]
+PAYMENT_COLUMNS = [column.name for column in Payment.__table__.columns]
+
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value):
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def ensure_month_partitions(table, start, end):
+    """Create monthly partitions of `table` covering [start, end] on PostgreSQL"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    month = _month_start(start)
+    while month <= end:
+        upper = _next_month(month)
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table}_{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        ))
+        month = upper
+
+
+def _candidate_ids(cutoff, batch_size):
+    query = (select(Order.id)
+             .where(Order.status.in_(TERMINAL_STATUSES), Order.updated_at < cutoff)
+             .order_by(Order.updated_at)
+             .limit(batch_size))
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Skip rows an operator or the bot is touching right now
+        query = query.with_for_update(skip_locked=True, of=Order)
+    return db.session.execute(query).scalars().all()
+
+
+def _copy(source, target, columns, where, now):
+    """INSERT INTO target SELECT ... FROM source WHERE ..."""
+    source_columns = []
+    for name in columns:
+        column = source.__table__.c[name]
+        if name == 'created_at':
+            # Partition key must not be NULL
+            column = func.coalesce(column, source.__table__.c.updated_at, literal(now))
+        source_columns.append(column)
+    query = select(*source_columns, literal(now)).where(where)
+    db.session.execute(insert(target.__table__).from_select(columns + ['archived_at'], query))
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch of terminal orders older than `cutoff`; returns (orders, payments) moved"""
+    ids = _candidate_ids(cutoff, batch_size)
+    if not ids:
+        db.session.rollback()
+        return 0, 0
+
+    now = datetime.utcnow()
+    bounds = db.session.execute(
+        select(func.min(Order.created_at), func.max(Order.created_at)).where(Order.id.in_(ids))
+    ).one()
+    payment_bounds = db.session.execute(
+        select(func.min(Payment.created_at), func.max(Payment.created_at)).where(Payment.order_id.in_(ids))
+    ).one()
+    ensure_month_partitions('orders_archive', bounds[0] or now, bounds[1] or now)
+    if payment_bounds[0] is not None:
+        ensure_month_partitions('payments_archive', payment_bounds[0], payment_bounds[1])
+
+    _copy(Payment, PaymentArchive, PAYMENT_COLUMNS, Payment.order_id.in_(ids), now)
+    payments = db.session.execute(delete(Payment).where(Payment.order_id.in_(ids))).rowcount
+    _copy(Order, OrderArchive, ORDER_COLUMNS, Order.id.in_(ids), now)
+    orders = db.session.execute(delete(Order).where(Order.id.in_(ids))).rowcount
+    db.session.commit()
+    return orders, payments
+
+
+def archive_old_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                       pause=0.05, max_batches=None):
+    """Archive terminal orders in batches until none are left; returns totals"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total_orders = total_payments = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        orders, payments = archive_batch(cutoff, batch_size)
+        if not orders:
+            break
+        total_orders += orders
+        total_payments += payments
+        batches += 1
+        logger.info(f"Archived batch {batches}: {orders} orders, {payments} payments")
+        # Let waiting writers in between batches
+        time.sleep(pause)
+
+    return total_orders, total_payments
+
+
+def count_archivable(older_than_days=ARCHIVE_AFTER_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    return db.session.execute(
+        select(func.count()).select_from(Order)
+        .where(Order.status.in_(TERMINAL_STATUSES), Order.updated_at < cutoff)
+    ).scalar()
+
+
+def paginate_with_archive(live_query, archive_query, live_model, archive_model, page, per_page):
+    """Paginate live and archived rows together, newest first
+
+    Pages over a UNION ALL of tagged keys ("L:<id>" / "A:<id>") and then loads
+    the objects of one page with one query per table, so archived rows
+    behave like live ones in templates.
+    """
+    def tagged(query, model, tag):
+        key = literal(tag).concat(cast(model.id, String)).label('key')
+        return query.with_entities(key, model.created_at.label('created_at')).statement
+
+    keys = union_all(
+        tagged(live_query, live_model, 'L:'),
+        tagged(archive_query, archive_model, 'A:'),
+    ).subquery()
+    pagination = db.paginate(
+        select(keys.c.key).order_by(keys.c.created_at.desc()),
+        page=page, per_page=per_page, error_out=False
+    )
+
+    page_keys = [key.split(':', 1) for key in pagination.items]
+    loaded = {}
+    for tag, model in (('L', live_model), ('A', archive_model)):
+        ids = [model.id.type.python_type(value) for key_tag, value in page_keys if key_tag == tag]
+        if ids:
+            loaded.update({(tag, str(obj.id)): obj for obj in model.query.filter(model.id.in_(ids))})
+
+    pagination.items = [loaded[(tag, value)] for tag, value in page_keys if (tag, value) in loaded]
+    return pagination
@@ -0,0 +1,139 @@
+"""
+In-process set of banned Telegram user IDs
+
+The bot checks every update against a plain Python set, so banned users are
+dropped before any handler or database work. The set is loaded once and
+kept fresh by polling a version counter in system_settings, which is bumped
+in the same transaction as any change to User.is_banned (the admin ban API
+included). Only when the counter moves are the users changed since the
+last sync re-read; a full reload runs now and then as a safety net.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import Integer, String, cast, event, inspect, select, update
+from models import User, SystemSettings
+
+logger = logging.getLogger(__name__)
+
+BANS_VERSION_KEY = 'banned_users_version'
+BAN_CHECK_INTERVAL = float(os.environ.get("BAN_CHECK_INTERVAL", "5"))
+BAN_FULL_RELOAD_INTERVAL = float(os.environ.get("BAN_FULL_RELOAD_INTERVAL", "600"))
+
+# Re-read a little before the last sync so commits racing the sync are not missed
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def _bump_version(connection):
+    table = SystemSettings.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.key == BANS_VERSION_KEY)
+        .values(value=cast(cast(table.c.value, Integer) + 1, String))
+    )
+
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    if target.is_banned:
+        _bump_version(connection)
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    if inspect(target).attrs.is_banned.history.has_changes():
+        _bump_version(connection)
+
+
+class BannedUsers:
+    """Banned IDs with cheap membership checks and incremental refresh"""
+
+    def __init__(self, check_interval=BAN_CHECK_INTERVAL, full_reload_interval=BAN_FULL_RELOAD_INTERVAL):
+        self.check_interval = check_interval
+        self.full_reload_interval = full_reload_interval
+        self.ids = frozenset()
+        self.version = None
+        self.loaded = False
+        self._synced_at = None
+        self._checked_at = 0.0
+        self._reloaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id):
+        return user_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def due(self):
+        return time.monotonic() - self._checked_at >= self.check_interval
+
+    def refresh(self, wait=False):
+        """Sync with the database; safe to call from a worker thread
+
+        Periodic syncs skip if another one is running. With wait=True (the
+        first load) the caller waits for it instead, so nobody is checked
+        against the empty set.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return
+        if wait and self.loaded:
+            self._lock.release()
+            return
+        try:
+            from app import app, db
+            with app.app_context():
+                self._sync(db.session)
+        except Exception as e:
+            logger.error(f"Не удалось обновить список заблокированных: {e}")
+        finally:
+            self._checked_at = time.monotonic()
+            self._lock.release()
+
+    def _sync(self, session):
+        version = session.execute(
+            select(SystemSettings.value).where(SystemSettings.key == BANS_VERSION_KEY)
+        ).scalar()
+        now = time.monotonic()
+        full = (not self.loaded or self._synced_at is None
+                or now - self._reloaded_at >= self.full_reload_interval)
+        if not full and version == self.version:
+            return
+
+        if full:
+            rows = session.execute(
+                select(User.id, User.is_banned, User.updated_at).where(User.is_banned.is_(True))
+            ).all()
+            ids = set()
+        else:
+            rows = session.execute(
+                select(User.id, User.is_banned, User.updated_at)
+                .where(User.updated_at >= self._synced_at - SYNC_OVERLAP)
+            ).all()
+            ids = set(self.ids)
+
+        synced_at = self._synced_at
+        for user_id, is_banned, updated_at in rows:
+            if is_banned:
+                ids.add(user_id)
+            else:
+                ids.discard(user_id)
+            if updated_at is not None and (synced_at is None or updated_at > synced_at):
+                synced_at = updated_at
+        if full:
+            synced_at = session.execute(select(User.updated_at).order_by(User.updated_at.desc()).limit(1)).scalar()
+            self._reloaded_at = now
+
+        # Swap in a new frozenset so readers never see a half-updated set
+        self.ids = frozenset(ids)
+        self.version = version
+        self._synced_at = synced_at
+        self.loaded = True
+        logger.info(f"Список заблокированных обновлен: {len(self.ids)} (версия {version})")
+
+
+banned_users = BannedUsers()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Bot API client latency: aiogram's default session versus bot_session.py
+
+Starts a local Bot API stub and sends bursts of sendMessage calls through
+each session. The stub adds --handshake-ms to the first request on every
+new connection to stand in for the TCP+TLS setup a real connection to
+api.telegram.org costs. Bursts are separated by --gap seconds of silence,
+which is longer than aiohttp's default 15 s keep-alive, as happens between
+user clicks in a quiet hour.
+
+Usage:
+    python benchmarks/bench_bot_api.py --bursts 4 --burst-size 200 --concurrency 16 --gap 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '42:BENCHMARK'
+
+
+def make_stub(latency, handshake, seen):
+    async def handle(request):
+        transport = request.transport
+        if id(transport) not in seen:
+            seen.add(id(transport))
+            await asyncio.sleep(handshake)
+        await asyncio.sleep(latency)
+        method = request.match_info['method']
+        result = True
+        if method.lower() == 'sendmessage':
+            result = {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': 'ok'}
+        return web.json_response({'ok': True, 'result': result})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', handle)
+    return app
+
+
+def p99(values):
+    return statistics.quantiles(values, n=100)[98] if len(values) > 1 else (values[0] if values else 0.0)
+
+
+async def run_session(name, session, args, seen):
+    from aiogram import Bot
+    from aiogram.methods import SendMessage
+
+    bot = Bot(token=TOKEN, session=session)
+    seen.clear()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def call():
+        async with semaphore:
+            started = time.perf_counter()
+            await bot(SendMessage(chat_id=1, text='ok'))
+            latencies.append(time.perf_counter() - started)
+
+    for burst in range(args.bursts):
+        if burst:
+            await asyncio.sleep(args.gap)
+        await asyncio.gather(*(call() for _ in range(args.burst_size)))
+
+    stats = session.stats.snapshot() if hasattr(session, 'stats') else {}
+    await bot.session.close()
+    return {
+        'session': name,
+        'requests': len(latencies),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(p99(latencies) * 1000, 2),
+        # Counted by the stub, so the default session gets a number too
+        'connections_created': len(seen),
+        'reuse_ratio': stats.get('reuse_ratio'),
+    }
+
+
+async def main_async(args):
+    sys.path.insert(0, ROOT)
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from bot_session import TunedAiohttpSession
+
+    seen = set()
+    stub = make_stub(args.latency_ms / 1000, args.handshake_ms / 1000, seen)
+    runner = web.AppRunner(stub, keepalive_timeout=3600)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.port)
+    await site.start()
+    api = TelegramAPIServer.from_base(f'http://127.0.0.1:{args.port}')
+
+    try:
+        results = [
+            await run_session('aiogram default', AiohttpSession(api=api), args, seen),
+            await run_session('tuned', TunedAiohttpSession(api=api, pool_size=args.concurrency), args, seen),
+        ]
+    finally:
+        await runner.cleanup()
+
+    print(f"{'session':<16} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9} {'new conns':>10} {'reuse':>7}")
+    for r in results:
+        print(f"{r['session']:<16} {r['requests']:>9} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['connections_created']:>10} "
+              f"{r['reuse_ratio'] if r['reuse_ratio'] is not None else '-':>7}")
+    if args.json:
+        print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Bot API sessions against a local stub')
+    parser.add_argument('--bursts', type=int, default=3)
+    parser.add_argument('--burst-size', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--gap', type=float, default=20, help='Idle seconds between bursts')
+    parser.add_argument('--latency-ms', type=float, default=5, help='Stub processing time')
+    parser.add_argument('--handshake-ms', type=float, default=40, help='Emulated connection setup cost')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--json', action='store_true')
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Repeatable benchmark of the hot paths
+
+Runs each path for a fixed time against the database in DATABASE_URL
+(seed it first with benchmarks/seed.py) and reports ops/s, p50 and p99:
+  user_upsert    - get-or-create user and touch last_activity, as on /start
+  order_create   - order insert plus commit, as on plan selection
+  dashboard      - GET /admin/dashboard
+  users_search   - GET /admin/users?search=...
+  orders_search  - GET /admin/orders?search=...
+  stats_chart    - GET /api/stats/chart?days=30
+
+Results are written to benchmarks/results/ (git-ignored) as JSON together
+with the git revision and table sizes. --compare checks the new run against an earlier
+one and flags paths whose throughput dropped or p99 rose by more than
+--threshold.
+
+Usage:
+    DATABASE_URL=... python benchmarks/bench_hot_paths.py --duration 10 --label baseline
+    DATABASE_URL=... python benchmarks/bench_hot_paths.py --compare latest --fail-on-regression
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+PATHS = ['user_upsert', 'order_create', 'dashboard', 'users_search', 'orders_search', 'stats_chart']
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100)[pct - 1]
+
+
+def build_operations(app, db, rng):
+    from sqlalchemy import func
+    from models import User, Order, OrderStatus
+    from seed import SEED_USER_OFFSET
+
+    with app.app_context():
+        max_user = db.session.query(func.max(User.id)).scalar() or SEED_USER_OFFSET
+    low_user = SEED_USER_OFFSET if max_user >= SEED_USER_OFFSET else 1
+
+    def user_upsert():
+        user_id = rng.randint(low_user, max_user + 100)
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            if user is None:
+                user = User(id=user_id, username=f'bench_{user_id}', first_name='Bench')
+                db.session.add(user)
+            user.last_activity = datetime.utcnow()
+            db.session.commit()
+
+    def order_create():
+        with app.app_context():
+            db.session.add(Order(
+                id=f'BENCH_{os.getpid()}_{time.perf_counter_ns()}',
+                user_id=rng.randint(low_user, max_user), plan_id='1_month',
+                total_amount=150, status=OrderStatus.CREATED,
+            ))
+            db.session.commit()
+
+    def http(path_factory):
+        def run(client):
+            response = client.get(path_factory())
+            if response.status_code >= 400:
+                raise RuntimeError(f'HTTP {response.status_code}')
+        return run
+
+    return {
+        'user_upsert': lambda client: user_upsert(),
+        'order_create': lambda client: order_create(),
+        'dashboard': http(lambda: '/admin/dashboard'),
+        'users_search': http(lambda: f'/admin/users?search=seed_user_{rng.randint(1, 999)}'),
+        'orders_search': http(lambda: f'/admin/orders?search=seed_user_{rng.randint(1, 999)}'),
+        'stats_chart': http(lambda: '/api/stats/chart?days=30'),
+    }
+
+
+def run_path(app, operation, duration, threads):
+    def loop(_):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['admin_id'] = 1
+        latencies, errors = [], {}
+        stop_at = time.monotonic() + duration
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                operation(client)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                key = str(e) if isinstance(e, RuntimeError) else type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(loop, range(threads)))
+    latencies = [value for values, _ in results for value in values]
+    errors = {}
+    for _, errs in results:
+        for key, count in errs.items():
+            errors[key] = errors.get(key, 0) + count
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) / duration, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'errors': errors,
+    }
+
+
+def environment(app, db):
+    from sqlalchemy import func
+    from models import User, Order, Payment
+    with app.app_context():
+        sizes = {model.__tablename__: db.session.query(func.count()).select_from(model).scalar()
+                 for model in (User, Order, Payment)}
+        dialect = db.engine.dialect.name
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                  capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {'dialect': dialect, 'rows': sizes, 'git': revision, 'python': sys.version.split()[0]}
+
+
+def load_previous(spec, exclude):
+    if spec == 'latest':
+        runs = sorted(path for path in glob.glob(os.path.join(RESULTS_DIR, '*.json')) if path != exclude)
+        if not runs:
+            return None, None
+        spec = runs[-1]
+    with open(spec) as f:
+        return spec, json.load(f)
+
+
+def compare(previous, current, threshold):
+    """Print deltas and return the list of regressed paths"""
+    regressions = []
+    print(f"\n{'path':<14} {'ops/s':>10} {'Δ':>8} {'p99 ms':>10} {'Δ':>8}")
+    for path, result in current['paths'].items():
+        before = previous['paths'].get(path)
+        if not before or not before['ops_per_sec']:
+            continue
+        ops_delta = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        p99_delta = result['p99_ms'] / before['p99_ms'] - 1 if before['p99_ms'] else 0.0
+        regressed = ops_delta < -threshold or p99_delta > threshold
+        if regressed:
+            regressions.append(path)
+        print(f"{path:<14} {result['ops_per_sec']:>10.1f} {ops_delta:>+8.1%} "
+              f"{result['p99_ms']:>10.2f} {p99_delta:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hot paths and store the results')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per path')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS)
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<time>-<label>.json)')
+    parser.add_argument('--compare', help="Earlier result file, or 'latest'")
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed relative slowdown')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import main as web
+    from app import db
+    app = web.app
+
+    operations = build_operations(app, db, random.Random(args.seed))
+    result = {
+        'label': args.label,
+        'started_at': datetime.utcnow().isoformat(),
+        'duration': args.duration,
+        'threads': args.threads,
+        'environment': environment(app, db),
+        'paths': {},
+    }
+    print(f"{'path':<14} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}  errors")
+    for path in args.paths:
+        stats = run_path(app, operations[path], args.duration, args.threads)
+        result['paths'][path] = stats
+        print(f"{path:<14} {stats['ops_per_sec']:>10.1f} {stats['p50_ms']:>10.2f} "
+              f"{stats['p99_ms']:>10.2f}  {stats['errors'] or ''}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{args.label}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f'\nSaved {output}')
+
+    if args.compare:
+        previous_path, previous = load_previous(args.compare, output)
+        if previous is None:
+            print('No earlier run to compare with')
+            return
+        print(f'Compared with {previous_path}')
+        regressions = compare(previous, result, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(f"Regressed: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
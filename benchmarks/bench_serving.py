@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Requests per second of the admin web app under each gunicorn worker model
+
+Starts `gunicorn main:app` once per worker class, logs in as the default
+admin and hammers the dashboard and list pages from concurrent clients.
+
+Usage:
+    DATABASE_URL=... SESSION_SECRET=... python benchmarks/bench_serving.py
+    python benchmarks/bench_serving.py --workers 2 --clients 16 --duration 10 --models sync gthread
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = [
+    '/admin/dashboard',
+    '/admin/orders',
+    '/admin/orders?search=ORDER_0',
+    '/admin/users',
+]
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def login(base_url):
+    session = requests.Session()
+    session.post(f'{base_url}/admin/login', data={'username': 'admin', 'password': 'admin123'},
+                 allow_redirects=False)
+    return session
+
+
+def hammer(base_url, page, clients, duration):
+    """Return (requests/s, error count) for one page"""
+    counts = [0] * clients
+    errors = [0] * clients
+    stop_at = time.monotonic() + duration
+
+    def client(index):
+        session = login(base_url)
+        while time.monotonic() < stop_at:
+            counts[index] += 1
+            try:
+                response = session.get(base_url + page, allow_redirects=False)
+                if response.status_code != 200:
+                    errors[index] += 1
+            except requests.RequestException:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return sum(counts) / elapsed, sum(errors)
+
+
+def run_model(model, args):
+    env = dict(os.environ, WEB_WORKER_CLASS=model, WEB_WORKERS=str(args.workers),
+               WEB_THREADS=str(args.threads), PORT=str(args.port), WEB_LOG_LEVEL='warning')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'main:app', '--access-logfile', '/dev/null'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        if not wait_until_ready(args.port):
+            print(f'{model:<8} failed to start')
+            return
+        for page in PAGES:
+            rps, errors = hammer(base_url, page, args.clients, args.duration)
+            suffix = f'  ({errors} failed)' if errors else ''
+            print(f'{model:<8} {page:<32} {rps:>9.1f} req/s{suffix}')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--models', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    print(f'workers={args.workers} threads={args.threads} clients={args.clients} duration={args.duration}s')
+    for model in args.models:
+        run_model(model, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Startup time of the web app and the bot modules
+
+Each measurement runs in a fresh interpreter so module caches do not help:
+  import  - time to import the module
+  ready   - import plus the first request served by the Flask test client
+            (web only), i.e. the point where a gunicorn worker can serve
+
+Usage:
+    DATABASE_URL=... python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+ready = None
+if {serve}:
+    client = {module}.app.test_client()
+    client.get('/admin')
+    ready = time.perf_counter() - started
+print(json.dumps({{"import": imported - started, "ready": ready,
+                   "aiogram": "aiogram" in sys.modules}}))
+'''
+
+TARGETS = [
+    ('app', False),
+    ('main', True),
+    ('manage', False),
+    ('storage', False),
+]
+
+
+def measure(module, serve):
+    code = PROBE.format(module=module, serve=serve)
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import and ready time')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<10} {'import ms':>10} {'ready ms':>10}  aiogram loaded")
+    for module, serve in TARGETS:
+        samples = [measure(module, serve) for _ in range(args.runs)]
+        import_ms = statistics.median(s['import'] for s in samples) * 1000
+        ready = [s['ready'] for s in samples if s['ready'] is not None]
+        ready_ms = f"{statistics.median(ready) * 1000:>10.1f}" if ready else f"{'-':>10}"
+        print(f"{module:<10} {import_ms:>10.1f} {ready_ms}  {samples[0]['aiogram']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Bulk synthetic data for benchmarks
+
+Loads users, orders and payments at production-like volumes with realistic
+status, plan and date distributions: traffic grows over time, most orders
+complete, and only paid orders have successful payments. Rows are streamed
+in chunks with executemany, or with COPY on PostgreSQL, bypassing the ORM
+and its flush hooks. Seeded users get an ID range far above real Telegram
+IDs, so --reset removes exactly them and their orders and payments.
+
+Usage:
+    DATABASE_URL=... python benchmarks/seed.py --users 1000000 --orders-per-user 1.5
+    DATABASE_URL=... python benchmarks/seed.py --reset
+"""
+import argparse
+import csv
+import enum
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED_ORDER_PREFIX = 'SEED_'
+SEED_USER_OFFSET = 9_000_000_000_000
+CHUNK_SIZE = 10000
+
+# Tables whose buffered rows must be written before a table's own rows
+FLUSH_FIRST = {'orders': ['users'], 'payments': ['orders']}
+
+ORDER_STATUS_WEIGHTS = [
+    ('created', 0.08), ('awaiting_payment', 0.12), ('paid', 0.04), ('processing', 0.03),
+    ('completed', 0.61), ('cancelled', 0.10), ('refunded', 0.02),
+]
+PLAN_WEIGHTS = [('1_month', 0.5), ('3_months', 0.25), ('6_months', 0.15), ('12_months', 0.10)]
+PLAN_PRICES = {'1_month': 150, '3_months': 370, '6_months': 690, '12_months': 1300}
+FIRST_NAMES = ['Алексей', 'Мария', 'Иван', 'Анна', 'Дмитрий', 'Елена', 'Сергей', 'Ольга', 'Никита', 'Дарья']
+# Order statuses that went through a completed payment
+PAID_STATUSES = {'paid', 'processing', 'completed', 'refunded'}
+
+
+def random_moment(rng, now, days):
+    """A moment in the last `days` days, denser towards now (growing traffic)"""
+    return now - timedelta(days=days * (1 - rng.random() ** 0.5), seconds=rng.randint(0, 86399))
+
+
+def generate_users(rng, count, now, days):
+    from models import UserRole
+    for n in range(count):
+        created = random_moment(rng, now, days)
+        active = created + timedelta(days=rng.random() * (now - created).days)
+        yield {
+            'id': SEED_USER_OFFSET + n,
+            'username': f'seed_user_{n}' if rng.random() < 0.8 else None,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': None,
+            'language_code': 'ru' if rng.random() < 0.9 else 'en',
+            'role': UserRole.USER,
+            'is_active': True,
+            'is_banned': rng.random() < 0.002,
+            'created_at': created,
+            'updated_at': active,
+            'last_activity': active,
+        }
+
+
+def generate_orders(rng, users, orders_per_user, now, days):
+    """Yield (order, payment or None) pairs"""
+    from models import OrderStatus, PaymentStatus
+    statuses, status_weights = zip(*ORDER_STATUS_WEIGHTS)
+    plans, plan_weights = zip(*PLAN_WEIGHTS)
+    total = int(users * orders_per_user)
+    for n in range(total):
+        # A few heavy buyers, many one-off customers
+        user_id = SEED_USER_OFFSET + min(users - 1, int(users * rng.random() ** 1.5))
+        status = rng.choices(statuses, status_weights)[0]
+        plan_id = rng.choices(plans, plan_weights)[0]
+        created = random_moment(rng, now, days)
+        updated = min(now, created + timedelta(minutes=rng.expovariate(1 / 240)))
+        order_id = f'{SEED_ORDER_PREFIX}{n:09d}'
+        order = {
+            'id': order_id,
+            'user_id': user_id,
+            'plan_id': plan_id,
+            'spotify_login': f'seed{n}@example.com' if status != 'created' else None,
+            'status': OrderStatus(status),
+            'previous_status': None,
+            'version': 1,
+            'total_amount': PLAN_PRICES[plan_id],
+            'payment_url': f'https://pay.example.com/{order_id}' if status != 'created' else None,
+            'created_at': created,
+            'updated_at': updated,
+            'completed_at': updated if status == 'completed' else None,
+        }
+        payment = None
+        if status in PAID_STATUSES or (status == 'cancelled' and rng.random() < 0.3):
+            paid = status in PAID_STATUSES
+            payment = {
+                'order_id': order_id,
+                'user_id': user_id,
+                'amount': PLAN_PRICES[plan_id],
+                'currency': 'RUB',
+                'status': PaymentStatus.REFUNDED if status == 'refunded'
+                else PaymentStatus.COMPLETED if paid else PaymentStatus.FAILED,
+                'payment_method': 'digiseller',
+                'external_payment_id': f'DS{n:010d}',
+                'paid_at': updated if paid else None,
+                'created_at': created + (updated - created) / 2,
+                'updated_at': updated,
+            }
+        yield order, payment
+
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, enum.Enum):
+        # Enum columns store member names
+        return value.name
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class Loader:
+    """Buffers rows per table and writes them with COPY or executemany"""
+
+    def __init__(self, db, chunk_size=CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.use_copy = db.engine.dialect.name == 'postgresql'
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        buffer = self.buffers.setdefault(table, [])
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        tables = [table] if table is not None else list(self.buffers)
+        for name in tables:
+            for parent in FLUSH_FIRST.get(name, []):
+                self.flush(parent)
+            rows = self.buffers.get(name)
+            if not rows:
+                continue
+            if self.use_copy:
+                self._copy(name, rows)
+            else:
+                with self.db.engine.begin() as conn:
+                    conn.execute(self.db.metadata.tables[name].insert(), rows)
+            self.counts[name] = self.counts.get(name, 0) + len(rows)
+            self.buffers[name] = []
+
+    def _copy(self, table, rows):
+        columns = list(rows[0])
+        data = io.StringIO()
+        writer = csv.writer(data)
+        for row in rows:
+            writer.writerow([_copy_value(row[column]) for column in columns])
+        data.seek(0)
+        raw = self.db.engine.raw_connection()
+        try:
+            with raw.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", data
+                )
+            raw.commit()
+        finally:
+            raw.close()
+
+
+def reset(db):
+    from sqlalchemy import delete
+    from models import User, Order, Payment
+    with db.engine.begin() as conn:
+        # Also rows the benchmarks created for seeded users
+        payments = conn.execute(delete(Payment).where(Payment.user_id >= SEED_USER_OFFSET)).rowcount
+        orders = conn.execute(delete(Order).where(Order.user_id >= SEED_USER_OFFSET)).rowcount
+        users = conn.execute(delete(User).where(User.id >= SEED_USER_OFFSET)).rowcount
+    print(f'Removed {users} users, {orders} orders, {payments} payments')
+
+
+def seed(db, args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    loader = Loader(db, args.chunk_size)
+    started = time.perf_counter()
+
+    for row in generate_users(rng, args.users, now, args.days):
+        loader.add('users', row)
+    loader.flush('users')
+    for order, payment in generate_orders(rng, args.users, args.orders_per_user, now, args.days):
+        loader.add('orders', order)
+        if payment is not None:
+            loader.add('payments', payment)
+    # Payments reference orders, so orders go first
+    loader.flush('orders')
+    loader.flush('payments')
+
+    elapsed = time.perf_counter() - started
+    total = sum(loader.counts.values())
+    print(f"Seeded {loader.counts} in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s, "
+          f"{'COPY' if loader.use_copy else 'executemany'})")
+
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy import text
+        with db.engine.begin() as conn:
+            conn.execute(text('ANALYZE users; ANALYZE orders; ANALYZE payments'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-load synthetic users, orders and payments')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--orders-per-user', type=float, default=1.5)
+    parser.add_argument('--days', type=int, default=730, help='History length')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for repeatable data')
+    parser.add_argument('--reset', action='store_true', help='Remove previously seeded rows and exit')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from app import app, db
+
+    with app.app_context():
+        if args.reset:
+            reset(db)
+        else:
+            seed(db, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import os
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.filters import Command, StateFilter
@@ -8,21 +9,16 @@ from config import BOT_TOKEN, ADMIN_ID
 from handlers import (
     cmd_start, handle_order_subscription, handle_support, handle_faq, handle_back_to_menu,
     process_plan_selection, process_spotify_login, process_payment_completed,
-    process_start_over, handle_unknown_message, cmd_admin_orders
+    process_start_over, handle_unknown_message
 )
+from admin_orders import cmd_admin_orders, handle_admin_orders_callback, CALLBACK_PREFIX
 from states import OrderState
-from models import User, db, init_default_data
-from app import app
+from middlewares import CorrelationMiddleware, BanMiddleware, ThrottlingMiddleware
+from logging_setup import setup_logging
+from bot_session import create_bot_session
+from outbox import OutboxDispatcher
+from update_executor import ChatEventIsolation
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 async def setup_handlers(dp: Dispatcher):
@@ -70,6 +66,12 @@ async def setup_handlers(dp: Dispatcher):
         F.data == "start_over"
     )
     
+    # Список заказов для администратора
+    dp.callback_query.register(
+        handle_admin_orders_callback,
+        F.data.startswith(CALLBACK_PREFIX)
+    )
+    
     # Обработчики текстовых сообщений по состояниям
     dp.message.register(
         process_spotify_login,
@@ -83,11 +85,6 @@ async def on_startup(bot: Bot):
     """Действия при запуске бота"""
     logger.info("Бот запущен и готов к работе!")
     
-    # Initialize database with default data
-    with app.app_context():
-        init_default_data()
-        db.session.commit()
-    
     # Уведомляем администратора о запуске
     try:
         await bot.send_message(
@@ -114,24 +111,35 @@ async def main():
         logger.warning("⚠️ Не установлен ID администратора! Установите переменную окружения ADMIN_ID")
     
     # Создаем бота и диспетчер
-    bot = Bot(token=BOT_TOKEN)
+    bot = Bot(token=BOT_TOKEN, session=create_bot_session())
     storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    # Апдейты одного чата — по очереди, разных чатов — параллельно
+    dp = Dispatcher(storage=storage, events_isolation=ChatEventIsolation())
     
     # Регистрируем обработчики
+    dp.update.outer_middleware(CorrelationMiddleware())
+    dp.update.outer_middleware(BanMiddleware())
+    dp.update.outer_middleware(ThrottlingMiddleware())
     await setup_handlers(dp)
     
     # Запускаем бота
     logger.info("Запуск бота...")
     await on_startup(bot)
     
+    # Доставка уведомлений из outbox
+    outbox_dispatcher = OutboxDispatcher(bot)
+    outbox_dispatcher.start()
+    
     try:
         await dp.start_polling(bot, skip_updates=True)
     finally:
+        await outbox_dispatcher.stop()
         await on_shutdown(bot)
         await bot.session.close()
 
 if __name__ == '__main__':
+    # Запись логов идет в фоновом потоке, файл ротируется по размеру
+    setup_logging('bot', log_file=os.getenv('LOG_FILE', 'bot.log'))
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -9,7 +9,6 @@ from models import User, Order, SubscriptionPlan, init_default_data
 import threading
 import time
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DemoBot:
@@ -112,6 +111,8 @@ def stop_demo_bot():
     demo_bot.stop()
 
 if __name__ == "__main__":
+    from logging_setup import setup_logging
+    setup_logging('demo_bot')
     start_demo_bot()
     
     try:
@@ -0,0 +1,157 @@
+"""
+Настроенная HTTP-сессия для Bot API
+
+Один пул соединений на процесс с заданным размером, долгим keep-alive и
+кэшем DNS, поэтому запросы к api.telegram.org почти всегда идут по уже
+открытому TLS-соединению. Таймауты задаются по методу: загрузка файлов
+получает больше времени, чем обычные вызовы. Счетчики новых и повторно
+использованных соединений собираются через трассировку aiohttp.
+
+aiohttp не поддерживает конвейерную отправку (pipelining) HTTP/1.1 в одном
+соединении, поэтому независимые вызовы call_many() отправляет
+одновременно по прогретым соединениям пула; с BOT_API_PIPELINING=0 они
+идут по очереди. Так отправляется пачка уведомлений outbox.
+"""
+
+import asyncio
+import logging
+import time
+
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import __version__ as aiogram_version
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from config import (
+    BOT_API_URL, BOT_API_POOL_SIZE, BOT_API_KEEPALIVE, BOT_API_DNS_TTL,
+    BOT_API_TIMEOUT, BOT_API_UPLOAD_TIMEOUT, BOT_API_PIPELINING
+)
+
+logger = logging.getLogger(__name__)
+
+# Методы с загрузкой файлов
+UPLOAD_METHODS = (
+    'sendPhoto', 'sendDocument', 'sendVideo', 'sendAudio', 'sendAnimation',
+    'sendVoice', 'sendMediaGroup', 'editMessageMedia', 'sendSticker',
+)
+
+
+class ConnectionStats:
+    """Счетчики соединений и запросов, заполняемые трассировкой aiohttp"""
+
+    def __init__(self):
+        self.requests = 0
+        self.created = 0
+        self.reused = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.request_time = 0.0
+
+    def trace_config(self):
+        trace = TraceConfig()
+
+        async def request_start(session, ctx, params):
+            ctx.started = time.perf_counter()
+
+        async def request_end(session, ctx, params):
+            self.requests += 1
+            self.request_time += time.perf_counter() - ctx.started
+
+        async def connection_created(session, ctx, params):
+            self.created += 1
+
+        async def connection_reused(session, ctx, params):
+            self.reused += 1
+
+        async def dns_hit(session, ctx, params):
+            self.dns_hits += 1
+
+        async def dns_miss(session, ctx, params):
+            self.dns_misses += 1
+
+        trace.on_request_start.append(request_start)
+        trace.on_request_end.append(request_end)
+        trace.on_connection_create_end.append(connection_created)
+        trace.on_connection_reuseconn.append(connection_reused)
+        trace.on_dns_cache_hit.append(dns_hit)
+        trace.on_dns_cache_miss.append(dns_miss)
+        return trace
+
+    def snapshot(self):
+        connections = self.created + self.reused
+        return {
+            'requests': self.requests,
+            'connections_created': self.created,
+            'connections_reused': self.reused,
+            'reuse_ratio': round(self.reused / connections, 3) if connections else None,
+            'dns_cache_hits': self.dns_hits,
+            'dns_cache_misses': self.dns_misses,
+            'avg_request_ms': round(self.request_time / self.requests * 1000, 2) if self.requests else None,
+        }
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession с настраиваемым пулом, keep-alive и таймаутами по методам"""
+
+    def __init__(self, pool_size=BOT_API_POOL_SIZE, keepalive=BOT_API_KEEPALIVE,
+                 dns_ttl=BOT_API_DNS_TTL, timeout=BOT_API_TIMEOUT,
+                 method_timeouts=None, **kwargs):
+        super().__init__(limit=pool_size, timeout=timeout, **kwargs)
+        self._connector_init.update({
+            'limit_per_host': pool_size,
+            'keepalive_timeout': keepalive,
+            'ttl_dns_cache': dns_ttl,
+            'use_dns_cache': True,
+        })
+        self.method_timeouts = {method: BOT_API_UPLOAD_TIMEOUT for method in UPLOAD_METHODS}
+        self.method_timeouts.update(method_timeouts or {})
+        self.stats = ConnectionStats()
+
+    async def create_session(self):
+        # Как в AiohttpSession, но с трассировкой соединений
+        if self._should_reset_connector:
+            await self.close()
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{aiogram_version}"},
+                trace_configs=[self.stats.trace_config()],
+            )
+            self._should_reset_connector = False
+        return self._session
+
+    async def make_request(self, bot, method, timeout=None):
+        if timeout is None:
+            # getUpdates получает таймаут от диспетчера, остальным — по методу
+            timeout = self.method_timeouts.get(method.__api_method__, self.timeout)
+        return await super().make_request(bot, method, timeout=timeout)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed and self.stats.requests:
+            logger.info(f"Статистика соединений Bot API: {self.stats.snapshot()}")
+        await super().close()
+
+
+async def call_many(calls, concurrent=BOT_API_PIPELINING):
+    """Выполнить независимые вызовы; исключения возвращаются вместо результатов
+
+    calls — еще не запущенные корутины, например bot.send_message(...).
+    """
+    if concurrent:
+        return await asyncio.gather(*calls, return_exceptions=True)
+    results = []
+    for call in calls:
+        try:
+            results.append(await call)
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def create_bot_session(**kwargs):
+    """Сессия для Bot(...): настройки из config.py, при необходимости свой сервер API"""
+    if BOT_API_URL and 'api' not in kwargs:
+        kwargs['api'] = TelegramAPIServer.from_base(BOT_API_URL)
+    return TunedAiohttpSession(**kwargs)
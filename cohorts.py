@@ -0,0 +1,274 @@
+"""
+Cohort, retention and LTV analytics
+
+A batch job (`python manage.py cohorts`) streams columnar extracts of
+users and paid orders, live and archived, through a server-side cursor
+into NumPy arrays. It then computes everything with whole-array
+operations:
+
+  * cohort matrix - buyers and revenue per signup month and months since
+    signup (np.unique over user/month keys, np.bincount per cell)
+  * repeat purchase rate and median days from first to second order per
+    cohort (np.lexsort by user and time, run starts via np.flatnonzero)
+  * LTV curves per first-purchase plan, only over customers old enough to
+    be observed that many months (difference arrays and cumsum)
+
+The results replace the cohort_summaries, cohort_stats and plan_ltv
+tables in one transaction. The dashboard reads those through
+cohort_report(), which does not need NumPy. NumPy is needed only to run
+the job.
+"""
+
+import logging
+import time
+from datetime import date, datetime
+
+from sqlalchemy import BigInteger, case, cast, delete, func, literal, select, union_all, update
+
+from app import db
+from config import ANALYTICS_MAX_MONTHS, ANALYTICS_BATCH_SIZE
+from models import (
+    User, Order, OrderArchive, OrderStatus, SubscriptionPlan, CohortSummary, CohortStat, PlanLtv,
+    SystemSettings, insert_ignore
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+COMPUTED_AT_KEY = 'cohorts_computed_at'
+# Orders that count as a purchase
+PURCHASE_STATUSES = (OrderStatus.PAID, OrderStatus.PROCESSING, OrderStatus.COMPLETED)
+
+
+def _extract(query, dtypes, batch_size):
+    """Stream a query into one NumPy array per column"""
+    chunks = [[] for _ in dtypes]
+    connection = db.session.connection().execution_options(stream_results=True, yield_per=batch_size)
+    result = connection.execute(query)
+    try:
+        for partition in result.partitions():
+            for chunk, values, dtype in zip(chunks, zip(*partition), dtypes):
+                chunk.append(np.array(values, dtype=dtype))
+    finally:
+        result.close()
+    return [np.concatenate(chunk) if chunk else np.empty(0, dtype=dtype)
+            for chunk, dtype in zip(chunks, dtypes)]
+
+
+def _epoch_seconds(column, dialect):
+    """Timestamp as integer seconds computed by the database, cheaper than datetime objects"""
+    if dialect == 'postgresql':
+        return cast(func.extract('epoch', column), BigInteger)
+    if dialect == 'sqlite':
+        return cast(func.strftime('%s', column), BigInteger)
+    return func.unix_timestamp(column)
+
+
+def _month_number(moments):
+    """Months since 1970-01 for a datetime64 array"""
+    return moments.astype('datetime64[M]').astype(np.int64)
+
+
+def _month_start(number):
+    return date(1970 + int(number) // 12, int(number) % 12 + 1, 1)
+
+
+def _group_medians(groups, values, group_count):
+    """Median of `values` per integer group id; NaN for empty groups"""
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    starts = np.searchsorted(groups, np.arange(group_count), side='left')
+    ends = np.searchsorted(groups, np.arange(group_count), side='right')
+    sizes = ends - starts
+    medians = np.full(group_count, np.nan)
+    present = sizes > 0
+    if present.any():
+        low = starts[present] + (sizes[present] - 1) // 2
+        high = starts[present] + sizes[present] // 2
+        medians[present] = (values[low] + values[high]) / 2
+    return medians
+
+
+def compute_cohorts(max_months=ANALYTICS_MAX_MONTHS, batch_size=ANALYTICS_BATCH_SIZE, now=None):
+    """Rebuild the cohort and LTV summary tables; returns row counts and timings"""
+    if np is None:
+        raise RuntimeError("NumPy is required for cohort analytics: pip install numpy")
+
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    width = max_months + 1
+
+    dialect = db.session.get_bind(mapper=Order).dialect.name
+    user_ids, signed_up = _extract(
+        # Primary key order, so purchases map to users with a plain binary search
+        select(User.id, _epoch_seconds(User.created_at, dialect))
+        .where(User.created_at.isnot(None)).order_by(User.id),
+        ('int64', 'int64'), batch_size)
+    # Plans are coded as integers by the database too
+    plan_names = np.array(db.session.execute(select(SubscriptionPlan.id).order_by(SubscriptionPlan.id))
+                          .scalars().all(), dtype=object)
+    purchases = union_all(*(
+        select(model.user_id, _epoch_seconds(model.created_at, dialect), model.total_amount,
+               case({plan: code for code, plan in enumerate(plan_names)}, value=model.plan_id, else_=-1)
+               if len(plan_names) else literal(-1))
+        .where(model.status.in_(PURCHASE_STATUSES), model.created_at.isnot(None))
+        for model in (Order, OrderArchive)
+    ))
+    buyer_ids, bought_at, amounts, plan_codes = _extract(purchases, ('int64',) * 4, batch_size)
+    signed_up = signed_up.astype('datetime64[s]')
+    bought_at = bought_at.astype('datetime64[s]')
+    extracted = time.perf_counter()
+
+    # Map each purchase to its user's row; drop purchases of unknown users or plans
+    position = np.searchsorted(user_ids, buyer_ids).clip(max=max(len(user_ids) - 1, 0))
+    known = np.zeros(len(buyer_ids), dtype=bool)
+    if len(user_ids):
+        known = (user_ids[position] == buyer_ids) & (plan_codes >= 0)
+    buyer = position[known]
+    bought_at, amounts, plan_codes = bought_at[known], amounts[known], plan_codes[known]
+
+    signup_month = _month_number(signed_up)
+    cohort_months, user_cohort = np.unique(signup_month, return_inverse=True)
+    cohort_count = len(cohort_months)
+    purchase_month = _month_number(bought_at)
+    since_signup = np.clip(purchase_month - signup_month[buyer], 0, None)
+
+    # Cohort matrix: distinct buyers and revenue per (cohort, months since signup)
+    in_window = since_signup <= max_months
+    cell = user_cohort[buyer[in_window]] * width + since_signup[in_window]
+    buyer_months = np.unique(buyer[in_window] * width + since_signup[in_window])
+    active = np.bincount(user_cohort[buyer_months // width] * width + buyer_months % width,
+                         minlength=cohort_count * width).reshape(cohort_count, width)
+    revenue = np.bincount(cell, weights=amounts[in_window],
+                          minlength=cohort_count * width).reshape(cohort_count, width)
+
+    # Per-user purchase counts and the gap between first and second purchase
+    purchase_counts = np.bincount(buyer, minlength=len(user_ids))
+    cohort_users = np.bincount(user_cohort, minlength=cohort_count)
+    cohort_buyers = np.bincount(user_cohort, weights=purchase_counts >= 1, minlength=cohort_count)
+    cohort_repeat = np.bincount(user_cohort, weights=purchase_counts >= 2, minlength=cohort_count)
+    cohort_revenue = np.bincount(user_cohort[buyer], weights=amounts, minlength=cohort_count)
+
+    order = np.lexsort((bought_at, buyer))
+    sorted_buyer, sorted_at = buyer[order], bought_at[order]
+    run_starts = np.flatnonzero(np.r_[True, sorted_buyer[1:] != sorted_buyer[:-1]]) if len(order) else \
+        np.empty(0, dtype=np.int64)
+    second = run_starts + 1
+    has_second = second < len(order)
+    has_second[has_second] = sorted_buyer[second[has_second]] == sorted_buyer[run_starts[has_second]]
+    gap_days = ((sorted_at[second[has_second]] - sorted_at[run_starts[has_second]])
+                / np.timedelta64(1, 'D'))
+    median_gap = _group_medians(user_cohort[sorted_buyer[run_starts[has_second]]], gap_days, cohort_count)
+
+    # LTV by first-purchase plan, each customer counted only while observable
+    run_lengths = np.diff(np.r_[run_starts, len(order)])
+    first_month = purchase_month[order][run_starts]
+    first_plan = plan_codes[order][run_starts]
+    age = np.clip(_month_number(np.array([now], dtype='datetime64[s]'))[0] - first_month, 0, max_months)
+    since_first = purchase_month[order] - np.repeat(first_month, run_lengths)
+    customer_age = np.repeat(age, run_lengths)
+    counted = since_first <= customer_age
+    customer_plan = np.repeat(first_plan, run_lengths)[counted]
+    plan_count = len(plan_names)
+    # Revenue enters at its own month and leaves after the customer's last observable month
+    enters = np.bincount(customer_plan * (width + 1) + since_first[counted],
+                         weights=amounts[order][counted], minlength=plan_count * (width + 1))
+    leaves = np.bincount(customer_plan * (width + 1) + customer_age[counted] + 1,
+                         weights=amounts[order][counted], minlength=plan_count * (width + 1))
+    # Month m sums each customer's revenue up to m, over customers aged >= m
+    cumulative = np.cumsum((enters - leaves).reshape(plan_count, width + 1), axis=1)[:, :width]
+    older = np.bincount(first_plan * width + age, minlength=plan_count * width).reshape(plan_count, width)
+    customers = np.cumsum(older[:, ::-1], axis=1)[:, ::-1]
+    ltv = np.divide(cumulative, customers, out=np.zeros(cumulative.shape), where=customers > 0)
+    computed = time.perf_counter()
+
+    summary_rows = [{
+        'cohort_month': _month_start(cohort_months[i]),
+        'users': int(cohort_users[i]),
+        'buyers': int(cohort_buyers[i]),
+        'repeat_buyers': int(cohort_repeat[i]),
+        'revenue': int(cohort_revenue[i]),
+        'median_days_to_second': None if np.isnan(median_gap[i]) else round(float(median_gap[i]), 2),
+    } for i in range(cohort_count)]
+    cohort_last = _month_number(np.array([now], dtype='datetime64[s]'))[0] - cohort_months
+    stat_rows = [{
+        'cohort_month': _month_start(cohort_months[i]),
+        'months_since': months,
+        'active_buyers': int(active[i, months]),
+        'revenue': int(revenue[i, months]),
+    } for i in range(cohort_count) for months in range(min(width, int(cohort_last[i]) + 1))]
+    ltv_rows = [{
+        'plan_id': str(plan_names[p]),
+        'months_since': months,
+        'customers': int(customers[p, months]),
+        'ltv': round(float(ltv[p, months]), 2),
+    } for p in range(plan_count) for months in range(width) if customers[p, months]]
+
+    for model in (CohortSummary, CohortStat, PlanLtv):
+        db.session.execute(delete(model))
+    for model, rows in ((CohortSummary, summary_rows), (CohortStat, stat_rows), (PlanLtv, ltv_rows)):
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+    insert_ignore(SystemSettings, [{
+        'key': COMPUTED_AT_KEY, 'value': '', 'description': 'Last cohort analytics run (cohorts.py)'
+    }], 'key')
+    db.session.execute(update(SystemSettings).where(SystemSettings.key == COMPUTED_AT_KEY)
+                       .values(value=now.isoformat(timespec='seconds')))
+    db.session.commit()
+
+    timings = {
+        'extract_s': round(extracted - started, 2),
+        'compute_s': round(computed - extracted, 2),
+        'total_s': round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"Cohorts rebuilt from {len(user_ids)} users and {len(buyer)} purchases: {timings}")
+    return {'users': len(user_ids), 'purchases': len(buyer), 'cohorts': cohort_count,
+            'plans': plan_count, **timings}
+
+
+def cohort_report(cohorts=12, months=12):
+    """Latest cohorts with retention shares, and LTV curves per plan"""
+    summaries = db.session.execute(
+        select(CohortSummary).order_by(CohortSummary.cohort_month.desc()).limit(cohorts)
+    ).scalars().all()
+    cells = {}
+    if summaries:
+        query = select(CohortStat).where(
+            CohortStat.cohort_month >= summaries[-1].cohort_month, CohortStat.months_since <= months
+        )
+        for stat in db.session.execute(query).scalars():
+            cells[(stat.cohort_month, stat.months_since)] = stat
+
+    rows = []
+    for summary in reversed(summaries):
+        retention = []
+        for offset in range(months + 1):
+            stat = cells.get((summary.cohort_month, offset))
+            if stat is None:
+                break
+            retention.append(round(stat.active_buyers / summary.users, 4) if summary.users else None)
+        rows.append({
+            'cohort': summary.cohort_month.strftime('%Y-%m'),
+            'users': summary.users,
+            'buyers': summary.buyers,
+            'repeat_rate': round(summary.repeat_buyers / summary.buyers, 4) if summary.buyers else None,
+            'revenue': summary.revenue,
+            'median_days_to_second': summary.median_days_to_second,
+            'retention': retention,
+        })
+
+    ltv = {}
+    for point in db.session.execute(
+        select(PlanLtv).where(PlanLtv.months_since <= months).order_by(PlanLtv.plan_id, PlanLtv.months_since)
+    ).scalars():
+        ltv.setdefault(point.plan_id, []).append({'months': point.months_since, 'ltv': point.ltv,
+                                                  'customers': point.customers})
+
+    computed_at = db.session.execute(
+        select(SystemSettings.value).where(SystemSettings.key == COMPUTED_AT_KEY)
+    ).scalar()
+    return {'computed_at': computed_at or None, 'cohorts': rows, 'ltv': ltv}
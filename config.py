@@ -1,5 +1,4 @@
 import os
-import logging
 
 # Конфигурация бота
 BOT_TOKEN = os.getenv("BOT_TOKEN", "demo_mode")
@@ -42,8 +41,78 @@ SUBSCRIPTION_PLANS = {
     }
 }
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Настройка логирования (см. logging_setup.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json или text
+LOG_FILE = os.getenv("LOG_FILE") or None
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Шумные логгеры, записи ниже WARNING которых прореживаются
+LOG_SAMPLED_LOGGERS = [name for name in os.getenv("LOG_SAMPLED_LOGGERS", "aiogram.event,sqlalchemy,werkzeug").split(",") if name]
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "20"))  # записей в секунду на логгер
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "50"))
+
+# Профилирование SQL в админке (см. sql_profiling.py)
+SQL_PROFILING = os.getenv("SQL_PROFILING", "1") not in ("0", "false", "no")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE") or None
+ROUTE_STATS_WINDOW = int(os.getenv("ROUTE_STATS_WINDOW", "500"))  # последних запросов на маршрут
+
+# HTTP-сессия Bot API (см. bot_session.py)
+BOT_API_URL = os.getenv("BOT_API_URL") or None  # свой сервер Bot API или заглушка для бенчмарка
+BOT_API_POOL_SIZE = int(os.getenv("BOT_API_POOL_SIZE", "32"))
+BOT_API_KEEPALIVE = float(os.getenv("BOT_API_KEEPALIVE", "75"))  # секунд простоя соединения
+BOT_API_DNS_TTL = int(os.getenv("BOT_API_DNS_TTL", "300"))
+BOT_API_TIMEOUT = float(os.getenv("BOT_API_TIMEOUT", "15"))
+BOT_API_UPLOAD_TIMEOUT = float(os.getenv("BOT_API_UPLOAD_TIMEOUT", "60"))
+BOT_API_PIPELINING = os.getenv("BOT_API_PIPELINING", "1") not in ("0", "false", "no")
+
+# Outbox уведомлений (см. outbox.py)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))  # секунд, если не разбудили раньше
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BASE_DELAY = float(os.getenv("OUTBOX_BASE_DELAY", "5"))  # секунд до первого повтора
+OUTBOX_MAX_DELAY = float(os.getenv("OUTBOX_MAX_DELAY", "3600"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))  # аренда захваченной пачки
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "14"))
+
+# Очередь заказов для операторов (см. work_queue.py)
+QUEUE_CLAIM_BATCH = int(os.getenv("QUEUE_CLAIM_BATCH", "5"))  # заказов за один захват
+QUEUE_LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", "900"))  # аренда, после которой заказ возвращается в очередь
+
+# Семейные аккаунты Spotify (см. families.py)
+FAMILY_CAPACITY = int(os.getenv("FAMILY_CAPACITY", "6"))  # мест в одном семейном аккаунте
+FAMILY_EXPIRY_WARNING_DAYS = int(os.getenv("FAMILY_EXPIRY_WARNING_DAYS", "7"))
+
+# Когорты, удержание и LTV (см. cohorts.py)
+ANALYTICS_MAX_MONTHS = int(os.getenv("ANALYTICS_MAX_MONTHS", "36"))  # ширина матрицы когорт
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "50000"))  # строк за проход курсора
+
+# Тексты бота (см. messages.py, locales.py)
+DEFAULT_LOCALE = os.getenv("DEFAULT_LOCALE", "ru")  # язык для пользователей без перевода
+
+# Пул соединений с базой (см. db_pool.py)
+DB_POOL_ROLE = os.getenv("DB_POOL_ROLE") or None  # web, bot или cli; по умолчанию — по запущенному скрипту
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0"))  # 0 — рассчитать по числу процессов и max_connections
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "-1"))  # -1 — рассчитать
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))  # 0 — спросить у сервера при старте
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "5"))  # для миграций, psql и manage.py
+DB_BOT_PROCESSES = int(os.getenv("DB_BOT_PROCESSES", "1"))
+DB_BOT_POOL_SIZE = int(os.getenv("DB_BOT_POOL_SIZE", "5"))  # потоков бота, одновременно работающих с базой
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # секунд ожидания свободного соединения
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_PING_AFTER = float(os.getenv("DB_PING_AFTER", "30"))  # секунд простоя, после которых соединение проверяется
+DB_SLOW_CHECKOUT_MS = float(os.getenv("DB_SLOW_CHECKOUT_MS", "100"))
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") not in ("0", "false", "no")  # PgBouncer в режиме transaction
+DATABASE_DIRECT_URL = os.getenv("DATABASE_DIRECT_URL") or None  # в обход PgBouncer, для LISTEN
+
+# Заказы для администратора в боте (см. admin_orders.py)
+ADMIN_ORDERS_PAGE_SIZE = int(os.getenv("ADMIN_ORDERS_PAGE_SIZE", "8"))
+
+# Порядок апдейтов в чате (см. update_executor.py)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))  # обработчиков одновременно во всех чатах; 0 — без предела
+UPDATE_SLOW_WAIT_MS = float(os.getenv("UPDATE_SLOW_WAIT_MS", "1000"))  # ожидание очереди, о котором пишется в лог
+
+# Воронка заказов (см. funnel.py)
+FUNNEL_REFRESH_INTERVAL = float(os.getenv("FUNNEL_REFRESH_INTERVAL", "60"))  # секунд между фоновыми обновлениями; 0 — только manage.py funnel
+FUNNEL_SAFETY_LAG_SECONDS = int(os.getenv("FUNNEL_SAFETY_LAG_SECONDS", "300"))  # дольше самой длинной транзакции с заказом
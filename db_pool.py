@@ -0,0 +1,369 @@
+"""
+Database connection pool: sizing, health checks and metrics
+
+Pool sizes are derived, not guessed. The connection budget is the server's
+max_connections (minus superuser-reserved slots and DB_RESERVED_CONNECTIONS
+for migrations, psql and manage.py), split evenly across every process that
+opens a pool: the gunicorn workers and the bot. Each process then takes what
+it can actually use - one connection per request thread plus the LISTEN
+connection of events.py for a web worker (the extra threads serving admin
+event streams hold no connection), DB_BOT_POOL_SIZE for the bot -
+and keeps the rest of its share as overflow for bursts. The budget is read
+from the server once, and only by the long-running entry points (the
+gunicorn master with preload_app, bot.py, start_bot.py); manage.py,
+benchmarks and other imports of the app assume FALLBACK_MAX_CONNECTIONS
+instead of opening a connection at import time.
+
+Instead of pool_pre_ping's round-trip on every checkout, a connection is
+pinged only when it sat idle in the pool for DB_PING_AFTER seconds; a failed
+ping makes the pool discard it and hand out a fresh one. Busy connections
+are reused without a ping, and a connection that dies between pings is
+caught by SQLAlchemy's disconnect handling like before.
+
+With DB_PGBOUNCER the app talks to PgBouncer in transaction pooling mode:
+PgBouncer owns the server connections, so the app opens a client connection
+per checkout (NullPool) and does no pinging. Session state does not survive
+a transaction there, so the LISTEN relay of events.py needs
+DATABASE_DIRECT_URL pointing past PgBouncer.
+
+Pools report checkouts, wait time, overflow, timeouts, invalidations and
+pings per process at /api/stats/pool.
+"""
+
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+from config import (
+    DB_POOL_ROLE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_MAX_CONNECTIONS, DB_RESERVED_CONNECTIONS,
+    DB_BOT_PROCESSES, DB_BOT_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_PING_AFTER,
+    DB_SLOW_CHECKOUT_MS, DB_PGBOUNCER, DATABASE_DIRECT_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Used when the server cannot be asked
+FALLBACK_MAX_CONNECTIONS = 100
+CLI_POOL_SIZE = 2
+LAST_USED_KEY = 'last_used_at'
+METRICS_KEY = 'pool_metrics'
+BUDGET_QUERY = text(
+    "SELECT current_setting('max_connections')::int"
+    " - current_setting('superuser_reserved_connections')::int"
+)
+BOT_SCRIPTS = ('bot.py', 'start_bot.py')
+# Processes that ask the server for max_connections at startup
+BUDGET_PROBE_SCRIPTS = BOT_SCRIPTS + ('gunicorn',)
+
+
+class PoolMetrics:
+    """Counters of one pool, updated from pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pings = 0
+        self.ping_failures = 0
+
+    def waited(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+            elif seconds * 1000 >= DB_SLOW_CHECKOUT_MS:
+                self.slow_checkouts += 1
+
+    def checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def checkin(self):
+        with self._lock:
+            self.checked_out -= 1
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'peak_checked_out': self.peak_checked_out,
+                'wait_avg_ms': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'slow_checkouts': self.slow_checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'pings': self.pings,
+                'ping_failures': self.ping_failures,
+            }
+
+
+class _Instrumented:
+    """Times how long callers wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _create_connection(self):
+        record = super()._create_connection()
+        # Pool events do not get the pool, so its records carry the metrics
+        record.record_info[METRICS_KEY] = self.metrics
+        self.metrics.count('connects')
+        return record
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            waited = time.perf_counter() - started
+            self.metrics.waited(waited, timed_out=True)
+            logger.error(f"No database connection after {waited:.1f}s: {self.status()}")
+            raise
+        waited = time.perf_counter() - started
+        self.metrics.waited(waited)
+        if waited * 1000 >= DB_SLOW_CHECKOUT_MS:
+            logger.warning(f"Waited {waited * 1000:.0f} ms for a database connection: {self.status()}")
+        return connection
+
+
+class InstrumentedQueuePool(_Instrumented, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_Instrumented, NullPool):
+    pass
+
+
+def _metrics(connection_record):
+    return connection_record.record_info.get(METRICS_KEY) if connection_record is not None else None
+
+
+def _on_connect(dbapi_connection, connection_record):
+    connection_record.info[LAST_USED_KEY] = time.monotonic()
+    metrics = _metrics(connection_record)
+    if metrics is not None:
+        # A reconnect of an invalidated record; new records are counted in _create_connection
+        metrics.count('connects')
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics = _metrics(connection_record)
+    last_used = connection_record.info.get(LAST_USED_KEY)
+    if DB_PING_AFTER > 0 and last_used is not None and time.monotonic() - last_used >= DB_PING_AFTER:
+        metrics.count('pings')
+        try:
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except Exception as e:
+            metrics.count('ping_failures')
+            logger.warning(f"Idle database connection failed its ping, reconnecting: {e}")
+            # The pool invalidates this connection and retries with a new one
+            raise exc.DisconnectionError() from e
+    metrics.checkout()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    connection_record.info[LAST_USED_KEY] = time.monotonic()
+    metrics = _metrics(connection_record)
+    if metrics is not None:
+        metrics.checkin()
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    metrics = _metrics(connection_record)
+    if metrics is not None:
+        metrics.count('invalidations')
+
+
+for _pool_class in (InstrumentedQueuePool, InstrumentedNullPool):
+    event.listen(_pool_class, 'connect', _on_connect)
+    event.listen(_pool_class, 'checkout', _on_checkout)
+    event.listen(_pool_class, 'checkin', _on_checkin)
+    event.listen(_pool_class, 'invalidate', _on_invalidate)
+    event.listen(_pool_class, 'soft_invalidate', _on_invalidate)
+
+
+def process_role():
+    """web, bot or cli: which kind of process opens this pool"""
+    if DB_POOL_ROLE:
+        return DB_POOL_ROLE
+    script = os.path.basename(sys.argv[0]) if sys.argv else ''
+    if script in BOT_SCRIPTS:
+        return 'bot'
+    if script == 'manage.py':
+        return 'cli'
+    return 'web'
+
+
+def web_concurrency():
+    """(workers, concurrent requests per worker), read like gunicorn.conf.py does"""
+    worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+    workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+    if worker_class in ('gthread', 'threaded'):
+        return workers, int(os.environ.get('WEB_THREADS', '4'))
+    if worker_class == 'gevent':
+        return workers, int(os.environ.get('WEB_CONNECTIONS', '100'))
+    return workers, 1
+
+
+def sse_streams_per_worker():
+    """Admin event streams one web worker serves, on threads beyond WEB_THREADS
+
+    A sync worker would be killed by the gunicorn timeout mid-stream, so it
+    serves none.
+    """
+    worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+    default = {'gthread': 2, 'threaded': 2, 'gevent': 20}.get(worker_class, 0)
+    return int(os.environ.get('WEB_SSE_STREAMS', default))
+
+
+def _probes_budget():
+    script = os.path.basename(sys.argv[0]) if sys.argv else ''
+    return script in BUDGET_PROBE_SCRIPTS
+
+
+def server_budget(url):
+    """Connections the server accepts from regular users, or None if it cannot be asked"""
+    try:
+        engine = create_engine(url, poolclass=NullPool, connect_args={'connect_timeout': 5})
+        try:
+            with engine.connect() as conn:
+                return int(conn.execute(BUDGET_QUERY).scalar())
+        finally:
+            engine.dispose()
+    except Exception as e:
+        logger.warning(f"Could not read max_connections, assuming {FALLBACK_MAX_CONNECTIONS}: {e}")
+        return None
+
+
+def plan_pool(role, budget):
+    """Pool size and overflow for this process out of a connection budget"""
+    workers, per_worker = web_concurrency()
+    processes = max(1, workers + DB_BOT_PROCESSES)
+    share = max(1, (budget - DB_RESERVED_CONNECTIONS) // processes)
+    if role == 'bot':
+        wanted = DB_BOT_POOL_SIZE
+    elif role == 'cli':
+        wanted = CLI_POOL_SIZE
+    else:
+        # One connection per request in flight, plus the LISTEN relay;
+        # event stream threads hold none
+        wanted = per_worker + 1
+    pool_size = DB_POOL_SIZE or max(1, min(wanted, share))
+    max_overflow = DB_MAX_OVERFLOW if DB_MAX_OVERFLOW >= 0 else max(0, min(share - pool_size, pool_size))
+    return {
+        'role': role,
+        'budget': budget,
+        'processes': processes,
+        'share': share,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+    }
+
+
+def _is_postgres(url):
+    return bool(url) and url.startswith(('postgres://', 'postgresql'))
+
+
+def engine_options(url):
+    """SQLAlchemy engine options and the sizing they were derived from"""
+    role = process_role()
+    if DB_PGBOUNCER:
+        options = {'poolclass': InstrumentedNullPool}
+        if make_url(url).get_dialect().driver == 'psycopg':
+            # Server-side prepared statements do not survive transaction pooling
+            options['connect_args'] = {'prepare_threshold': None}
+        return options, {'role': role, 'mode': 'pgbouncer'}
+
+    budget = DB_MAX_CONNECTIONS
+    if not budget and not DB_POOL_SIZE and _is_postgres(url) and _probes_budget():
+        budget = server_budget(url)
+    plan = plan_pool(role, budget or FALLBACK_MAX_CONNECTIONS)
+    plan['mode'] = 'pool'
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': plan['pool_size'],
+        'max_overflow': plan['max_overflow'],
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': False,
+    }
+    return options, plan
+
+
+def configure_app(app):
+    """Size and instrument the app's pools; run before db.init_app"""
+    url = app.config.get("SQLALCHEMY_DATABASE_URI")
+    if not url or url.startswith('sqlite'):
+        # SQLite brings its own engine options (see sqlite_mode.py)
+        return
+    options, plan = engine_options(url)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    app.extensions['db_pool'] = plan
+    if plan['mode'] == 'pool':
+        logger.info(f"Database pool for {plan['role']}: size {plan['pool_size']}, overflow {plan['max_overflow']} "
+                    f"({plan['share']} of {plan['budget']} connections across {plan['processes']} processes)")
+    else:
+        logger.info("Database pool: PgBouncer transaction mode, one client connection per checkout")
+
+
+def pool_stats(engine):
+    """Metrics and current occupancy of an engine's pool"""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), overflow=pool.overflow(), idle=pool.checkedin())
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        stats.update(metrics.snapshot())
+    else:
+        stats['status'] = pool.status()
+    return stats
+
+
+_direct_engine = None
+_direct_lock = threading.Lock()
+
+
+def listener_engine(engine):
+    """Engine for session-level features (LISTEN), or None if there is none
+
+    Through PgBouncer in transaction mode a LISTEN is lost as soon as the
+    transaction ends, so it needs DATABASE_DIRECT_URL.
+    """
+    global _direct_engine
+    if not DB_PGBOUNCER:
+        return engine
+    if not DATABASE_DIRECT_URL:
+        return None
+    with _direct_lock:
+        if _direct_engine is None:
+            _direct_engine = create_engine(DATABASE_DIRECT_URL, poolclass=NullPool)
+        return _direct_engine
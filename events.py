@@ -0,0 +1,252 @@
+"""
+Live admin events: new orders, order status changes and payments
+
+Events are produced by ORM flush hooks on Order and Payment, so every write
+path (bot handlers, admin API, storage helpers) feeds them automatically.
+On PostgreSQL they travel through NOTIFY inside the writing transaction and
+reach every web worker via a single LISTEN connection per process; on other
+databases they are dispatched in-process after commit. Connected admin
+browsers receive them over server-sent events without polling the database.
+
+An open stream occupies a worker thread (a greenlet under gevent) for as
+long as the tab stays open, so each worker serves at most WEB_SSE_STREAMS
+of them and answers 503 beyond that; gunicorn.conf.py adds those threads on
+top of WEB_THREADS so streams never take request threads. Streams hold no
+database connection.
+"""
+
+import itertools
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy import select as sql_select
+from sqlalchemy.orm import Session, object_session
+from db_pool import listener_engine, sse_streams_per_worker
+from models import Order, Payment
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'admin_events'
+PENDING_EVENTS_KEY = 'pending_admin_events'
+
+# Per-subscriber buffer; slow browsers drop events instead of blocking writers
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_INTERVAL = 15
+
+
+class EventBroker:
+    """In-process fan-out of events to SSE subscribers"""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE, max_subscribers=None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self):
+        """A new subscriber queue, or None when the worker has no stream slot left"""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def dispatch(self, evt):
+        evt = dict(evt, id=next(self._ids))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(evt)
+            except queue.Full:
+                logger.warning("Admin event subscriber is too slow, dropping event")
+
+
+broker = EventBroker(max_subscribers=sse_streams_per_worker())
+
+
+class PgEventListener:
+    """Relays NOTIFY messages from PostgreSQL into the local broker
+
+    Started lazily on the first SSE subscriber, one thread per process.
+    """
+
+    def __init__(self, engine, channel=NOTIFY_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='pg-event-listener', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"Admin event listener error, reconnecting: {e}")
+                time.sleep(5)
+
+    def _listen(self):
+        conn = self.engine.raw_connection()
+        try:
+            dbapi_conn = conn.driver_connection
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            logger.info(f"Listening for admin events on '{self.channel}'")
+
+            while True:
+                if select.select([dbapi_conn], [], [], KEEPALIVE_INTERVAL) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    notify = dbapi_conn.notifies.pop(0)
+                    try:
+                        broker.dispatch(json.loads(notify.payload))
+                    except ValueError:
+                        logger.warning(f"Malformed admin event payload: {notify.payload!r}")
+        finally:
+            conn.invalidate()
+
+
+_listener = None
+
+
+def ensure_listener(engine):
+    """Start the NOTIFY relay when running on PostgreSQL"""
+    global _listener
+    if engine.dialect.name != 'postgresql':
+        return
+    if _listener is None:
+        listen_engine = listener_engine(engine)
+        if listen_engine is None:
+            logger.warning("LISTEN does not work through PgBouncer; set DATABASE_DIRECT_URL for live admin events")
+            return
+        _listener = PgEventListener(listen_engine)
+    _listener.ensure_started()
+
+
+def status_value(status):
+    return status.value if hasattr(status, 'value') else status
+
+
+def _emit(connection, session, event_type, data):
+    """Queue an event for delivery once the writing transaction commits"""
+    evt = {'type': event_type, 'data': data, 'ts': datetime.utcnow().isoformat()}
+
+    if connection.dialect.name == 'postgresql':
+        # NOTIFY is transactional: delivered on commit, discarded on rollback
+        connection.execute(sql_select(func.pg_notify(NOTIFY_CHANNEL, json.dumps(evt, ensure_ascii=False))))
+        return
+
+    if session is not None:
+        session.info.setdefault(PENDING_EVENTS_KEY, []).append(evt)
+
+
+def status_change(target):
+    """Return (old, new) status values if status changed in this flush"""
+    history = inspect(target).attrs.status.history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    return status_value(old), status_value(target.status)
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_inserted(mapper, connection, target):
+    _emit(connection, object_session(target), 'new_order', {
+        'order_id': target.id,
+        'user_id': target.user_id,
+        'plan_id': target.plan_id,
+        'total_amount': target.total_amount,
+        'status': status_value(target.status),
+    })
+
+
+def emit_status_change(connection, session, order_id, user_id, old_status, status):
+    """Announce an order status change made outside of an ORM flush"""
+    _emit(connection, session, 'status_change', {
+        'order_id': order_id,
+        'user_id': user_id,
+        'old_status': old_status,
+        'status': status,
+    })
+
+
+@event.listens_for(Order, 'after_update')
+def _order_updated(mapper, connection, target):
+    change = status_change(target)
+    if change:
+        emit_status_change(connection, object_session(target), target.id, target.user_id, *change)
+
+
+def _payment_event(connection, target):
+    _emit(connection, object_session(target), 'payment', {
+        'payment_id': target.id,
+        'order_id': target.order_id,
+        'user_id': target.user_id,
+        'amount': target.amount,
+        'status': status_value(target.status),
+    })
+
+
+@event.listens_for(Payment, 'after_insert')
+def _payment_inserted(mapper, connection, target):
+    _payment_event(connection, target)
+
+
+@event.listens_for(Payment, 'after_update')
+def _payment_updated(mapper, connection, target):
+    if status_change(target):
+        _payment_event(connection, target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_pending(session):
+    for evt in session.info.pop(PENDING_EVENTS_KEY, []):
+        broker.dispatch(evt)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(PENDING_EVENTS_KEY, None)
+
+
+def format_sse(evt):
+    """Encode an event as a server-sent events frame"""
+    data = json.dumps({'data': evt['data'], 'ts': evt['ts']}, ensure_ascii=False)
+    return f"id: {evt['id']}\nevent: {evt['type']}\ndata: {data}\n\n"
+
+
+def sse_stream(q, keepalive=KEEPALIVE_INTERVAL):
+    """Yield SSE frames for a subscribed queue until the client disconnects"""
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                yield format_sse(q.get(timeout=keepalive))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(q)
@@ -0,0 +1,209 @@
+"""
+Streaming exports of orders, payments and users
+Rows are read through server-side cursors and serialized straight from
+column tuples, so memory stays flat regardless of table size
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+import enum
+
+from sqlalchemy import select, union_all
+from app import db
+from models import User, Order, SubscriptionPlan, Payment, OrderArchive, PaymentArchive, OrderStatus, PaymentStatus
+
+# Rows fetched from the server-side cursor per round-trip
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Exported columns per entity; secrets such as spotify_password are never exported
+EXPORT_COLUMNS = {
+    'orders': [
+        ('id', Order.id),
+        ('user_id', Order.user_id),
+        ('username', User.username),
+        ('plan_id', Order.plan_id),
+        ('plan_name', SubscriptionPlan.name),
+        ('spotify_login', Order.spotify_login),
+        ('status', Order.status),
+        ('total_amount', Order.total_amount),
+        ('digiseller_order_id', Order.digiseller_order_id),
+        ('created_at', Order.created_at),
+        ('updated_at', Order.updated_at),
+        ('completed_at', Order.completed_at),
+    ],
+    'payments': [
+        ('id', Payment.id),
+        ('order_id', Payment.order_id),
+        ('user_id', Payment.user_id),
+        ('amount', Payment.amount),
+        ('currency', Payment.currency),
+        ('status', Payment.status),
+        ('payment_method', Payment.payment_method),
+        ('external_payment_id', Payment.external_payment_id),
+        ('paid_at', Payment.paid_at),
+        ('created_at', Payment.created_at),
+    ],
+    'users': [
+        ('id', User.id),
+        ('username', User.username),
+        ('first_name', User.first_name),
+        ('last_name', User.last_name),
+        ('language_code', User.language_code),
+        ('role', User.role),
+        ('is_active', User.is_active),
+        ('is_banned', User.is_banned),
+        ('created_at', User.created_at),
+        ('last_activity', User.last_activity),
+    ],
+}
+
+# Model and status enum per entity
+EXPORT_ENTITIES = {
+    'orders': (Order, OrderStatus),
+    'payments': (Payment, PaymentStatus),
+    'users': (User, None),
+}
+
+# Archive tables mirroring the live ones (see archive.py)
+ARCHIVE_MODELS = {
+    'orders': OrderArchive,
+    'payments': PaymentArchive,
+}
+
+
+def parse_date(value):
+    """Parse YYYY-MM-DD filter values, returning None for empty input"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _entity_select(entity, model, date_from, date_to, status, status_enum):
+    """Column-only SELECT of one table (live or archive) with filters applied"""
+    live_model = EXPORT_ENTITIES[entity][0]
+    columns = [
+        getattr(model, column.key) if model is not live_model and column.table is live_model.__table__ else column
+        for _, column in EXPORT_COLUMNS[entity]
+    ]
+    query = select(*columns)
+
+    if entity == 'orders':
+        query = (query.select_from(model)
+                 .outerjoin(User, model.user_id == User.id)
+                 .outerjoin(SubscriptionPlan, model.plan_id == SubscriptionPlan.id))
+
+    if date_from:
+        query = query.where(model.created_at >= date_from)
+    if date_to:
+        query = query.where(model.created_at < date_to + timedelta(days=1))
+    if status:
+        query = query.where(model.status == status_enum(status))
+    return query
+
+
+def build_export_query(entity, date_from=None, date_to=None, status=None, include_archived=False):
+    """Build a column-only SELECT for an entity with date-range and status filters
+
+    date_to is inclusive: rows created on that day are exported. With
+    include_archived, archived orders/payments are merged in via UNION ALL.
+    Raises ValueError for an unknown entity or status.
+    """
+    if entity not in EXPORT_COLUMNS:
+        raise ValueError(f'Unknown export entity: {entity}')
+
+    model, status_enum = EXPORT_ENTITIES[entity]
+    if status:
+        if status_enum is None:
+            raise ValueError(f'{entity} export does not support status filter')
+        status_enum(status)
+
+    query = _entity_select(entity, model, date_from, date_to, status, status_enum)
+    if not include_archived or entity not in ARCHIVE_MODELS:
+        return query.order_by(model.created_at, model.id)
+
+    archived = _entity_select(entity, ARCHIVE_MODELS[entity], date_from, date_to, status, status_enum)
+    combined = union_all(query, archived).subquery()
+    return select(*combined.c).order_by(combined.c.created_at, combined.c.id)
+
+
+def _plain(value):
+    """Convert a column value into a JSON/CSV friendly scalar"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def iter_export_batches(entity, **filters):
+    """Yield lists of plain row tuples, one list per server-side cursor batch"""
+    query = build_export_query(entity, **filters)
+    result = db.session.execute(
+        query,
+        execution_options={'yield_per': EXPORT_BATCH_SIZE, 'stream_results': True}
+    )
+    try:
+        for partition in result.partitions():
+            yield [tuple(_plain(value) for value in row) for row in partition]
+    finally:
+        result.close()
+
+
+def iter_csv(entity, **filters):
+    """Yield CSV text chunks: the header first, then one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS[entity]])
+    yield buffer.getvalue()
+
+    for batch in iter_export_batches(entity, **filters):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def iter_jsonl(entity, **filters):
+    """Yield JSON Lines chunks, one chunk per batch"""
+    names = [name for name, _ in EXPORT_COLUMNS[entity]]
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    for batch in iter_export_batches(entity, **filters):
+        yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in batch)
+
+
+def iter_export(entity, fmt='csv', compress=False, **filters):
+    """Yield encoded export chunks, optionally gzip-compressed on the fly"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {fmt}')
+
+    # Validate filters eagerly so errors surface before streaming starts
+    build_export_query(entity, **filters)
+
+    chunks = iter_csv(entity, **filters) if fmt == 'csv' else iter_jsonl(entity, **filters)
+    encoded = (chunk.encode('utf-8') for chunk in chunks)
+    return gzip_stream(encoded) if compress else encoded
+
+
+def gzip_stream(chunks):
+    """Compress a stream of byte chunks into a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_filename(entity, fmt, compress=False):
+    """Build a download filename such as orders_20250101_093000.csv.gz"""
+    suffix = '.gz' if compress else ''
+    return f"{entity}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{fmt}{suffix}"
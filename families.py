@@ -0,0 +1,202 @@
+"""
+Spotify family seat inventory and allocation
+
+Every FamilyAccount has `capacity` FamilySlot rows and a denormalized
+free_slots counter. A paid order gets the seat that fits best: among active
+families with a free seat whose own subscription lasts at least as long as
+the order's, the one expiring soonest, and of those the fullest. Short
+orders fill families that are about to lapse, and new families stay empty
+for long orders.
+
+The lookup is a single range read on a partial index over (paid_until,
+free_slots) that only holds families with free seats, so it costs O(log n)
+whatever the number of families, and the index stays correct across
+gunicorn workers and the bot process without an in-memory structure to
+keep in sync. The seat is then taken with a conditional decrement of
+free_slots. When that races with another allocator, the next candidate is
+tried.
+
+A seat whose order expired, was cancelled or refunded becomes `expired`:
+the member still has to be removed from the family by hand, and free_slot()
+returns it to the pool once that is done.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from config import FAMILY_CAPACITY, FAMILY_EXPIRY_WARNING_DAYS
+from models import FamilyAccount, FamilySlot, Order, OrderStatus, SubscriptionPlan
+
+logger = logging.getLogger(__name__)
+
+DAYS_PER_MONTH = 30
+ALLOCATION_ATTEMPTS = 5
+# Orders that may get a seat
+ALLOCATABLE_STATUSES = (OrderStatus.PAID, OrderStatus.PROCESSING)
+
+
+class NoFamilyAvailable(Exception):
+    """No active family has a free seat for the whole order term"""
+
+    def __init__(self, order_id, expires_at):
+        super().__init__(f"No family seat available for order {order_id} until {expires_at:%Y-%m-%d}")
+        self.order_id = order_id
+        self.expires_at = expires_at
+
+
+def order_expiry(start, duration_months):
+    return start + timedelta(days=DAYS_PER_MONTH * duration_months)
+
+
+def create_family(session, label, owner_login, paid_until, capacity=FAMILY_CAPACITY, **fields):
+    """Add a family account with all of its seats free; the caller commits"""
+    family = FamilyAccount(label=label, owner_login=owner_login, paid_until=paid_until,
+                           capacity=capacity, free_slots=capacity, **fields)
+    family.slots = [FamilySlot(slot_number=number, status='free') for number in range(1, capacity + 1)]
+    session.add(family)
+    return family
+
+
+def _candidate(session, expires_at, dialect):
+    query = (select(FamilyAccount.id)
+             .where(FamilyAccount.is_active == True,
+                    FamilyAccount.free_slots > 0,
+                    FamilyAccount.paid_until >= expires_at)
+             .order_by(FamilyAccount.paid_until, FamilyAccount.free_slots, FamilyAccount.id)
+             .limit(1))
+    if dialect == 'postgresql':
+        # A family another allocator is filling right now is skipped, not waited for
+        query = query.with_for_update(skip_locked=True)
+    return session.execute(query).scalar()
+
+
+def allocate_slot(session, order_id, now=None):
+    """Give the order a seat in the best-fitting family; the caller commits
+
+    Returns the slot, existing or new. Raises LookupError for an unknown
+    order or one that is not paid, and NoFamilyAvailable when nothing fits.
+    """
+    existing = session.execute(
+        select(FamilySlot).where(FamilySlot.order_id == order_id, FamilySlot.status == 'assigned')
+    ).scalar()
+    if existing is not None:
+        return existing
+
+    order = session.execute(
+        select(Order.user_id, Order.status, SubscriptionPlan.duration_months)
+        .join(SubscriptionPlan, SubscriptionPlan.id == Order.plan_id)
+        .where(Order.id == order_id)
+    ).first()
+    if order is None or order.status not in ALLOCATABLE_STATUSES:
+        raise LookupError(f"Order {order_id} not found or not paid")
+
+    now = now or datetime.utcnow()
+    expires_at = order_expiry(now, order.duration_months)
+    dialect = session.get_bind(mapper=FamilyAccount).dialect.name
+
+    for _ in range(ALLOCATION_ATTEMPTS):
+        family_id = _candidate(session, expires_at, dialect)
+        if family_id is None:
+            break
+        taken = session.execute(
+            update(FamilyAccount)
+            .where(FamilyAccount.id == family_id, FamilyAccount.free_slots > 0)
+            .values(free_slots=FamilyAccount.free_slots - 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not taken:
+            # Another allocator took the last seat in between
+            continue
+        # The decrement holds the family row until commit, so this seat is ours
+        slot = session.execute(
+            select(FamilySlot)
+            .where(FamilySlot.family_id == family_id, FamilySlot.status == 'free')
+            .order_by(FamilySlot.slot_number)
+            .limit(1)
+        ).scalar_one()
+        slot.status = 'assigned'
+        slot.order_id = order_id
+        slot.user_id = order.user_id
+        slot.assigned_at = now
+        slot.expires_at = expires_at
+        session.flush()
+        logger.info(f"Order {order_id} allocated to family {family_id} seat {slot.slot_number}")
+        return slot
+
+    raise NoFamilyAvailable(order_id, expires_at)
+
+
+def release_order_slot(session, order_id):
+    """Mark the order's seat for removal (cancelled or refunded order); returns how many"""
+    return session.execute(
+        update(FamilySlot)
+        .where(FamilySlot.order_id == order_id, FamilySlot.status == 'assigned')
+        .values(status='expired')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def reclaim_expired(session, now=None):
+    """Mark seats whose term ended for removal; returns how many, the caller commits"""
+    now = now or datetime.utcnow()
+    reclaimed = session.execute(
+        update(FamilySlot)
+        .where(FamilySlot.status == 'assigned', FamilySlot.expires_at < now)
+        .values(status='expired')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if reclaimed:
+        logger.info(f"{reclaimed} family seats expired and await member removal")
+    return reclaimed
+
+
+def free_slot(session, slot_id):
+    """Return an expired seat to the pool once its member is removed; the caller commits"""
+    family_id = session.execute(select(FamilySlot.family_id).where(FamilySlot.id == slot_id)).scalar()
+    freed = session.execute(
+        update(FamilySlot)
+        .where(FamilySlot.id == slot_id, FamilySlot.status == 'expired')
+        .values(status='free', order_id=None, user_id=None, assigned_at=None, expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not freed:
+        return False
+    session.execute(
+        update(FamilyAccount)
+        .where(FamilyAccount.id == family_id)
+        .values(free_slots=FamilyAccount.free_slots + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def inventory(session, now=None):
+    """Seat totals and families that need attention"""
+    now = now or datetime.utcnow()
+    by_status = dict(session.execute(
+        select(FamilySlot.status, func.count())
+        .join(FamilyAccount, FamilyAccount.id == FamilySlot.family_id)
+        .where(FamilyAccount.is_active == True)
+        .group_by(FamilySlot.status)
+    ).all())
+    expiring = session.execute(
+        select(FamilyAccount)
+        .where(FamilyAccount.is_active == True,
+               FamilyAccount.paid_until < now + timedelta(days=FAMILY_EXPIRY_WARNING_DAYS))
+        .order_by(FamilyAccount.paid_until)
+    ).scalars().all()
+    awaiting_removal = session.execute(
+        select(FamilySlot).where(FamilySlot.status == 'expired').order_by(FamilySlot.expires_at)
+    ).scalars().all()
+    return {
+        'families': session.execute(
+            select(func.count()).select_from(FamilyAccount).where(FamilyAccount.is_active == True)
+        ).scalar(),
+        'free': by_status.get('free', 0),
+        'assigned': by_status.get('assigned', 0),
+        'expired': by_status.get('expired', 0),
+        'expiring_families': [family.to_dict() for family in expiring],
+        'awaiting_removal': [slot.to_dict() for slot in awaiting_removal],
+    }
@@ -0,0 +1,328 @@
+"""
+Order lifecycle event log and funnel analytics
+
+Every order status transition is appended to `order_events` in the same
+transaction as the change: flush hooks collect the transitions and write
+them with one executemany INSERT per flush. The funnel report reads
+`order_funnel_stats`, a per-plan, per-day rollup that refresh_funnel()
+advances incrementally from a watermark instead of rescanning orders.
+Admin requests only read the rollup. Each web worker advances it from a
+background thread every FUNNEL_REFRESH_INTERVAL seconds (ensure_refresher);
+`manage.py funnel` does the same on demand.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, event, exists, func, insert, inspect, literal, null, select, update
+from sqlalchemy.orm import Session, object_session
+from app import db
+from config import FUNNEL_SAFETY_LAG_SECONDS, FUNNEL_REFRESH_INTERVAL
+from models import Order, OrderEvent, OrderFunnelStat, OrderStatus, SystemSettings, insert_ignore
+from events import status_change, status_value
+
+logger = logging.getLogger(__name__)
+
+PENDING_ORDER_EVENTS_KEY = 'pending_order_events'
+WATERMARK_KEY = 'funnel_last_event_id'
+REFRESH_BATCH_SIZE = 50000
+IN_CLAUSE_CHUNK = 1000
+
+# Happy path of an order; conversion is reported between consecutive stages
+FUNNEL_STAGES = ['created', 'awaiting_payment', 'paid', 'completed']
+
+
+def _event_row(order_id, user_id, plan_id, from_status, to_status):
+    return {
+        'order_id': order_id,
+        'user_id': user_id,
+        'plan_id': plan_id,
+        'from_status': from_status,
+        'to_status': to_status or OrderStatus.CREATED.value,
+        'created_at': datetime.utcnow(),
+    }
+
+
+def _queue_event(target, from_status, to_status):
+    session = object_session(target)
+    if session is None:
+        return
+    session.info.setdefault(PENDING_ORDER_EVENTS_KEY, []).append(
+        _event_row(target.id, target.user_id, target.plan_id, from_status, to_status)
+    )
+
+
+def log_order_event(connection, order_id, user_id, plan_id, from_status, to_status):
+    """Write one event for a transition made outside of an ORM flush"""
+    connection.execute(insert(OrderEvent.__table__),
+                       [_event_row(order_id, user_id, plan_id, from_status, to_status)])
+
+
+@event.listens_for(Order, 'after_insert')
+def _log_created(mapper, connection, target):
+    _queue_event(target, None, status_value(target.status))
+
+
+@event.listens_for(Order, 'after_update')
+def _log_transition(mapper, connection, target):
+    change = status_change(target)
+    if change:
+        _queue_event(target, *change)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_order_events(session, flush_context):
+    rows = session.info.pop(PENDING_ORDER_EVENTS_KEY, None)
+    if rows:
+        connection = session.connection(bind_arguments={'mapper': inspect(OrderEvent)})
+        connection.execute(insert(OrderEvent.__table__), rows)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_order_events(session):
+    session.info.pop(PENDING_ORDER_EVENTS_KEY, None)
+
+
+def _upsert_stats(rows):
+    """Add counts to existing (plan_id, day, status) rows or insert new ones"""
+    table = OrderFunnelStat.__table__
+    dialect = db.session.get_bind(mapper=OrderFunnelStat).dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.plan_id, table.c.day, table.c.status],
+            set_={
+                'event_count': table.c.event_count + stmt.excluded.event_count,
+                'duration_sum': table.c.duration_sum + stmt.excluded.duration_sum,
+                'duration_count': table.c.duration_count + stmt.excluded.duration_count,
+            }
+        )
+        db.session.execute(stmt)
+        return
+
+    for row in rows:
+        stat = db.session.get(OrderFunnelStat, (row['plan_id'], row['day'], row['status']))
+        if stat is None:
+            db.session.add(OrderFunnelStat(**row))
+        else:
+            stat.event_count += row['event_count']
+            stat.duration_sum += row['duration_sum']
+            stat.duration_count += row['duration_count']
+
+
+def _creation_times(order_ids):
+    """Map order_id -> time of its 'created' event, in IN-clause sized chunks"""
+    order_ids = list(order_ids)
+    created = {}
+    for start in range(0, len(order_ids), IN_CLAUSE_CHUNK):
+        chunk = order_ids[start:start + IN_CLAUSE_CHUNK]
+        created.update(db.session.execute(
+            select(OrderEvent.order_id, func.min(OrderEvent.created_at))
+            .where(OrderEvent.order_id.in_(chunk), OrderEvent.to_status == OrderStatus.CREATED.value)
+            .group_by(OrderEvent.order_id)
+        ).all())
+    return created
+
+
+def refresh_funnel(batch_size=REFRESH_BATCH_SIZE, safety_lag=FUNNEL_SAFETY_LAG_SECONDS):
+    """Fold order events past the watermark into order_funnel_stats
+
+    Returns the number of events processed. Concurrent refreshes are safe:
+    the watermark only advances if it still has the value read at the start,
+    otherwise this refresh rolls back. Events newer than safety_lag seconds
+    wait for a later refresh.
+    """
+    watermark = select(SystemSettings.value).where(SystemSettings.key == WATERMARK_KEY)
+    last_id = db.session.execute(watermark).scalar()
+    if last_id is None:
+        insert_ignore(SystemSettings, [{
+            'key': WATERMARK_KEY, 'value': '0',
+            'description': 'Последнее событие заказа, учтенное в воронке',
+        }], 'key')
+        last_id = db.session.execute(watermark).scalar()
+    last_id = int(last_id or 0)
+
+    events = db.session.execute(
+        select(OrderEvent.id, OrderEvent.order_id, OrderEvent.plan_id,
+               OrderEvent.to_status, OrderEvent.created_at)
+        .where(OrderEvent.id > last_id)
+        .order_by(OrderEvent.id)
+        .limit(batch_size)
+    ).all()
+    # Ids are taken at insert, not at commit: a lower id may still be in an
+    # open transaction. Stop at the first event younger than the lag so the
+    # watermark never passes one that could still appear.
+    cutoff = datetime.utcnow() - timedelta(seconds=safety_lag)
+    for index, e in enumerate(events):
+        if e.created_at >= cutoff:
+            events = events[:index]
+            break
+    if not events:
+        db.session.commit()
+        return 0
+
+    created = _creation_times({e.order_id for e in events if e.to_status != OrderStatus.CREATED.value})
+
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for e in events:
+        bucket = totals[(e.plan_id or '', e.created_at.date(), e.to_status)]
+        bucket[0] += 1
+        started = created.get(e.order_id)
+        if started is not None and e.to_status != OrderStatus.CREATED.value:
+            bucket[1] += (e.created_at - started).total_seconds()
+            bucket[2] += 1
+
+    _upsert_stats([
+        {'plan_id': plan_id, 'day': day, 'status': status,
+         'event_count': count, 'duration_sum': duration_sum, 'duration_count': duration_count}
+        for (plan_id, day, status), (count, duration_sum, duration_count) in totals.items()
+    ])
+
+    advanced = db.session.execute(
+        update(SystemSettings)
+        .where(SystemSettings.key == WATERMARK_KEY, SystemSettings.value == str(last_id))
+        .values(value=str(events[-1].id), updated_at=datetime.utcnow())
+    )
+    if advanced.rowcount != 1:
+        db.session.rollback()
+        logger.info("Funnel refresh lost the race to a concurrent refresh")
+        return 0
+
+    db.session.commit()
+    return len(events)
+
+
+def refresh_all():
+    """Refresh until no foldable events are left; returns the number folded"""
+    processed = total = refresh_funnel()
+    while processed:
+        processed = refresh_funnel()
+        total += processed
+    return total
+
+
+class FunnelRefresher:
+    """Advances the rollup in the background, one thread per process"""
+
+    def __init__(self, app, interval=FUNNEL_REFRESH_INTERVAL):
+        self.app = app
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='funnel-refresher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    processed = refresh_all()
+                if processed:
+                    logger.info(f"Funnel refreshed with {processed} new events")
+            except Exception as e:
+                logger.error(f"Funnel refresh failed: {e}")
+            # Jitter keeps the workers' refreshes from colliding on the watermark
+            time.sleep(self.interval * random.uniform(0.8, 1.2))
+
+
+_refresher = None
+
+
+def ensure_refresher(app):
+    """Start the background refresh unless FUNNEL_REFRESH_INTERVAL is 0"""
+    global _refresher
+    if FUNNEL_REFRESH_INTERVAL <= 0:
+        return
+    if _refresher is None:
+        _refresher = FunnelRefresher(app)
+    _refresher.ensure_started()
+
+
+def funnel_report(days=30, plan_id=None, refresh=True):
+    """Funnel counts, stage conversion and average time-to-stage per plan"""
+    if refresh:
+        refresh_funnel()
+
+    # Event days are UTC dates
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    query = (select(OrderFunnelStat.plan_id, OrderFunnelStat.status,
+                    func.sum(OrderFunnelStat.event_count),
+                    func.sum(OrderFunnelStat.duration_sum),
+                    func.sum(OrderFunnelStat.duration_count))
+             .where(OrderFunnelStat.day >= since)
+             .group_by(OrderFunnelStat.plan_id, OrderFunnelStat.status))
+    if plan_id:
+        query = query.where(OrderFunnelStat.plan_id == plan_id)
+
+    per_plan = defaultdict(dict)
+    for plan, status, count, duration_sum, duration_count in db.session.execute(query):
+        per_plan[plan][status] = (int(count or 0), float(duration_sum or 0), int(duration_count or 0))
+
+    def summarize(stats):
+        stages = []
+        previous = None
+        for stage in FUNNEL_STAGES:
+            count = stats.get(stage, (0, 0.0, 0))[0]
+            stages.append({
+                'status': stage,
+                'count': count,
+                'conversion': round(count / previous, 4) if previous else None,
+            })
+            previous = count
+        avg_seconds = {
+            status: round(duration_sum / duration_count, 1)
+            for status, (_, duration_sum, duration_count) in stats.items() if duration_count
+        }
+        created = stats.get('created', (0, 0.0, 0))[0]
+        return {
+            'stages': stages,
+            'dropped': {s: v[0] for s, v in stats.items() if s not in FUNNEL_STAGES},
+            'overall_conversion': round(stages[-1]['count'] / created, 4) if created else None,
+            'avg_seconds_to_status': avg_seconds,
+        }
+
+    combined = defaultdict(lambda: [0, 0.0, 0])
+    for stats in per_plan.values():
+        for status, values in stats.items():
+            for i, value in enumerate(values):
+                combined[status][i] += value
+
+    return {
+        'days': days,
+        'since': since.isoformat(),
+        'total': summarize({status: tuple(values) for status, values in combined.items()}),
+        'plans': {plan: summarize(stats) for plan, stats in sorted(per_plan.items())},
+    }
+
+
+def backfill_order_events():
+    """Log a 'created' event, plus one for the current status, for orders with no history"""
+    status_value_sql = case(*((Order.status == member, member.value) for member in OrderStatus))
+    no_history = ~exists().where(OrderEvent.order_id == Order.id)
+    columns = ['order_id', 'user_id', 'plan_id', 'from_status', 'to_status', 'created_at']
+
+    current = (select(Order.id, Order.user_id, Order.plan_id, null(),
+                      status_value_sql, func.coalesce(Order.updated_at, Order.created_at))
+               .where(no_history, Order.status.isnot(None), Order.status != OrderStatus.CREATED))
+    created = (select(Order.id, Order.user_id, Order.plan_id, null(),
+                      literal(OrderStatus.CREATED.value),
+                      func.coalesce(Order.created_at, func.now()))
+               .where(no_history))
+
+    # Current-status rows first: once 'created' rows exist the NOT EXISTS guard matches nothing
+    current_count = db.session.execute(insert(OrderEvent.__table__).from_select(columns, current)).rowcount
+    created_count = db.session.execute(insert(OrderEvent.__table__).from_select(columns, created)).rowcount
+    db.session.commit()
+    return created_count + current_count
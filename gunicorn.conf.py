@@ -0,0 +1,78 @@
+"""
+Gunicorn configuration for the admin web app
+
+Loaded automatically by `gunicorn main:app`. Every setting can be
+overridden through environment variables:
+
+    WEB_WORKER_CLASS   sync | gthread | gevent (default: gthread); gevent needs
+                       the extra: pip install '.[gevent]'
+    WEB_WORKERS        number of worker processes (default: 2 * CPU + 1)
+    WEB_THREADS        request threads per gthread worker (default: 4)
+    WEB_CONNECTIONS    concurrent greenlets per gevent worker (default: 100)
+    WEB_SSE_STREAMS    admin event streams per worker (default: 2 gthread,
+                       20 gevent, 0 sync)
+    WEB_MAX_REQUESTS   recycle a worker after this many requests (default: 1000)
+    WEB_TIMEOUT        seconds before a silent worker is killed (default: 30)
+    PORT               listen port (default: 5000)
+
+Each open /admin/events stream holds a thread (or greenlet) for as long as
+the browser tab stays open. Those are added on top of WEB_THREADS and
+WEB_CONNECTIONS, so open tabs never starve regular requests; beyond
+WEB_SSE_STREAMS a worker answers 503. A sync worker cannot hold a stream
+past `timeout`, so it serves none.
+"""
+import multiprocessing
+import os
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'threaded': 'gthread',
+    'gevent': 'gevent',
+}
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+worker_class = WORKER_CLASSES.get(os.environ.get('WEB_WORKER_CLASS', 'gthread'), 'gthread')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+sse_streams = int(os.environ.get('WEB_SSE_STREAMS', {'gthread': 2, 'gevent': 20}.get(worker_class, 0)))
+threads = int(os.environ.get('WEB_THREADS', '4')) + sse_streams if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('WEB_CONNECTIONS', '100')) + (sse_streams if worker_class == 'gevent' else 0)
+
+# Import the app once in the master so models and metadata are shared copy-on-write.
+# Not under gevent: the worker monkey-patches only after fork, and locks, the
+# event broker and the engine created in the master would stay unpatched.
+preload_app = worker_class != 'gevent'
+
+# Graceful recycling: jitter keeps workers from restarting all at once
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', str(max_requests // 10)))
+timeout = int(os.environ.get('WEB_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    """Runs in each worker once the app is loaded (after gevent's monkey-patching)"""
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            worker.log.warning("psycogreen is not installed, psycopg2 calls will block gevent workers")
+
+    from logging_setup import setup_logging
+    setup_logging('web')
+
+    # Drop DB connections inherited from the master; each worker opens its own
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    # Background funnel rollup refresh, one thread per worker
+    from funnel import ensure_refresher
+    ensure_refresher(app)
@@ -3,11 +3,12 @@ from aiogram import types
 from aiogram.fsm.context import FSMContext
 from config import SUBSCRIPTION_PLANS, ADMIN_ID
 from states import OrderState
-from keyboards import (
-    get_main_menu_keyboard, get_subscription_keyboard, get_payment_keyboard,
-    get_back_to_start_keyboard, get_back_to_menu_keyboard
-)
-from models import User, Order, SubscriptionPlan, db
+from keyboards import get_screen, get_payment_keyboard, get_back_to_start_keyboard, get_back_to_menu_keyboard
+from messages import text, user_locale, plan_title
+from models import User, Order, SubscriptionPlan, OrderStatus, db
+from transitions import transition_order, TransitionConflict
+from outbox import enqueue
+from menu import send_menu, show_screen, show_main_menu
 from app import app
 from digiseller import generate_payment_url
 from datetime import datetime
@@ -33,6 +34,7 @@ def get_or_create_user(telegram_user):
             user.username = telegram_user.username
             user.first_name = telegram_user.first_name
             user.last_name = telegram_user.last_name
+            user.language_code = telegram_user.language_code or user.language_code
             user.last_activity = datetime.utcnow()
             db.session.commit()
         return user
@@ -45,124 +47,36 @@ async def cmd_start(message: types.Message, state: FSMContext):
     # Регистрируем/обновляем пользователя
     user = get_or_create_user(message.from_user)
     
-    welcome_text = (
-        "🎵 **Добро пожаловать в Spotify Family Bot!** 🎵\n\n"
-        "🔥 Получите доступ к **Spotify Premium** по лучшим ценам!\n\n"
-        "✅ **Что вы получаете:**\n"
-        "• Безлимитная музыка без рекламы\n"
-        "• Высокое качество звука\n"
-        "• Скачивание треков для офлайн прослушивания\n"
-        "• Доступ ко всем функциям Spotify Premium\n\n"
-        "💚 **Выберите действие:**"
-    )
+    welcome_text, keyboard = get_screen('welcome', user_locale(message.from_user))
     
-    keyboard = get_main_menu_keyboard()
-    
-    try:
-        # Отправляем главное меню с изображением
-        from aiogram.types import FSInputFile
-        photo = FSInputFile("spotify_image.png")
-        await message.answer_photo(
-            photo=photo,
-            caption=welcome_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки изображения в главном меню: {e}")
-        # Если ошибка с изображением, отправляем только текст
-        await message.answer(welcome_text, reply_markup=keyboard, parse_mode="Markdown")
+    # Главное меню с изображением; предыдущее меню в этом чате убирается
+    await send_menu(message.bot, message.chat.id, welcome_text, keyboard)
 
 async def handle_order_subscription(callback_query: types.CallbackQuery, state: FSMContext):
     """Обработчик кнопки оформления подписки"""
     user = get_or_create_user(callback_query.from_user)
     
-    subscription_text = (
-        "🎵 **Выберите план подписки Spotify Premium:**\n\n"
-        "💚 **Доступные варианты:**\n"
-        "🔸 **1 месяц** — 150₽\n"
-        "🔸 **3 месяца** — 370₽ *(экономия 80₽)*\n"
-        "🔸 **6 месяцев** — 690₽ *(экономия 210₽)*\n"
-        "🔸 **12 месяцев** — 1300₽ *(экономия 500₽)*\n\n"
-        "✨ **Что включено в Premium:**\n"
-        "• Безлимитная музыка без рекламы\n"
-        "• Высокое качество звука (до 320 kbps)\n"
-        "• Офлайн прослушивание\n"
-        "• Пропуск треков без ограничений\n"
-        "• Доступ к Spotify Connect\n\n"
-        "💚 Выберите подходящий план:"
-    )
+    subscription_text, keyboard = get_screen('subscription', user_locale(callback_query.from_user))
     
-    keyboard = get_subscription_keyboard()
-    
-    # Удаляем сообщение с изображением и отправляем новое текстовое
-    if callback_query.message:
-        await callback_query.message.delete()
-        await callback_query.bot.send_message(
-            chat_id=callback_query.message.chat.id,
-            text=subscription_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
+    # Меняем подпись и клавиатуру того же сообщения меню
+    await show_screen(callback_query, subscription_text, keyboard)
     
     await state.set_state(OrderState.choosing_subscription)
     await callback_query.answer()
 
 async def handle_support(callback_query: types.CallbackQuery):
     """Обработчик кнопки Support"""
-    support_text = (
-        "💬 **Поддержка**\n\n"
-        "Если возникли дополнительные вопросы, обратитесь по этому контакту:\n\n"
-        "👤 https://t.me/chanceofrain"
-    )
+    support_text, keyboard = get_screen('support', user_locale(callback_query.from_user))
     
-    keyboard = get_back_to_menu_keyboard()
-    
-    if callback_query.message:
-        # Удаляем сообщение с изображением и отправляем новое текстовое
-        await callback_query.message.delete()
-        await callback_query.bot.send_message(
-            chat_id=callback_query.message.chat.id,
-            text=support_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
+    await show_screen(callback_query, support_text, keyboard)
     
     await callback_query.answer()
 
 async def handle_faq(callback_query: types.CallbackQuery):
     """Обработчик кнопки FAQ"""
-    faq_text = (
-        "📖 **Часто задаваемые вопросы**\n\n"
-        "1️⃣ **Это официальная подписка?**\n"
-        "— Да, это настоящая подписка Spotify Premium через семейный план.\n\n"
-        "2️⃣ **Нужно ли что-то платить каждый месяц?**\n"
-        "— Нет. Вы платите один раз за выбранный срок (1 / 3 / 6 / 12 месяцев).\n\n"
-        "3️⃣ **Что мне нужно для подключения?**\n"
-        "— Логин и пароль от Spotify аккаунта.\n\n"
-        "4️⃣ **Как происходит добавление в семью?**\n"
-        "— Мы отправляем приглашение в семью Spotify, вы подтверждаете адрес.\n\n"
-        "5️⃣ **Это безопасно?**\n"
-        "— Да. Данные используются только для добавления в семью и не передаются третьим лицам.\n\n"
-        "6️⃣ **Сколько времени занимает подключение?**\n"
-        "— От 5 до 30 минут. Иногда до 2 часов.\n\n"
-        "7️⃣ **Что если меня удалят из семьи?**\n"
-        "— Мы восстановим вас бесплатно, если срок ещё не истёк.\n\n"
-        "8️⃣ **Можно ли продлить подписку?**\n"
-        "— Да, просто оформите новый срок через бота."
-    )
-    
-    keyboard = get_back_to_menu_keyboard()
+    faq_text, keyboard = get_screen('faq', user_locale(callback_query.from_user))
     
-    if callback_query.message:
-        # Удаляем сообщение с изображением и отправляем новое текстовое
-        await callback_query.message.delete()
-        await callback_query.bot.send_message(
-            chat_id=callback_query.message.chat.id,
-            text=faq_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
+    await show_screen(callback_query, faq_text, keyboard)
     
     await callback_query.answer()
 
@@ -170,53 +84,22 @@ async def handle_back_to_menu(callback_query: types.CallbackQuery, state: FSMCon
     """Обработчик кнопки возврата в главное меню"""
     await state.clear()
     
-    welcome_text = (
-        "🎵 **Добро пожаловать в Spotify Family Bot!** 🎵\n\n"
-        "🔥 Получите доступ к **Spotify Premium** по лучшим ценам!\n\n"
-        "✅ **Что вы получаете:**\n"
-        "• Безлимитная музыка без рекламы\n"
-        "• Высокое качество звука\n"
-        "• Скачивание треков для офлайн прослушивания\n"
-        "• Доступ ко всем функциям Spotify Premium\n\n"
-        "💚 **Выберите действие:**"
-    )
-    
-    keyboard = get_main_menu_keyboard()
+    welcome_text, keyboard = get_screen('welcome', user_locale(callback_query.from_user))
     
-    if callback_query.message:
-        # Удаляем текущее сообщение и отправляем новое с изображением
-        await callback_query.message.delete()
-        try:
-            # Отправляем главное меню с изображением
-            from aiogram.types import FSInputFile
-            photo = FSInputFile("spotify_image.png")
-            await callback_query.bot.send_photo(
-                chat_id=callback_query.message.chat.id,
-                photo=photo,
-                caption=welcome_text,
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            logger.error(f"Ошибка отправки изображения в главном меню: {e}")
-            # Если ошибка с изображением, отправляем только текст
-            await callback_query.bot.send_message(
-                chat_id=callback_query.message.chat.id,
-                text=welcome_text,
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
+    # Возвращаем подпись главного меню на месте, если это сообщение с фото
+    await show_main_menu(callback_query, welcome_text, keyboard)
     
     await callback_query.answer()
 
 async def process_plan_selection(callback_query: types.CallbackQuery, state: FSMContext):
     """Обработка выбора плана подписки"""
     plan_id = callback_query.data.replace("select_plan_", "") if callback_query.data else ""
+    locale = user_locale(callback_query.from_user)
     
     with app.app_context():
         plan = SubscriptionPlan.query.filter_by(id=plan_id).first()
         if not plan:
-            await callback_query.answer("❌ Неверный план подписки")
+            await callback_query.answer(text('invalid_plan', locale))
             return
         
         # Создаем заказ в базе данных
@@ -228,7 +111,7 @@ async def process_plan_selection(callback_query: types.CallbackQuery, state: FSM
             user_id=callback_query.from_user.id,
             plan_id=plan_id,
             total_amount=plan.price,
-            status='created'
+            status=OrderStatus.CREATED
         )
         db.session.add(order)
         db.session.commit()
@@ -237,23 +120,11 @@ async def process_plan_selection(callback_query: types.CallbackQuery, state: FSM
         await state.update_data(order_id=order_id, selected_plan=plan_id)
     
     # Запрашиваем логин от Spotify с подробными инструкциями
-    text = (
-        f"✅ **Выбрана подписка:** {plan.name} — {plan.price}₽\n\n"
-        "📧 **Введите данные от Spotify:**\n\n"
-        "⚠️ **ВАЖНО:**\n"
-        "• Введите данные в формате: **логин:пароль**\n"
-        "• Проверьте данные перед отправкой — **они должны быть точными**\n"
-        "• Используйте **точно такой же** логин и пароль, как в приложении Spotify\n\n"
-        "📝 **Пример:**\n"
-        "• your_email@gmail.com:yourpassword123\n"
-        "• spotify_username:yourpassword\n\n"
-        "🔒 **Безопасность:** Данные используются только для добавления в семью и не передаются третьим лицам"
-    )
+    selected_text = text('plan_selected', locale, plan_name=plan_title(plan.id, plan.name, locale), price=plan.price)
     
-    keyboard = get_back_to_menu_keyboard()
+    keyboard = get_back_to_menu_keyboard(locale)
     
-    if callback_query.message:
-        await callback_query.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await show_screen(callback_query, selected_text, keyboard)
     
     await state.set_state(OrderState.entering_spotify_login)
     await callback_query.answer()
@@ -264,21 +135,16 @@ async def process_spotify_login(message: types.Message, state: FSMContext):
         return
     
     spotify_login = message.text.strip()
+    locale = user_locale(message.from_user)
     
     # Валидация формата логин:пароль
     if ":" not in spotify_login:
-        await message.answer(
-            "❌ Неверный формат данных. Введите в формате: логин:пароль\n\nПример: myemail@gmail.com:mypassword123",
-            reply_markup=get_back_to_start_keyboard()
-        )
+        await message.answer(text('login_format_error', locale), reply_markup=get_back_to_start_keyboard(locale))
         return
     
     login_parts = spotify_login.split(":", 1)
     if len(login_parts) != 2 or len(login_parts[0]) < 3 or len(login_parts[1]) < 3:
-        await message.answer(
-            "❌ Логин или пароль слишком короткие. Введите в формате: логин:пароль",
-            reply_markup=get_back_to_start_keyboard()
-        )
+        await message.answer(text('login_too_short', locale), reply_markup=get_back_to_start_keyboard(locale))
         return
     
     # Получаем данные заказа из состояния
@@ -288,21 +154,32 @@ async def process_spotify_login(message: types.Message, state: FSMContext):
     with app.app_context():
         order = Order.query.filter_by(id=order_id).first()
         if not order:
-            await message.answer("❌ Заказ не найден")
+            await message.answer(text('order_not_found', locale))
             return
         
-        # Обновляем заказ с данными Spotify
-        order.spotify_login = login_parts[0]
-        order.spotify_password = login_parts[1]  # В реальном проекте следует шифровать
-        
         # Генерируем ссылку на оплату через Digiseller
         try:
             payment_url = generate_payment_url(order)
-            order.payment_url = payment_url
-            order.status = 'awaiting_payment'
         except Exception as e:
             logger.error(f"Ошибка генерации ссылки на оплату: {e}")
+            payment_url = None
+        
+        # Данные Spotify сохраняются тем же UPDATE, что и смена статуса
+        # (в реальном проекте пароль следует шифровать)
+        if payment_url:
+            try:
+                transition_order(db.session, order_id, OrderStatus.AWAITING_PAYMENT,
+                                 spotify_login=login_parts[0], spotify_password=login_parts[1],
+                                 payment_url=payment_url)
+            except TransitionConflict:
+                db.session.rollback()
+                await message.answer(text('order_already_processed', locale),
+                                     reply_markup=get_back_to_start_keyboard(locale))
+                return
+        else:
             payment_url = f"https://payment-gateway.example.com/pay?order_id={order_id}&amount={order.total_amount}"
+            order.spotify_login = login_parts[0]
+            order.spotify_password = login_parts[1]
             order.payment_url = payment_url
         
         db.session.commit()
@@ -310,19 +187,10 @@ async def process_spotify_login(message: types.Message, state: FSMContext):
         plan = order.subscription_plan
     
     # Отправляем сообщение с оплатой
-    payment_text = (
-        f"💳 **К оплате:** {plan.price}₽\n\n"
-        f"📋 **Детали заказа:**\n"
-        f"• **Подписка:** {plan.name}\n"
-        f"• **Spotify аккаунт:** {login_parts[0]}\n\n"
-        "🔥 **Что делать дальше:**\n"
-        "1️⃣ Нажмите кнопку **'💳 Оплатить'**\n"
-        "2️⃣ Совершите платеж\n"
-        "3️⃣ Нажмите **'✅ Я оплатил'**\n\n"
-        "⚡️ После подтверждения оплаты вы получите доступ к Spotify Premium в течение 5-30 минут!"
-    )
+    payment_text = text('payment', locale, price=plan.price, plan_name=plan_title(plan.id, plan.name, locale),
+                        login=login_parts[0])
     
-    keyboard = get_payment_keyboard(payment_url)
+    keyboard = get_payment_keyboard(payment_url, locale)
     
     await message.answer(payment_text, reply_markup=keyboard, parse_mode="Markdown")
     await state.set_state(OrderState.payment_processing)
@@ -333,42 +201,31 @@ async def process_payment_completed(callback_query: types.CallbackQuery, state:
     order_id = state_data.get("order_id")
     
     with app.app_context():
-        order = Order.query.filter_by(id=order_id).first()
-        if not order:
-            await callback_query.answer("❌ Заказ не найден")
+        # Обновляем статус заказа одним условным UPDATE
+        try:
+            paid = transition_order(db.session, order_id, OrderStatus.PAID,
+                                    returning=('total_amount', 'spotify_login', 'payment_url'))
+        except TransitionConflict:
+            db.session.rollback()
+            await callback_query.answer(text('order_not_found_or_processed', user_locale(callback_query.from_user)))
             return
+        plan = db.session.get(SubscriptionPlan, paid.plan_id)
+        plan_name = plan.name if plan else paid.plan_id
         
-        # Обновляем статус заказа
-        order.status = 'paid'
+        # Уведомление администратору пишется в outbox в той же транзакции,
+        # отправит его диспетчер outbox
+        user = callback_query.from_user
+        admin_msg = text('admin_new_order', order_id=order_id,
+                         username=user.username or text('no_username'), first_name=user.first_name,
+                         user_id=user.id, plan_name=plan_name, amount=paid.returned['total_amount'],
+                         login=paid.returned['spotify_login'], payment_url=paid.returned['payment_url'])
+        enqueue(db.session, ADMIN_ID, admin_msg, kind='admin_paid_order', parse_mode="Markdown")
         db.session.commit()
     
     # Уведомляем пользователя
-    success_text = (
-        "✅ Заявка на оплату принята!\n\n"
-        "📞 Администратор проверит платеж и свяжется с вами в ближайшее время для активации подписки.\n"
-        "Обычно это занимает до 24 часов."
-    )
+    success_text, keyboard = get_screen('payment_accepted', user_locale(callback_query.from_user))
     
-    if callback_query.message:
-        await callback_query.message.edit_text(success_text, reply_markup=get_back_to_start_keyboard())
-    
-    # Уведомляем администратора
-    try:
-        admin_msg = (
-            f"🔔 **Новый заказ на проверку!**\n\n"
-            f"**Заказ:** {order_id}\n"
-            f"**Пользователь:** @{callback_query.from_user.username or 'без username'}\n"
-            f"**Имя:** {callback_query.from_user.first_name}\n"
-            f"**ID:** {callback_query.from_user.id}\n"
-            f"**План:** {order.subscription_plan.name}\n"
-            f"**Сумма:** {order.total_amount}₽\n"
-            f"**Spotify логин:** {order.spotify_login}\n\n"
-            f"🔗 **Ссылка на оплату:** {order.payment_url}"
-        )
-        
-        await callback_query.bot.send_message(ADMIN_ID, admin_msg, parse_mode="Markdown")
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления администратору: {e}")
+    await show_screen(callback_query, success_text, keyboard)
     
     await state.clear()
     await callback_query.answer()
@@ -381,36 +238,5 @@ async def process_start_over(callback_query: types.CallbackQuery, state: FSMCont
 
 async def handle_unknown_message(message: types.Message):
     """Обработчик неизвестных сообщений"""
-    unknown_text = (
-        "❓ Я не понимаю эту команду.\n\n"
-        "Используйте кнопки меню для навигации или введите /start для перезапуска бота."
-    )
-    
-    keyboard = get_back_to_start_keyboard()
+    unknown_text, keyboard = get_screen('unknown_command', user_locale(message.from_user))
     await message.answer(unknown_text, reply_markup=keyboard)
-
-async def cmd_admin_orders(message: types.Message):
-    """Команда для просмотра заказов (только для админов)"""
-    if message.from_user.id != ADMIN_ID:
-        return
-    
-    with app.app_context():
-        orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
-        
-        if not orders:
-            await message.answer("📋 Нет заказов")
-            return
-        
-        orders_text = "📋 **Последние 10 заказов:**\n\n"
-        
-        for order in orders:
-            orders_text += (
-                f"**{order.id}**\n"
-                f"├ Пользователь: {order.user.first_name} (@{order.user.username or 'без username'})\n"
-                f"├ План: {order.subscription_plan.name}\n"
-                f"├ Сумма: {order.total_amount}₽\n"
-                f"├ Статус: {order.status.value}\n"
-                f"└ Создан: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-            )
-        
-        await message.answer(orders_text, parse_mode="Markdown")
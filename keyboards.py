@@ -1,44 +1,119 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-def get_main_menu_keyboard():
-    """Главное меню бота"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🎵 Оформить подписку", callback_data="order_subscription")],
-        [InlineKeyboardButton(text="💬 Поддержка", callback_data="support")],
-        [InlineKeyboardButton(text="❓ FAQ", callback_data="faq")]
+from config import SUBSCRIPTION_PLANS
+from messages import LOCALES, catalog, text
+
+SUPPORT_URL = "https://t.me/chanceofrain"
+
+
+def _main_menu(locale):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text('btn_order', locale), callback_data="order_subscription")],
+        [InlineKeyboardButton(text=text('btn_support', locale), callback_data="support")],
+        [InlineKeyboardButton(text=text('btn_faq', locale), callback_data="faq")]
     ])
-    return keyboard
 
-def get_subscription_keyboard():
-    """Клавиатура выбора подписки"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="1 месяц - 150₽", callback_data="select_plan_1_month")],
-        [InlineKeyboardButton(text="3 месяца - 370₽", callback_data="select_plan_3_months")],
-        [InlineKeyboardButton(text="6 месяцев - 690₽", callback_data="select_plan_6_months")],
-        [InlineKeyboardButton(text="12 месяцев - 1300₽", callback_data="select_plan_12_months")],
-        [InlineKeyboardButton(text="◀️ Назад в меню", callback_data="back_to_menu")]
+
+def _subscription(locale):
+    rows = [
+        [InlineKeyboardButton(
+            text=text('btn_plan', locale, plan_name=text(f'plan_{plan_id}', locale), price=plan['price']),
+            callback_data=f"select_plan_{plan_id}"
+        )]
+        for plan_id, plan in SUBSCRIPTION_PLANS.items()
+    ]
+    rows.append([InlineKeyboardButton(text=text('btn_back_to_menu', locale), callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def _back_to_menu(locale):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text('btn_back_to_menu', locale), callback_data="back_to_menu")]
     ])
-    return keyboard
 
-def get_payment_keyboard(payment_url):
+
+def _back_to_start(locale):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text('btn_start_over', locale), callback_data="start_over")]
+    ])
+
+
+def _support(locale):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text('btn_contact_support', locale), url=SUPPORT_URL)],
+        [InlineKeyboardButton(text=text('btn_back_to_menu', locale), callback_data="back_to_menu")]
+    ])
+
+
+# Статичные клавиатуры собираются один раз на язык и переиспользуются
+_KEYBOARDS = {
+    name: {locale: build(locale) for locale in LOCALES}
+    for name, build in (
+        ('main_menu', _main_menu),
+        ('subscription', _subscription),
+        ('back_to_menu', _back_to_menu),
+        ('back_to_start', _back_to_start),
+        ('support', _support),
+    )
+}
+
+# Экран: ключ текста и клавиатура
+_SCREENS = {
+    'welcome': ('welcome', 'main_menu'),
+    'subscription': ('subscription', 'subscription'),
+    'support': ('support', 'back_to_menu'),
+    # Поддержка в демо-боте: с кнопкой написать в поддержку
+    'support_contact': ('support', 'support'),
+    'faq': ('faq', 'back_to_menu'),
+    'payment_accepted': ('payment_accepted', 'back_to_start'),
+    'unknown_command': ('unknown_command', 'back_to_start'),
+}
+SCREENS = {
+    name: {locale: (text(text_key, locale), _KEYBOARDS[keyboard][locale]) for locale in LOCALES}
+    for name, (text_key, keyboard) in _SCREENS.items()
+}
+
+def _keyboard(name, locale):
+    by_locale = _KEYBOARDS[name]
+    return by_locale.get(locale) or by_locale[catalog.default_locale]
+
+
+def get_screen(name, locale=None):
+    """Готовые текст и клавиатура статичного экрана"""
+    by_locale = SCREENS[name]
+    return by_locale.get(locale) or by_locale[catalog.default_locale]
+
+
+def get_main_menu_keyboard(locale=None):
+    """Главное меню бота"""
+    return _keyboard('main_menu', locale)
+
+
+def get_subscription_keyboard(locale=None):
+    """Клавиатура выбора подписки"""
+    return _keyboard('subscription', locale)
+
+
+def get_payment_keyboard(payment_url, locale=None):
     """Клавиатура для оплаты"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="💳 Перейти к оплате", url=payment_url)],
-        [InlineKeyboardButton(text="✅ Я оплатил", callback_data="payment_completed")],
-        [InlineKeyboardButton(text="◀️ Назад в меню", callback_data="back_to_menu")]
+        [InlineKeyboardButton(text=text('btn_pay', locale), url=payment_url)],
+        [InlineKeyboardButton(text=text('btn_paid', locale), callback_data="payment_completed")],
+        [InlineKeyboardButton(text=text('btn_back_to_menu', locale), callback_data="back_to_menu")]
     ])
     return keyboard
 
-def get_back_to_menu_keyboard():
+
+def get_back_to_menu_keyboard(locale=None):
     """Кнопка возврата в главное меню"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="◀️ Назад в меню", callback_data="back_to_menu")]
-    ])
-    return keyboard
+    return _keyboard('back_to_menu', locale)
+
 
-def get_back_to_start_keyboard():
+def get_back_to_start_keyboard(locale=None):
     """Кнопка начать заново"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔄 Начать заново", callback_data="start_over")]
-    ])
-    return keyboard
+    return _keyboard('back_to_start', locale)
+
+
+def get_support_keyboard(locale=None):
+    """Кнопка написать в поддержку и возврат в меню"""
+    return _keyboard('support', locale)
@@ -0,0 +1,359 @@
+"""
+Тексты бота по языкам
+
+Ключ -> шаблон в разметке Markdown. Подстановки пишутся как {name} и
+экранируются при выводе (см. messages.py); {name!s} вставляется как есть,
+например внутри `кода`. Исходный язык — ru: ключи, которых нет в другом
+языке, берутся из него.
+"""
+
+SOURCE_LOCALE = 'ru'
+
+# Тексты без разметки (кнопки, названия планов, уведомления без parse_mode):
+# подстановки в них не экранируются
+PLAIN_PREFIXES = ('btn_', 'plan_', 'order_status_', 'no_username', 'status_', 'filter_', 'alert_',
+                  'user_label')
+
+MESSAGES = {
+    'ru': {
+        # Экраны
+        'welcome': (
+            "🎵 **Добро пожаловать в Spotify Family Bot!** 🎵\n\n"
+            "🔥 Получите доступ к **Spotify Premium** по лучшим ценам!\n\n"
+            "✅ **Что вы получаете:**\n"
+            "• Безлимитная музыка без рекламы\n"
+            "• Высокое качество звука\n"
+            "• Скачивание треков для офлайн прослушивания\n"
+            "• Доступ ко всем функциям Spotify Premium\n\n"
+            "💚 **Выберите действие:**"
+        ),
+        'subscription': (
+            "🎵 **Выберите план подписки Spotify Premium:**\n\n"
+            "💚 **Доступные варианты:**\n"
+            "🔸 **1 месяц** — 150₽\n"
+            "🔸 **3 месяца** — 370₽ *(экономия 80₽)*\n"
+            "🔸 **6 месяцев** — 690₽ *(экономия 210₽)*\n"
+            "🔸 **12 месяцев** — 1300₽ *(экономия 500₽)*\n\n"
+            "✨ **Что включено в Premium:**\n"
+            "• Безлимитная музыка без рекламы\n"
+            "• Высокое качество звука (до 320 kbps)\n"
+            "• Офлайн прослушивание\n"
+            "• Пропуск треков без ограничений\n"
+            "• Доступ к Spotify Connect\n\n"
+            "💚 Выберите подходящий план:"
+        ),
+        'support': (
+            "💬 **Поддержка**\n\n"
+            "Если возникли дополнительные вопросы, обратитесь по этому контакту:\n\n"
+            "👤 https://t.me/chanceofrain"
+        ),
+        'faq': (
+            "📖 **Часто задаваемые вопросы**\n\n"
+            "1️⃣ **Это официальная подписка?**\n"
+            "— Да, это настоящая подписка Spotify Premium через семейный план.\n\n"
+            "2️⃣ **Нужно ли что-то платить каждый месяц?**\n"
+            "— Нет. Вы платите один раз за выбранный срок (1 / 3 / 6 / 12 месяцев).\n\n"
+            "3️⃣ **Что мне нужно для подключения?**\n"
+            "— Логин и пароль от Spotify аккаунта.\n\n"
+            "4️⃣ **Как происходит добавление в семью?**\n"
+            "— Мы отправляем приглашение в семью Spotify, вы подтверждаете адрес.\n\n"
+            "5️⃣ **Это безопасно?**\n"
+            "— Да. Данные используются только для добавления в семью и не передаются третьим лицам.\n\n"
+            "6️⃣ **Сколько времени занимает подключение?**\n"
+            "— От 5 до 30 минут. Иногда до 2 часов.\n\n"
+            "7️⃣ **Что если меня удалят из семьи?**\n"
+            "— Мы восстановим вас бесплатно, если срок ещё не истёк.\n\n"
+            "8️⃣ **Можно ли продлить подписку?**\n"
+            "— Да, просто оформите новый срок через бота."
+        ),
+        'payment_accepted': (
+            "✅ Заявка на оплату принята!\n\n"
+            "📞 Администратор проверит платеж и свяжется с вами в ближайшее время для активации подписки.\n"
+            "Обычно это занимает до 24 часов."
+        ),
+        'unknown_command': (
+            "❓ Я не понимаю эту команду.\n\n"
+            "Используйте кнопки меню для навигации или введите /start для перезапуска бота."
+        ),
+
+        # Оформление заказа
+        'plan_selected': (
+            "✅ **Выбрана подписка:** {plan_name} — {price}₽\n\n"
+            "📧 **Введите данные от Spotify:**\n\n"
+            "⚠️ **ВАЖНО:**\n"
+            "• Введите данные в формате: **логин:пароль**\n"
+            "• Проверьте данные перед отправкой — **они должны быть точными**\n"
+            "• Используйте **точно такой же** логин и пароль, как в приложении Spotify\n\n"
+            "📝 **Пример:**\n"
+            "• your\\_email@gmail.com:yourpassword123\n"
+            "• spotify\\_username:yourpassword\n\n"
+            "🔒 **Безопасность:** Данные используются только для добавления в семью и не передаются третьим лицам"
+        ),
+        'payment': (
+            "💳 **К оплате:** {price}₽\n\n"
+            "📋 **Детали заказа:**\n"
+            "• **Подписка:** {plan_name}\n"
+            "• **Spotify аккаунт:** {login}\n\n"
+            "🔥 **Что делать дальше:**\n"
+            "1️⃣ Нажмите кнопку **'💳 Оплатить'**\n"
+            "2️⃣ Совершите платеж\n"
+            "3️⃣ Нажмите **'✅ Я оплатил'**\n\n"
+            "⚡️ После подтверждения оплаты вы получите доступ к Spotify Premium в течение 5-30 минут!"
+        ),
+        'login_format_error': (
+            "❌ Неверный формат данных. Введите в формате: логин:пароль\n\n"
+            "Пример: myemail@gmail.com:mypassword123"
+        ),
+        'login_too_short': "❌ Логин или пароль слишком короткие. Введите в формате: логин:пароль",
+        'invalid_plan': "❌ Неверный план подписки",
+        'order_not_found': "❌ Заказ не найден",
+        'order_already_processed': "❌ Заказ уже обработан",
+        'order_not_found_or_processed': "❌ Заказ не найден или уже обработан",
+        'error': "Произошла ошибка. Попробуйте позже.",
+        'order_create_error': "Произошла ошибка при создании заказа",
+
+        # Демо-бот без оплаты (bot_handlers.py)
+        'demo_choose_plan': (
+            "📋 **Выберите план подписки:**\n\n"
+            "💡 _Чем дольше период, тем выгоднее цена!_"
+        ),
+        'demo_order_created': (
+            "✅ **Заказ создан!**\n\n"
+            "🆔 **Номер заказа:** `{order_id!s}`\n"
+            "📦 **План:** {plan_name}\n"
+            "💰 **Стоимость:** {price}₽\n\n"
+            "📞 **Что делать дальше:**\n"
+            "1. Свяжитесь с поддержкой @chanceofrain\n"
+            "2. Сообщите номер заказа: `{order_id!s}`\n"
+            "3. Администратор обработает ваш заказ\n\n"
+            "_💡 В демо-режиме платежи отключены_"
+        ),
+
+        # Уведомления о заказе (outbox)
+        'order_status_processing': "⏳ Заказ {order_id} принят в работу.",
+        'order_status_completed': "✅ Заказ {order_id} выполнен, подписка активирована. Спасибо за покупку!",
+        'order_status_cancelled': "❌ Заказ {order_id} отменен. Если это ошибка, напишите в поддержку.",
+        'order_status_refunded': "💸 По заказу {order_id} оформлен возврат средств.",
+        'admin_new_order': (
+            "🔔 **Новый заказ на проверку!**\n\n"
+            "**Заказ:** {order_id}\n"
+            "**Пользователь:** @{username}\n"
+            "**Имя:** {first_name}\n"
+            "**ID:** {user_id}\n"
+            "**План:** {plan_name}\n"
+            "**Сумма:** {amount}₽\n"
+            "**Spotify логин:** {login}\n\n"
+            "🔗 **Ссылка на оплату:** {payment_url}"
+        ),
+        'no_username': "без username",
+
+        # Планы
+        'plan_1_month': "1 месяц",
+        'plan_3_months': "3 месяца",
+        'plan_6_months': "6 месяцев",
+        'plan_12_months': "12 месяцев",
+
+        # Кнопки
+        'btn_order': "🎵 Оформить подписку",
+        'btn_support': "💬 Поддержка",
+        'btn_faq': "❓ FAQ",
+        'btn_plan': "{plan_name} - {price}₽",
+        'btn_back_to_menu': "◀️ Назад в меню",
+        'btn_start_over': "🔄 Начать заново",
+        'btn_pay': "💳 Перейти к оплате",
+        'btn_paid': "✅ Я оплатил",
+        'btn_contact_support': "💬 Написать в поддержку",
+
+        # Просмотр заказов администратором (admin_orders.py)
+        'admin_orders_header': "📋 **Заказы** — {filter}",
+        'admin_orders_empty': "📋 Заказов нет",
+        'admin_order_line': "`{order_id!s}` · {status} · {amount}₽\n{plan_name} · {name} · {created}",
+        'admin_order_detail': (
+            "🧾 **Заказ** `{order_id!s}`\n\n"
+            "**Статус:** {status}\n"
+            "**Пользователь:** {name}, ID {user_id}\n"
+            "**План:** {plan_name}\n"
+            "**Сумма:** {amount}₽\n"
+            "**Spotify логин:** {login}\n"
+            "**Создан:** {created}\n"
+            "**Обновлен:** {updated}\n"
+            "**Заметки:** {notes}"
+        ),
+        'alert_status_changed': "Статус изменен: {status}",
+        'alert_status_conflict': "Заказ уже изменен или занят другим оператором",
+        'alert_order_not_found': "Заказ не найден",
+        'alert_throttled': "⏳ Слишком часто, попробуйте через минуту",
+        'status_created': "🆕 Создан",
+        'status_awaiting_payment': "⏳ Ждет оплаты",
+        'status_paid': "💰 Оплачен",
+        'status_processing': "⚙️ В работе",
+        'status_completed': "✅ Выполнен",
+        'status_cancelled': "❌ Отменен",
+        'status_refunded': "💸 Возврат",
+        'filter_all': "Все",
+        'user_label': "{first_name} (@{username})",
+        'btn_newer': "◀️ Новее",
+        'btn_older': "Старее ▶️",
+        'btn_first_page': "⏮ В начало",
+        'btn_to_orders': "◀️ К списку",
+        'btn_refresh': "🔄 Обновить",
+        'btn_order_row': "{order_id} · {status} · {amount}₽",
+        'btn_set_status': "→ {status}",
+    },
+    'en': {
+        'welcome': (
+            "🎵 **Welcome to Spotify Family Bot!** 🎵\n\n"
+            "🔥 Get **Spotify Premium** at the best prices!\n\n"
+            "✅ **What you get:**\n"
+            "• Unlimited ad-free music\n"
+            "• High quality audio\n"
+            "• Download tracks to listen offline\n"
+            "• Every Spotify Premium feature\n\n"
+            "💚 **Choose an option:**"
+        ),
+        'subscription': (
+            "🎵 **Choose a Spotify Premium plan:**\n\n"
+            "💚 **Available plans:**\n"
+            "🔸 **1 month** — 150₽\n"
+            "🔸 **3 months** — 370₽ *(save 80₽)*\n"
+            "🔸 **6 months** — 690₽ *(save 210₽)*\n"
+            "🔸 **12 months** — 1300₽ *(save 500₽)*\n\n"
+            "✨ **Premium includes:**\n"
+            "• Unlimited ad-free music\n"
+            "• High quality audio (up to 320 kbps)\n"
+            "• Offline listening\n"
+            "• Unlimited skips\n"
+            "• Spotify Connect\n\n"
+            "💚 Pick the plan that suits you:"
+        ),
+        'support': (
+            "💬 **Support**\n\n"
+            "If you have any other questions, contact us here:\n\n"
+            "👤 https://t.me/chanceofrain"
+        ),
+        'faq': (
+            "📖 **Frequently asked questions**\n\n"
+            "1️⃣ **Is this an official subscription?**\n"
+            "— Yes, it is a genuine Spotify Premium subscription through a family plan.\n\n"
+            "2️⃣ **Do I have to pay every month?**\n"
+            "— No. You pay once for the term you choose (1 / 3 / 6 / 12 months).\n\n"
+            "3️⃣ **What do I need to join?**\n"
+            "— The login and password of your Spotify account.\n\n"
+            "4️⃣ **How am I added to the family?**\n"
+            "— We send you a Spotify family invitation and you confirm the address.\n\n"
+            "5️⃣ **Is it safe?**\n"
+            "— Yes. Your details are only used to add you to the family and are never shared.\n\n"
+            "6️⃣ **How long does it take?**\n"
+            "— 5 to 30 minutes, occasionally up to 2 hours.\n\n"
+            "7️⃣ **What if I am removed from the family?**\n"
+            "— We add you back for free while your term is still running.\n\n"
+            "8️⃣ **Can I extend my subscription?**\n"
+            "— Yes, just order a new term through the bot."
+        ),
+        'payment_accepted': (
+            "✅ Payment request received!\n\n"
+            "📞 An administrator will check the payment and contact you shortly to activate your subscription.\n"
+            "This usually takes up to 24 hours."
+        ),
+        'unknown_command': (
+            "❓ I don't understand this command.\n\n"
+            "Use the menu buttons to navigate or send /start to restart the bot."
+        ),
+        'plan_selected': (
+            "✅ **Selected plan:** {plan_name} — {price}₽\n\n"
+            "📧 **Enter your Spotify details:**\n\n"
+            "⚠️ **IMPORTANT:**\n"
+            "• Use the format **login:password**\n"
+            "• Double-check before sending — **they must be exact**\n"
+            "• Use **exactly the same** login and password as in the Spotify app\n\n"
+            "📝 **Example:**\n"
+            "• your\\_email@gmail.com:yourpassword123\n"
+            "• spotify\\_username:yourpassword\n\n"
+            "🔒 **Security:** your details are only used to add you to the family and are never shared"
+        ),
+        'payment': (
+            "💳 **Amount due:** {price}₽\n\n"
+            "📋 **Order details:**\n"
+            "• **Plan:** {plan_name}\n"
+            "• **Spotify account:** {login}\n\n"
+            "🔥 **Next steps:**\n"
+            "1️⃣ Press **'💳 Pay'**\n"
+            "2️⃣ Complete the payment\n"
+            "3️⃣ Press **'✅ I have paid'**\n\n"
+            "⚡️ Once the payment is confirmed you will get Spotify Premium within 5-30 minutes!"
+        ),
+        'login_format_error': (
+            "❌ Wrong format. Send your details as login:password\n\n"
+            "Example: myemail@gmail.com:mypassword123"
+        ),
+        'login_too_short': "❌ The login or password is too short. Use the format login:password",
+        'invalid_plan': "❌ Unknown subscription plan",
+        'order_not_found': "❌ Order not found",
+        'order_already_processed': "❌ This order has already been processed",
+        'order_not_found_or_processed': "❌ Order not found or already processed",
+        'error': "Something went wrong. Please try again later.",
+        'order_create_error': "Something went wrong while creating the order",
+        'demo_choose_plan': (
+            "📋 **Choose a subscription plan:**\n\n"
+            "💡 _The longer the term, the better the price!_"
+        ),
+        'demo_order_created': (
+            "✅ **Order created!**\n\n"
+            "🆔 **Order number:** `{order_id!s}`\n"
+            "📦 **Plan:** {plan_name}\n"
+            "💰 **Price:** {price}₽\n\n"
+            "📞 **Next steps:**\n"
+            "1. Contact support at @chanceofrain\n"
+            "2. Give them your order number: `{order_id!s}`\n"
+            "3. An administrator will process your order\n\n"
+            "_💡 Payments are disabled in demo mode_"
+        ),
+        'order_status_processing': "⏳ Order {order_id} is being processed.",
+        'order_status_completed': "✅ Order {order_id} is complete and your subscription is active. Thank you!",
+        'order_status_cancelled': "❌ Order {order_id} was cancelled. If this is a mistake, please contact support.",
+        'order_status_refunded': "💸 Order {order_id} has been refunded.",
+        'plan_1_month': "1 month",
+        'plan_3_months': "3 months",
+        'plan_6_months': "6 months",
+        'plan_12_months': "12 months",
+        'btn_order': "🎵 Get a subscription",
+        'btn_support': "💬 Support",
+        'btn_faq': "❓ FAQ",
+        'btn_back_to_menu': "◀️ Back to menu",
+        'btn_start_over': "🔄 Start over",
+        'btn_pay': "💳 Pay",
+        'btn_paid': "✅ I have paid",
+        'btn_contact_support': "💬 Message support",
+
+        'admin_orders_header': "📋 **Orders** — {filter}",
+        'admin_orders_empty': "📋 No orders",
+        'admin_order_detail': (
+            "🧾 **Order** `{order_id!s}`\n\n"
+            "**Status:** {status}\n"
+            "**Customer:** {name}, ID {user_id}\n"
+            "**Plan:** {plan_name}\n"
+            "**Amount:** {amount}₽\n"
+            "**Spotify login:** {login}\n"
+            "**Created:** {created}\n"
+            "**Updated:** {updated}\n"
+            "**Notes:** {notes}"
+        ),
+        'alert_status_changed': "Status changed: {status}",
+        'alert_status_conflict': "The order was already changed or is claimed by another operator",
+        'alert_order_not_found': "Order not found",
+        'alert_throttled': "⏳ Too many requests, please try again in a minute",
+        'status_created': "🆕 Created",
+        'status_awaiting_payment': "⏳ Awaiting payment",
+        'status_paid': "💰 Paid",
+        'status_processing': "⚙️ Processing",
+        'status_completed': "✅ Completed",
+        'status_cancelled': "❌ Cancelled",
+        'status_refunded': "💸 Refunded",
+        'filter_all': "All",
+        'btn_newer': "◀️ Newer",
+        'btn_older': "Older ▶️",
+        'btn_first_page': "⏮ Newest",
+        'btn_to_orders': "◀️ Back to list",
+        'btn_refresh': "🔄 Refresh",
+    },
+}
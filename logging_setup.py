@@ -0,0 +1,197 @@
+"""
+Non-blocking structured logging
+
+Log calls only enqueue records; formatting and file/stream I/O happen on a
+background QueueListener thread, so log volume does not add latency to
+Flask requests or aiogram handlers. Records are written as JSON lines with
+the current request or update correlation ID. Noisy loggers are sampled
+with a per-logger token bucket and files rotate by size.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from config import (
+    LOG_LEVEL, LOG_FORMAT, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT,
+    LOG_SAMPLED_LOGGERS, LOG_SAMPLE_RATE, LOG_SAMPLE_BURST, SLOW_QUERY_LOG_FILE
+)
+
+# Request ID in Flask, update ID in aiogram; propagates across asyncio tasks
+correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+# Loggers that are chatty at INFO/DEBUG; raised to WARNING unless LOG_LEVEL=DEBUG
+QUIET_LOGGERS = ('sqlalchemy.engine', 'sqlalchemy.pool', 'werkzeug', 'aiohttp.access')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+
+_RESERVED = set(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {'message', 'asctime', 'correlation_id', 'service'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as one JSON object per line"""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'service': self.service,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'correlation_id', None):
+            payload['correlation_id'] = record.correlation_id
+        # Structured fields passed via `extra=`
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp the caller's correlation ID on the record before it is queued"""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Token bucket per logger for records below WARNING
+
+    Allows `burst` records at once and `rate` records per second afterwards.
+    The number of suppressed records is attached to the next record let through.
+    """
+
+    def __init__(self, prefixes, rate, burst):
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not record.name.startswith(self.prefixes):
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, dropped = self._buckets.get(record.name, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[record.name] = (tokens - 1, now, 0)
+
+        if dropped:
+            record.sampled_out = dropped
+        return True
+
+
+class _LoggingState:
+    pid = None
+    listener = None
+
+
+def _build_handlers(service, log_file):
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter(service)
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        ))
+    if SLOW_QUERY_LOG_FILE:
+        # Slow statements also get a file of their own (see sql_profiling.py)
+        slow_handler = logging.handlers.RotatingFileHandler(
+            SLOW_QUERY_LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        slow_handler.addFilter(logging.Filter('slow_query'))
+        handlers.append(slow_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging(service, log_file=LOG_FILE):
+    """Route all logging through a queue drained by a background thread
+
+    Safe to call more than once; after a fork (gunicorn workers) the listener
+    is recreated because threads do not survive fork.
+    """
+    if _LoggingState.pid == os.getpid():
+        return
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLED_LOGGERS, LOG_SAMPLE_RATE, LOG_SAMPLE_BURST))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    if LOG_LEVEL != 'DEBUG':
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *_build_handlers(service, log_file), respect_handler_level=True
+    )
+    listener.start()
+
+    _LoggingState.pid = os.getpid()
+    _LoggingState.listener = listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    if _LoggingState.listener is not None and _LoggingState.pid == os.getpid():
+        _LoggingState.listener.stop()
+        _LoggingState.listener = None
+        _LoggingState.pid = None
+
+
+atexit.register(stop_logging)
+
+
+def init_flask_logging(app):
+    """Assign a correlation ID to every Flask request and echo it back"""
+    from flask import request, g
+
+    @app.before_request
+    def _set_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g.correlation_token = correlation_id.set(g.request_id)
+
+    @app.after_request
+    def _echo_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    @app.teardown_request
+    def _reset_request_id(exc):
+        token = g.pop('correlation_token', None)
+        if token is not None:
+            correlation_id.reset(token)
@@ -1,5 +1,13 @@
+import os
 from app import app
 import routes  # noqa: F401
+import api_v1  # noqa: F401
 
+# Development server only; production runs `gunicorn main:app` (see gunicorn.conf.py)
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    from logging_setup import setup_logging
+    setup_logging('web')
+    from funnel import ensure_refresher
+    ensure_refresher(app)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)),
+            debug=os.environ.get("FLASK_DEBUG", "0") == "1", threaded=True)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Management commands for the Spotify bot backend
+
+Usage:
+    python manage.py init-db
+    python manage.py archive --older-than-days 365
+    python manage.py funnel [--backfill]
+    python manage.py cohorts
+    python manage.py reclaim-slots
+    python manage.py export orders --format csv --gzip -o orders.csv.gz
+"""
+import argparse
+import sys
+
+
+def cmd_init_db(args):
+    """Create tables and seed default plans, admin and settings"""
+    from app import app, db
+    from models import init_default_data
+
+    with app.app_context():
+        db.create_all()
+        init_default_data()
+    print("Database initialized")
+
+
+def cmd_archive(args):
+    """Move old terminal orders and their payments into the archive tables"""
+    from app import app
+    from archive import archive_old_orders, count_archivable, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+    older_than_days = args.older_than_days or ARCHIVE_AFTER_DAYS
+    batch_size = args.batch_size or ARCHIVE_BATCH_SIZE
+    with app.app_context():
+        if args.dry_run:
+            print(f"{count_archivable(older_than_days)} orders would be archived")
+            return
+        orders, payments = archive_old_orders(older_than_days, batch_size, args.pause)
+    print(f"Archived {orders} orders and {payments} payments")
+
+
+def cmd_funnel(args):
+    """Backfill order events and fold new ones into the funnel rollup"""
+    from app import app
+    from funnel import backfill_order_events, refresh_all
+
+    with app.app_context():
+        if args.backfill:
+            print(f"Backfilled {backfill_order_events()} order events")
+        total = refresh_all()
+    print(f"Funnel refreshed with {total} new events")
+
+
+def cmd_cohorts(args):
+    """Rebuild cohort, retention and LTV summary tables"""
+    from app import app
+    from cohorts import compute_cohorts, ANALYTICS_MAX_MONTHS
+
+    with app.app_context():
+        result = compute_cohorts(max_months=args.max_months or ANALYTICS_MAX_MONTHS)
+    print(f"Cohorts rebuilt: {result}")
+
+
+def cmd_reclaim_slots(args):
+    """Mark family seats whose term ended for member removal"""
+    from app import app, db
+    from families import reclaim_expired
+
+    with app.app_context():
+        reclaimed = reclaim_expired(db.session)
+        db.session.commit()
+    print(f"{reclaimed} family seats await member removal")
+
+
+def cmd_export(args):
+    """Stream an export to a file or stdout"""
+    from app import app, db
+    from exports import iter_export, parse_date
+    from replica import replica_session
+
+    filters = {
+        'date_from': parse_date(args.date_from),
+        'date_to': parse_date(args.date_to),
+        'status': args.status,
+        'include_archived': args.include_archived,
+    }
+
+    with app.app_context(), replica_session(db):
+        chunks = iter_export(args.entity, args.format, args.gzip, **filters)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+
+
+def build_parser():
+    """Build the argument parser with all subcommands"""
+    parser = argparse.ArgumentParser(description='Spotify bot management commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    init_db = subparsers.add_parser('init-db', help='Create tables and seed default data')
+    init_db.set_defaults(func=cmd_init_db)
+
+    archive = subparsers.add_parser('archive', help='Archive old completed/cancelled/refunded orders')
+    archive.add_argument('--older-than-days', type=int, help='Default: ARCHIVE_AFTER_DAYS (365)')
+    archive.add_argument('--batch-size', type=int, help='Default: ARCHIVE_BATCH_SIZE (500)')
+    archive.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+    archive.add_argument('--dry-run', action='store_true', help='Only count archivable orders')
+    archive.set_defaults(func=cmd_archive)
+
+    funnel = subparsers.add_parser('funnel', help='Refresh the order funnel rollup')
+    funnel.add_argument('--backfill', action='store_true',
+                        help='First log events for orders created before the event log existed')
+    funnel.set_defaults(func=cmd_funnel)
+
+    cohorts = subparsers.add_parser('cohorts', help='Rebuild cohort, retention and LTV tables (needs numpy)')
+    cohorts.add_argument('--max-months', type=int, help='Default: ANALYTICS_MAX_MONTHS (36)')
+    cohorts.set_defaults(func=cmd_cohorts)
+
+    reclaim = subparsers.add_parser('reclaim-slots', help='Reclaim family seats of expired subscriptions')
+    reclaim.set_defaults(func=cmd_reclaim_slots)
+
+    export = subparsers.add_parser('export', help='Stream orders, payments or users')
+    export.add_argument('entity', choices=['orders', 'payments', 'users'])
+    export.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    export.add_argument('--gzip', action='store_true', help='Compress output with gzip')
+    export.add_argument('--from', dest='date_from', help='Created on or after YYYY-MM-DD')
+    export.add_argument('--to', dest='date_to', help='Created on or before YYYY-MM-DD')
+    export.add_argument('--status', help='Filter by order or payment status')
+    export.add_argument('--include-archived', action='store_true', help='Include archived orders/payments')
+    export.add_argument('-o', '--output', help='Output file (default: stdout)')
+    export.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    from logging_setup import setup_logging
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    setup_logging('manage')
+    try:
+        args.func(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
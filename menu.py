@@ -0,0 +1,136 @@
+"""
+Навигация по меню редактированием одного сообщения
+
+Главное меню — одно сообщение с фото на чат. Переходы по разделам меняют
+подпись и клавиатуру этого сообщения (edit_message_caption), без удаления и
+повторной отправки, то есть одним запросом к Bot API вместо двух-трех.
+Фото загружается один раз: дальше используется его file_id. Удаление и
+новая отправка остаются запасным путем, когда редактировать нельзя
+(слишком длинный текст для подписи, текстовое или недоступное сообщение).
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+
+logger = logging.getLogger(__name__)
+
+MENU_IMAGE = "spotify_image.png"
+# Ограничение Telegram на подпись к фото
+CAPTION_LIMIT = 1024
+MAX_TRACKED_CHATS = 10000
+
+
+class MenuPhoto:
+    """Фото меню: файл при первой отправке, затем file_id"""
+
+    def __init__(self, path=MENU_IMAGE):
+        self.path = path
+        self.file_id = None
+
+    def media(self):
+        return self.file_id or FSInputFile(self.path)
+
+    def remember(self, message):
+        if self.file_id is None and message is not None and message.photo:
+            self.file_id = message.photo[-1].file_id
+
+
+menu_photo = MenuPhoto()
+
+# chat_id -> message_id текущего сообщения меню
+_menu_messages = OrderedDict()
+
+
+def _track_menu(chat_id, message_id):
+    previous = _menu_messages.pop(chat_id, None)
+    _menu_messages[chat_id] = message_id
+    while len(_menu_messages) > MAX_TRACKED_CHATS:
+        _menu_messages.popitem(last=False)
+    return previous if previous != message_id else None
+
+
+async def _delete_quietly(bot, chat_id, message_id):
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        logger.debug(f"Не удалось удалить старое меню {message_id}: {e}")
+
+
+def _not_modified(error):
+    return 'message is not modified' in str(error)
+
+
+async def send_menu(bot, chat_id, text, keyboard):
+    """Отправить новое сообщение меню с фото и убрать предыдущее"""
+    try:
+        sent = await bot.send_photo(
+            chat_id=chat_id,
+            photo=menu_photo.media(),
+            caption=text,
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
+        menu_photo.remember(sent)
+    except Exception as e:
+        logger.error(f"Ошибка отправки изображения в главном меню: {e}")
+        # Если ошибка с изображением, отправляем только текст
+        sent = await bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard, parse_mode="Markdown")
+
+    previous = _track_menu(chat_id, sent.message_id)
+    if previous is not None:
+        # Старое меню удаляем в фоне, пользователь не ждет этот запрос
+        asyncio.create_task(_delete_quietly(bot, chat_id, previous))
+    return sent
+
+
+async def _edit(message, text, keyboard):
+    """Отредактировать сообщение на месте; False, если это невозможно"""
+    if not hasattr(message, 'edit_text'):
+        # Недоступное сообщение (старше 48 часов)
+        return False
+    try:
+        if message.photo:
+            if len(text) > CAPTION_LIMIT:
+                return False
+            await message.edit_caption(caption=text, reply_markup=keyboard, parse_mode="Markdown")
+        else:
+            await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+        return True
+    except TelegramBadRequest as e:
+        if _not_modified(e):
+            return True
+        logger.warning(f"Не удалось отредактировать сообщение {message.message_id}: {e}")
+        return False
+
+
+async def show_screen(callback_query, text, keyboard):
+    """Показать раздел в сообщении, на кнопку которого нажали"""
+    message = callback_query.message
+    if message is None:
+        return
+    if await _edit(message, text, keyboard):
+        return
+
+    await _delete_quietly(callback_query.bot, message.chat.id, message.message_id)
+    await callback_query.bot.send_message(
+        chat_id=message.chat.id, text=text, reply_markup=keyboard, parse_mode="Markdown"
+    )
+
+
+async def show_main_menu(callback_query, text, keyboard):
+    """Вернуть главное меню: подпись к фото на месте или новое сообщение с фото"""
+    message = callback_query.message
+    if message is None:
+        return
+    if getattr(message, 'photo', None) and await _edit(message, text, keyboard):
+        _track_menu(message.chat.id, message.message_id)
+        return
+
+    # К текстовому сообщению фото не добавить: отправляем меню заново (без повторной загрузки)
+    await _delete_quietly(callback_query.bot, message.chat.id, message.message_id)
+    _menu_messages.pop(message.chat.id, None)
+    await send_menu(callback_query.bot, message.chat.id, text, keyboard)
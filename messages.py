@@ -0,0 +1,129 @@
+"""
+Каталог сообщений бота
+
+Тексты из locales.py собираются один раз при импорте. Статичные тексты
+(приветствие, FAQ, поддержка) хранятся готовыми строками. Шаблоны заранее
+разбираются на куски: вывод — это заполнение мест подстановок и один
+''.join, без повторного разбора формата на каждое сообщение. Подстановки в
+Markdown-текстах экранируются, так что логин вида your_email не ломает
+разметку.
+
+Каждый перевод сверяется с исходным языком при загрузке: лишний ключ или
+другой набор подстановок — ошибка при старте, а не при отправке.
+
+Язык берется из language_code пользователя Telegram ('en-US' -> 'en');
+для языков без перевода — DEFAULT_LOCALE.
+"""
+
+import re
+from string import Formatter
+
+from config import DEFAULT_LOCALE
+from locales import MESSAGES, SOURCE_LOCALE, PLAIN_PREFIXES
+
+_MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
+
+
+def escape_markdown(value):
+    """Экранировать символы разметки Markdown в подставляемом значении"""
+    return _MARKDOWN_SPECIAL.sub(r'\\\1', str(value))
+
+
+class Template:
+    """Текст, заранее разобранный на куски и места подстановок"""
+
+    __slots__ = ('key', 'text', 'parts', 'slots', 'fields')
+
+    def __init__(self, key, text, plain=False):
+        self.key = key
+        self.text = text
+        parts = []
+        # (индекс в parts, имя, вставлять как есть)
+        slots = []
+        for literal, name, spec, conversion in Formatter().parse(text):
+            if literal:
+                parts.append(literal)
+            if name is None:
+                continue
+            if not name.isidentifier() or spec or conversion not in (None, 's'):
+                raise ValueError(f"{key}: поддерживаются только подстановки {{name}} и {{name!s}}")
+            slots.append((len(parts), name, plain or conversion == 's'))
+            parts.append(None)
+        self.parts = parts
+        self.slots = tuple(slots)
+        self.fields = frozenset(name for _, name, _ in slots)
+        if not slots:
+            # Статичный текст: '{{' и '}}' уже раскрыты
+            self.text = ''.join(parts)
+
+    def render(self, values):
+        if not self.slots:
+            return self.text
+        out = list(self.parts)
+        for index, name, raw in self.slots:
+            value = values[name]
+            out[index] = str(value) if raw else escape_markdown(value)
+        return ''.join(out)
+
+
+class Catalog:
+    """Скомпилированные тексты всех языков"""
+
+    def __init__(self, messages, source_locale, default_locale):
+        source = messages[source_locale]
+        self.locales = {source_locale: self._compile(source, source)}
+        for locale, texts in messages.items():
+            if locale == source_locale:
+                continue
+            unknown = set(texts) - set(source)
+            if unknown:
+                raise ValueError(f"{locale}: ключей нет в {source_locale}: {', '.join(sorted(unknown))}")
+            compiled = self._compile(texts, source)
+            for key, template in compiled.items():
+                if template.fields != self.locales[source_locale][key].fields:
+                    raise ValueError(f"{locale}.{key}: подстановки не совпадают с {source_locale}")
+            self.locales[locale] = compiled
+        self.source_locale = source_locale
+        self.default_locale = default_locale if default_locale in self.locales else source_locale
+        # language_code -> язык каталога
+        self._resolved = {}
+
+    @staticmethod
+    def _compile(texts, source):
+        # Непереведенные ключи берутся из исходного языка
+        return {key: Template(key, texts.get(key, text), key.startswith(PLAIN_PREFIXES))
+                for key, text in source.items()}
+
+    def resolve(self, language_code):
+        """Язык каталога для language_code Telegram"""
+        locale = self._resolved.get(language_code)
+        if locale is None:
+            base = (language_code or '').split('-', 1)[0].lower()
+            locale = base if base in self.locales else self.default_locale
+            self._resolved[language_code] = locale
+        return locale
+
+    def get(self, key, locale=None, **values):
+        """Текст по ключу на языке locale, с подстановками"""
+        texts = self.locales.get(locale) or self.locales[self.default_locale]
+        return texts[key].render(values)
+
+
+catalog = Catalog(MESSAGES, SOURCE_LOCALE, DEFAULT_LOCALE)
+
+LOCALES = tuple(catalog.locales)
+resolve_locale = catalog.resolve
+text = catalog.get
+
+
+def user_locale(telegram_user):
+    """Язык пользователя Telegram (или записи User из базы)"""
+    return catalog.resolve(getattr(telegram_user, 'language_code', None))
+
+
+def plan_title(plan_id, default, locale=None):
+    """Название плана на языке пользователя; без перевода — название из базы"""
+    key = f'plan_{plan_id}'
+    if key not in catalog.locales[catalog.source_locale]:
+        return default
+    return catalog.get(key, locale)
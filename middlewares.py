@@ -0,0 +1,84 @@
+"""
+Middlewares for the Telegram bot
+"""
+import asyncio
+import logging
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from config import ADMIN_ID
+from logging_setup import correlation_id
+from messages import text, user_locale
+from throttling import Throttler, ThrottleSettings, classify
+
+logger = logging.getLogger(__name__)
+
+
+class CorrelationMiddleware(BaseMiddleware):
+    """Tag every log record emitted while handling an update with its update ID"""
+
+    async def __call__(self, handler, event: Update, data):
+        token = correlation_id.set(f"update:{event.update_id}")
+        try:
+            return await handler(event, data)
+        finally:
+            correlation_id.reset(token)
+
+
+class BanMiddleware(BaseMiddleware):
+    """Drop updates from banned users before any handler or database work"""
+
+    def __init__(self, banned=None):
+        if banned is None:
+            from bans import banned_users as banned
+        self.banned = banned
+        self._refreshing = None
+        self._loading = None
+
+    async def __call__(self, handler, event: Update, data):
+        if not self.banned.loaded:
+            # Updates arriving during the first load all wait for the same one
+            if self._loading is None or self._loading.done():
+                self._loading = asyncio.create_task(asyncio.to_thread(self.banned.refresh, True))
+            await asyncio.shield(self._loading)
+        elif self.banned.due() and (self._refreshing is None or self._refreshing.done()):
+            # Sync in the background; this update is checked against the current set
+            self._refreshing = asyncio.create_task(asyncio.to_thread(self.banned.refresh))
+
+        user = data.get('event_from_user')
+        if user is not None and user.id in self.banned:
+            logger.debug(f"Игнорируем обновление {event.update_id} от заблокированного {user.id}")
+            return None
+        return await handler(event, data)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Shed bursts from a single user with per-user, per-action token buckets"""
+
+    def __init__(self, throttler=None, settings=None):
+        self.throttler = throttler or Throttler()
+        self.settings = settings or ThrottleSettings(self.throttler)
+        self._syncing = None
+
+    async def __call__(self, handler, event: Update, data):
+        if self.settings.due() and (self._syncing is None or self._syncing.done()):
+            self._syncing = asyncio.create_task(asyncio.to_thread(self.settings.sync))
+
+        user = data.get('event_from_user')
+        # The admin triages orders from the bot and is not rate limited
+        action = classify(event) if user is not None and user.id != ADMIN_ID else None
+        if action is None:
+            return await handler(event, data)
+
+        allowed, first_rejection = self.throttler.hit(user.id, action)
+        if allowed:
+            return await handler(event, data)
+
+        # Tell the user once per burst; further hits are dropped silently
+        if first_rejection and event.callback_query is not None:
+            try:
+                await event.callback_query.answer(text('alert_throttled', user_locale(user)))
+            except Exception as e:
+                logger.debug(f"Не удалось ответить на ограниченный запрос: {e}")
+        return None
@@ -3,6 +3,8 @@ from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import Text, JSON
 import enum
+import json
+from throttling import DEFAULT_LIMITS as DEFAULT_THROTTLE_LIMITS
 
 class UserRole(enum.Enum):
     USER = "user"
@@ -17,6 +19,17 @@ class OrderStatus(enum.Enum):
     CANCELLED = "cancelled"
     REFUNDED = "refunded"
 
+# Allowed order status transitions; see transitions.transition_order
+ORDER_TRANSITIONS = {
+    OrderStatus.CREATED: {OrderStatus.AWAITING_PAYMENT, OrderStatus.PAID, OrderStatus.CANCELLED},
+    OrderStatus.AWAITING_PAYMENT: {OrderStatus.PAID, OrderStatus.CANCELLED},
+    OrderStatus.PAID: {OrderStatus.PROCESSING, OrderStatus.COMPLETED, OrderStatus.CANCELLED, OrderStatus.REFUNDED},
+    OrderStatus.PROCESSING: {OrderStatus.COMPLETED, OrderStatus.CANCELLED, OrderStatus.REFUNDED},
+    OrderStatus.COMPLETED: {OrderStatus.REFUNDED},
+    OrderStatus.CANCELLED: set(),
+    OrderStatus.REFUNDED: set(),
+}
+
 class PaymentStatus(enum.Enum):
     PENDING = "pending"
     COMPLETED = "completed"
@@ -116,6 +129,16 @@ class SubscriptionPlan(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Used by archive.py to find old terminal orders without a full scan
+        db.Index('ix_orders_status_updated_at', 'status', 'updated_at'),
+        # Operator work queue (work_queue.py): paid orders, longest waiting first
+        db.Index('ix_orders_status_created_at', 'status', 'created_at'),
+        # Admin order browser in the bot (admin_orders.py): keyset pages, newest first
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+    )
+    
+    is_archived = False
     
     id = db.Column(db.String(50), primary_key=True)  # ORDER_00001 format
     user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
@@ -123,6 +146,8 @@ class Order(db.Model):
     spotify_login = db.Column(db.String(255), nullable=True)
     spotify_password = db.Column(db.String(255), nullable=True)  # Encrypted
     status = db.Column(db.Enum(OrderStatus), default=OrderStatus.CREATED)
+    previous_status = db.Column(db.Enum(OrderStatus), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Optimistic lock
     total_amount = db.Column(db.Integer, nullable=False)  # Price in rubles
     payment_url = db.Column(db.String(500), nullable=True)
     digiseller_order_id = db.Column(db.String(100), nullable=True)
@@ -131,10 +156,16 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
+    # Work queue claim: operator, lease expiry and the token of the claim batch
+    claimed_by = db.Column(db.Integer, db.ForeignKey('admins.id'), nullable=True)
+    claimed_until = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
     
     # Relationships
     payments = db.relationship('Payment', backref='order', lazy=True, cascade='all, delete-orphan')
     
+    __mapper_args__ = {'version_id_col': version}
+    
     def __repr__(self):
         return f'<Order {self.id}: {self.status.value}>'
     
@@ -145,6 +176,9 @@ class Order(db.Model):
             'plan_id': self.plan_id,
             'spotify_login': self.spotify_login,
             'status': self.status.value if self.status else None,
+            'version': self.version,
+            'claimed_by': self.claimed_by,
+            'claimed_until': self.claimed_until.isoformat() if self.claimed_until else None,
             'total_amount': self.total_amount,
             'payment_url': self.payment_url,
             'digiseller_order_id': self.digiseller_order_id,
@@ -160,6 +194,8 @@ class Order(db.Model):
 class Payment(db.Model):
     __tablename__ = 'payments'
     
+    is_archived = False
+    
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.String(50), db.ForeignKey('orders.id'), nullable=False)
     user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
@@ -192,6 +228,226 @@ class Payment(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class OrderArchive(db.Model):
+    """Terminal orders moved out of `orders` by archive.py
+
+    On PostgreSQL the table is range-partitioned by month of created_at,
+    so the partition key is part of the primary key.
+    """
+    __tablename__ = 'orders_archive'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+    
+    is_archived = True
+    
+    id = db.Column(db.String(50), primary_key=True)
+    user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False, index=True)
+    plan_id = db.Column(db.String(50), db.ForeignKey('subscription_plans.id'), nullable=False)
+    spotify_login = db.Column(db.String(255), nullable=True)
+    spotify_password = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.Enum(OrderStatus))
+    previous_status = db.Column(db.Enum(OrderStatus), nullable=True)
+    version = db.Column(db.Integer, nullable=True)
+    total_amount = db.Column(db.Integer, nullable=False)
+    payment_url = db.Column(db.String(500), nullable=True)
+    digiseller_order_id = db.Column(db.String(100), nullable=True)
+    notes = db.Column(db.Text, nullable=True)
+    admin_notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, primary_key=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    claimed_by = db.Column(db.Integer, nullable=True)
+    claimed_until = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User', viewonly=True)
+    subscription_plan = db.relationship('SubscriptionPlan', viewonly=True)
+    
+    def __repr__(self):
+        return f'<OrderArchive {self.id}: {self.status.value}>'
+    
+    to_dict = Order.to_dict
+
+class PaymentArchive(db.Model):
+    """Payments of archived orders, partitioned like orders_archive"""
+    __tablename__ = 'payments_archive'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+    
+    is_archived = True
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.String(50), nullable=False, index=True)
+    user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)
+    currency = db.Column(db.String(10))
+    status = db.Column(db.Enum(PaymentStatus))
+    payment_method = db.Column(db.String(50))
+    external_payment_id = db.Column(db.String(100), nullable=True)
+    payment_data = db.Column(JSON, nullable=True)
+    paid_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, primary_key=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User', viewonly=True)
+    
+    def __repr__(self):
+        return f'<PaymentArchive {self.id}: {self.amount}₽ - {self.status.value}>'
+    
+    to_dict = Payment.to_dict
+
+class FamilyAccount(db.Model):
+    """A Spotify Family plan whose member seats are sold to customers"""
+    __tablename__ = 'family_accounts'
+    __table_args__ = (
+        # Allocator lookup (families.py): earliest sufficient expiry, fullest
+        # first, over families that can take a member at all
+        db.Index('ix_family_accounts_allocation', 'paid_until', 'free_slots',
+                 postgresql_where=db.text('is_active AND free_slots > 0'),
+                 sqlite_where=db.text('is_active = 1 AND free_slots > 0')),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(100), unique=True, nullable=False)
+    owner_login = db.Column(db.String(255), nullable=False)
+    owner_password = db.Column(db.String(255), nullable=True)  # Encrypted
+    invite_link = db.Column(db.String(500), nullable=True)
+    country = db.Column(db.String(2), nullable=True)
+    capacity = db.Column(db.Integer, nullable=False, default=6)
+    free_slots = db.Column(db.Integer, nullable=False, default=6)  # Denormalized count of free slots
+    paid_until = db.Column(db.DateTime, nullable=False)  # End of the family plan's own subscription
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    slots = db.relationship('FamilySlot', backref='family', lazy=True, cascade='all, delete-orphan',
+                            order_by='FamilySlot.slot_number')
+    
+    def __repr__(self):
+        return f'<FamilyAccount {self.label}: {self.free_slots}/{self.capacity} free>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'label': self.label,
+            'owner_login': self.owner_login,
+            'invite_link': self.invite_link,
+            'country': self.country,
+            'capacity': self.capacity,
+            'free_slots': self.free_slots,
+            'paid_until': self.paid_until.isoformat() if self.paid_until else None,
+            'is_active': self.is_active,
+            'notes': self.notes,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+class FamilySlot(db.Model):
+    """One member seat of a family account"""
+    __tablename__ = 'family_slots'
+    __table_args__ = (
+        db.UniqueConstraint('family_id', 'slot_number', name='uq_family_slots_number'),
+        # Reclamation scan: assigned seats past their expiry
+        db.Index('ix_family_slots_status_expires_at', 'status', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    family_id = db.Column(db.Integer, db.ForeignKey('family_accounts.id'), nullable=False)
+    slot_number = db.Column(db.Integer, nullable=False)
+    # free, assigned, expired (member still has to be removed from the family)
+    status = db.Column(db.String(20), nullable=False, default='free')
+    # No foreign key: the order may be archived while the seat is still held
+    order_id = db.Column(db.String(50), nullable=True, index=True)
+    user_id = db.Column(db.BigInteger, nullable=True)
+    assigned_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<FamilySlot {self.family_id}#{self.slot_number}: {self.status}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'family_id': self.family_id,
+            'slot_number': self.slot_number,
+            'status': self.status,
+            'order_id': self.order_id,
+            'user_id': self.user_id,
+            'assigned_at': self.assigned_at.isoformat() if self.assigned_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+class OrderEvent(db.Model):
+    """Append-only log of order status transitions, written by funnel.py"""
+    __tablename__ = 'order_events'
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    # No foreign key: events outlive orders moved to the archive
+    order_id = db.Column(db.String(50), nullable=False, index=True)
+    user_id = db.Column(db.BigInteger, nullable=True)
+    plan_id = db.Column(db.String(50), nullable=True)
+    from_status = db.Column(db.String(20), nullable=True)
+    to_status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<OrderEvent {self.order_id}: {self.from_status} -> {self.to_status}>'
+
+class OrderFunnelStat(db.Model):
+    """Daily per-plan transition counts, maintained incrementally from order_events"""
+    __tablename__ = 'order_funnel_stats'
+    
+    plan_id = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+    # Seconds from creation to this status, summed for averaging
+    duration_sum = db.Column(db.Float, nullable=False, default=0)
+    duration_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<OrderFunnelStat {self.plan_id} {self.day} {self.status}: {self.event_count}>'
+
+class CohortSummary(db.Model):
+    """Per signup-month cohort totals, rebuilt by cohorts.py"""
+    __tablename__ = 'cohort_summaries'
+    
+    cohort_month = db.Column(db.Date, primary_key=True)  # First day of the signup month
+    users = db.Column(db.Integer, nullable=False, default=0)
+    buyers = db.Column(db.Integer, nullable=False, default=0)  # At least one paid order
+    repeat_buyers = db.Column(db.Integer, nullable=False, default=0)  # Two or more
+    revenue = db.Column(db.BigInteger, nullable=False, default=0)
+    median_days_to_second = db.Column(db.Float, nullable=True)
+    
+    def __repr__(self):
+        return f'<CohortSummary {self.cohort_month}: {self.buyers}/{self.users}>'
+
+class CohortStat(db.Model):
+    """Cohort matrix cell: buyers and revenue N months after signup, rebuilt by cohorts.py"""
+    __tablename__ = 'cohort_stats'
+    
+    cohort_month = db.Column(db.Date, primary_key=True)
+    months_since = db.Column(db.Integer, primary_key=True)
+    active_buyers = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CohortStat {self.cohort_month}+{self.months_since}: {self.active_buyers}>'
+
+class PlanLtv(db.Model):
+    """LTV curve point per first-purchase plan, rebuilt by cohorts.py"""
+    __tablename__ = 'plan_ltv'
+    
+    plan_id = db.Column(db.String(50), primary_key=True)
+    months_since = db.Column(db.Integer, primary_key=True)  # Months since the first purchase
+    customers = db.Column(db.Integer, nullable=False, default=0)  # Customers observed this long
+    ltv = db.Column(db.Float, nullable=False, default=0)  # Mean cumulative revenue, rubles
+    
+    def __repr__(self):
+        return f'<PlanLtv {self.plan_id}+{self.months_since}: {self.ltv}>'
+
 class BroadcastMessage(db.Model):
     __tablename__ = 'broadcast_messages'
     
@@ -211,6 +467,32 @@ class BroadcastMessage(db.Model):
     def __repr__(self):
         return f'<BroadcastMessage {self.title}: {self.status}>'
 
+class OutboxMessage(db.Model):
+    """Telegram notification written in the same transaction as the change it reports
+
+    Delivered by outbox.OutboxDispatcher in the bot process.
+    """
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        # Dispatcher claim query: due messages in id order
+        db.Index('ix_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # admin_paid_order, order_status, ...
+    chat_id = db.Column(db.BigInteger, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    parse_mode = db.Column(db.String(20), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.kind} -> {self.chat_id}: {self.status}>'
+
 class SystemSettings(db.Model):
     __tablename__ = 'system_settings'
     
@@ -223,55 +505,66 @@ class SystemSettings(db.Model):
     def __repr__(self):
         return f'<SystemSettings {self.key}: {self.value}>'
 
+DEFAULT_PLANS = [
+    {"id": "1_month", "name": "1 месяц", "duration_months": 1, "price": 150},
+    {"id": "3_months", "name": "3 месяца", "duration_months": 3, "price": 370},
+    {"id": "6_months", "name": "6 месяцев", "duration_months": 6, "price": 690},
+    {"id": "12_months", "name": "12 месяцев", "duration_months": 12, "price": 1300},
+]
+
+DEFAULT_SETTINGS = [
+    {'key': 'bot_welcome_message', 'value': '🎵 Добро пожаловать в Spotify Family Bot! 🎵', 'description': 'Приветственное сообщение бота'},
+    {'key': 'digiseller_seller_id', 'value': '', 'description': 'ID продавца в Digiseller'},
+    {'key': 'digiseller_secret_key', 'value': '', 'description': 'Секретный ключ Digiseller'},
+    {'key': 'support_username', 'value': 'chanceofrain', 'description': 'Username для поддержки'},
+    {'key': 'throttle_limits', 'value': json.dumps(DEFAULT_THROTTLE_LIMITS), 'description': 'Лимиты частоты запросов к боту: {"действие": {"rate": в секунду, "burst": запас}}'},
+    {'key': 'banned_users_version', 'value': '0', 'description': 'Счетчик изменений списка заблокированных (для бота)'},
+]
+
+def insert_ignore(model, rows, key):
+    """Bulk INSERT ... ON CONFLICT DO NOTHING, skipping rows that already exist
+
+    `key` is the natural key column name, used only on databases without ON CONFLICT.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # Generic fallback: one SELECT for existing keys, one multi-row INSERT
+        column = getattr(model, key)
+        existing = {value for (value,) in db.session.query(column).filter(column.in_([r[key] for r in rows]))}
+        rows = [r for r in rows if r[key] not in existing]
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+        return
+
+    db.session.execute(insert(model).values(rows).on_conflict_do_nothing())
+
 # Initialize default subscription plans
 def init_default_data():
-    """Initialize default subscription plans and admin user"""
-    with db.session.begin():
-        # Create default subscription plans
-        plans_data = [
-            {"id": "1_month", "name": "1 месяц", "duration_months": 1, "price": 150},
-            {"id": "3_months", "name": "3 месяца", "duration_months": 3, "price": 370},
-            {"id": "6_months", "name": "6 месяцев", "duration_months": 6, "price": 690},
-            {"id": "12_months", "name": "12 месяцев", "duration_months": 12, "price": 1300},
-        ]
-        
-        plans = []
-        for plan_data in plans_data:
-            plan = SubscriptionPlan()
-            for key, value in plan_data.items():
-                setattr(plan, key, value)
-            plans.append(plan)
-        
-        for plan in plans:
-            existing = SubscriptionPlan.query.filter_by(id=plan.id).first()
-            if not existing:
-                db.session.add(plan)
-        
-        # Create default admin user
-        admin = Admin.query.filter_by(username='admin').first()
-        if not admin:
-            admin = Admin()
-            admin.username = 'admin'
-            admin.email = 'admin@spotify-bot.com'
-            admin.set_password('admin123')
-            db.session.add(admin)
-        
-        # Create default system settings
-        settings_data = [
-            {'key': 'bot_welcome_message', 'value': '🎵 Добро пожаловать в Spotify Family Bot! 🎵', 'description': 'Приветственное сообщение бота'},
-            {'key': 'digiseller_seller_id', 'value': '', 'description': 'ID продавца в Digiseller'},
-            {'key': 'digiseller_secret_key', 'value': '', 'description': 'Секретный ключ Digiseller'},
-            {'key': 'support_username', 'value': 'chanceofrain', 'description': 'Username для поддержки'},
-        ]
-        
-        settings = []
-        for setting_data in settings_data:
-            setting = SystemSettings()
-            for key, value in setting_data.items():
-                setattr(setting, key, value)
-            settings.append(setting)
-        
-        for setting in settings:
-            existing = SystemSettings.query.filter_by(key=setting.key).first()
-            if not existing:
-                db.session.add(setting)
+    """Initialize default subscription plans, admin user and settings
+
+    Idempotent: every table is seeded with one bulk INSERT ... ON CONFLICT DO NOTHING.
+    Run once per deploy via `python manage.py init-db`, not on import.
+    """
+    insert_ignore(SubscriptionPlan, DEFAULT_PLANS, 'id')
+
+    admin = Admin()
+    admin.set_password('admin123')
+    insert_ignore(Admin, [{
+        'username': 'admin',
+        'email': 'admin@spotify-bot.com',
+        'password_hash': admin.password_hash,
+    }], 'username')
+
+    insert_ignore(SystemSettings, DEFAULT_SETTINGS, 'key')
+    db.session.commit()
+
+# Flush hooks feeding the admin live feed and the order event log;
+# imported here so every process registers them
+import events  # noqa: F401,E402
+import funnel  # noqa: F401,E402
+import transitions  # noqa: F401,E402
+import bans  # noqa: F401,E402
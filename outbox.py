@@ -0,0 +1,247 @@
+"""
+Transactional outbox for Telegram notifications
+
+Handlers and admin views call enqueue() before committing, so a
+notification is stored if and only if the change it reports is. The bot
+process runs OutboxDispatcher, which claims due messages in batches, sends
+them concurrently over the Bot API pool (bot_session.call_many) and records
+the outcome:
+
+  * sent       - done
+  * retryable  - attempts + 1, next try after exponential backoff with
+                 jitter (or Telegram's retry_after)
+  * permanent  - the user blocked the bot, the chat is gone or Telegram
+                 rejects the message itself (too long, empty); marked
+                 failed. Markdown that fails to parse is resent once as
+                 plain text first
+
+Claimed rows get a lease instead of a lock held across the network call;
+if the bot dies mid-batch the lease expires and the rows are sent again,
+so delivery is at least once.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, or_, select, update
+from sqlalchemy.orm import Session
+
+from config import (
+    OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_ATTEMPTS, OUTBOX_BASE_DELAY,
+    OUTBOX_MAX_DELAY, OUTBOX_LEASE_SECONDS, OUTBOX_RETENTION_DAYS
+)
+from models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'outbox_enqueued'
+
+# Bad requests that fail the same way on every retry
+PERMANENT_BAD_REQUESTS = (
+    'chat not found',
+    'message is too long',
+    'message text is empty',
+    "can't parse entities",
+)
+PARSE_ERROR = "can't parse entities"
+
+_wakeup_callbacks = []
+_wakeup_lock = threading.Lock()
+
+
+def enqueue(session, chat_id, text, kind, parse_mode=None):
+    """Add a notification to the caller's transaction"""
+    message = OutboxMessage(kind=kind, chat_id=chat_id, text=text, parse_mode=parse_mode,
+                            status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+    session.add(message)
+    session.info[PENDING_KEY] = True
+    return message
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatchers(session):
+    if session.info.pop(PENDING_KEY, False):
+        with _wakeup_lock:
+            callbacks = list(_wakeup_callbacks)
+        for callback in callbacks:
+            callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def backoff_delay(attempts, base=OUTBOX_BASE_DELAY, cap=OUTBOX_MAX_DELAY):
+    """Full-jitter exponential backoff for the given number of failed attempts"""
+    return random.uniform(base / 2, min(cap, base * 2 ** (attempts - 1)))
+
+
+class OutboxDispatcher:
+    """Background task in the bot process that drains the outbox"""
+
+    def __init__(self, bot, batch_size=OUTBOX_BATCH_SIZE, poll_interval=OUTBOX_POLL_INTERVAL,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS, lease_seconds=OUTBOX_LEASE_SECONDS):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._wakeup = None
+        self._loop = None
+        self._task = None
+        self._purged_at = None
+
+    # --- database side, run in a worker thread ---
+
+    def _claim(self):
+        from app import app, db
+        with app.app_context():
+            now = datetime.utcnow()
+            query = (select(OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.text,
+                            OutboxMessage.parse_mode, OutboxMessage.attempts)
+                     .where(OutboxMessage.status.in_(('pending', 'sending')),
+                            OutboxMessage.next_attempt_at <= now)
+                     .order_by(OutboxMessage.id)
+                     .limit(self.batch_size))
+            if db.session.get_bind(mapper=OutboxMessage).dialect.name == 'postgresql':
+                # Several bot processes can drain the same outbox
+                query = query.with_for_update(skip_locked=True)
+            rows = db.session.execute(query).all()
+            if rows:
+                db.session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_([row.id for row in rows]))
+                    .values(status='sending', next_attempt_at=now + timedelta(seconds=self.lease_seconds))
+                )
+            db.session.commit()
+            return rows
+
+    def _record(self, sent, retries, failures):
+        from app import app, db
+        with app.app_context():
+            now = datetime.utcnow()
+            if sent:
+                db.session.execute(
+                    update(OutboxMessage).where(OutboxMessage.id.in_(sent))
+                    .values(status='sent', sent_at=now, attempts=OutboxMessage.attempts + 1, last_error=None)
+                )
+            for message_id, delay, error in retries:
+                db.session.execute(
+                    update(OutboxMessage).where(OutboxMessage.id == message_id)
+                    .values(status='pending', attempts=OutboxMessage.attempts + 1, last_error=error,
+                            next_attempt_at=now + timedelta(seconds=delay))
+                )
+            for message_id, error in failures:
+                db.session.execute(
+                    update(OutboxMessage).where(OutboxMessage.id == message_id)
+                    .values(status='failed', attempts=OutboxMessage.attempts + 1, last_error=error)
+                )
+            db.session.commit()
+
+    def _purge(self):
+        from app import app, db
+        with app.app_context():
+            cutoff = datetime.utcnow() - timedelta(days=OUTBOX_RETENTION_DAYS)
+            deleted = db.session.execute(
+                delete(OutboxMessage).where(
+                    OutboxMessage.status.in_(('sent', 'failed')),
+                    or_(OutboxMessage.sent_at < cutoff, OutboxMessage.created_at < cutoff),
+                )
+            ).rowcount
+            db.session.commit()
+            if deleted:
+                logger.info(f"Удалено {deleted} старых сообщений из outbox")
+
+    # --- sending side ---
+
+    async def _send(self, row, parse_mode=None):
+        from aiogram.exceptions import TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter, TelegramBadRequest
+        try:
+            await self.bot.send_message(row.chat_id, row.text, parse_mode=parse_mode)
+            return 'sent', None, None
+        except TelegramRetryAfter as e:
+            return 'retry', float(e.retry_after), str(e)
+        except (TelegramForbiddenError, TelegramNotFound) as e:
+            return 'failed', None, str(e)
+        except TelegramBadRequest as e:
+            error = str(e).lower()
+            if PARSE_ERROR in error and parse_mode:
+                logger.warning(f"Уведомление {row.id}: разметка не разобрана, отправляем без нее")
+                return await self._send(row)
+            if any(reason in error for reason in PERMANENT_BAD_REQUESTS):
+                return 'failed', None, str(e)
+            return 'retry', None, str(e)
+        except Exception as e:
+            return 'retry', None, f"{type(e).__name__}: {e}"
+
+    async def drain_once(self):
+        """Claim and send one batch; returns the number of messages claimed"""
+        rows = await asyncio.to_thread(self._claim)
+        if not rows:
+            return 0
+
+        from bot_session import call_many
+        outcomes = await call_many([self._send(row, row.parse_mode) for row in rows])
+        sent, retries, failures = [], [], []
+        for row, (outcome, delay, error) in zip(rows, outcomes):
+            if outcome == 'sent':
+                sent.append(row.id)
+            elif outcome == 'retry' and row.attempts + 1 < self.max_attempts:
+                retries.append((row.id, delay if delay is not None else backoff_delay(row.attempts + 1), error))
+            else:
+                failures.append((row.id, error))
+                logger.error(f"Уведомление {row.id} для {row.chat_id} не доставлено: {error}")
+        await asyncio.to_thread(self._record, sent, retries, failures)
+        return len(rows)
+
+    def wakeup(self):
+        """Thread-safe nudge after a commit that enqueued messages"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        with _wakeup_lock:
+            _wakeup_callbacks.append(self.wakeup)
+        logger.info("Диспетчер outbox запущен")
+        try:
+            while True:
+                try:
+                    claimed = await self.drain_once()
+                    if self._purged_at is None or datetime.utcnow() - self._purged_at > timedelta(hours=1):
+                        await asyncio.to_thread(self._purge)
+                        self._purged_at = datetime.utcnow()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Ошибка диспетчера outbox: {e}")
+                    claimed = 0
+                if claimed >= self.batch_size:
+                    # Full batch: more are probably waiting
+                    continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with _wakeup_lock:
+                _wakeup_callbacks.remove(self.wakeup)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
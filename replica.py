@@ -0,0 +1,157 @@
+"""
+Read-replica routing for analytics and admin reads
+
+When DATABASE_REPLICA_URL is set, views wrapped in @replica_reads send their
+SELECTs to the replica. Everything else stays on the primary, and so do:
+  * any statement issued after the session has flushed a write
+  * requests from an admin who wrote within the staleness tolerance
+  * all reads while the replica is down or lagging behind REPLICA_MAX_LAG
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, text
+
+logger = logging.getLogger(__name__)
+
+USE_REPLICA_KEY = 'use_replica'
+WROTE_KEY = 'wrote_to_primary'
+LAST_WRITE_KEY = 'last_write_at'
+
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaMonitor:
+    """Lazily created replica engine with a cached health and lag check"""
+
+    def __init__(self, url, engine_options, max_lag, check_interval):
+        self.url = url
+        self.engine_options = engine_options
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.engine = None
+        self.healthy = False
+        self.lag = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _check(self):
+        try:
+            if self.engine is None:
+                self.engine = create_engine(self.url, **self.engine_options)
+                event.listen(self.engine, 'handle_error', self._on_error)
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == 'postgresql':
+                    self.lag = float(conn.execute(LAG_QUERY).scalar() or 0)
+                else:
+                    conn.execute(text('SELECT 1'))
+                    self.lag = 0.0
+            healthy = self.lag <= self.max_lag
+            if not healthy:
+                logger.warning(f"Replica lag {self.lag:.1f}s exceeds {self.max_lag}s, reading from primary")
+        except Exception as e:
+            if self.healthy:
+                logger.error(f"Replica unavailable, falling back to primary: {e}")
+            healthy = False
+        self.healthy = healthy
+
+    def usable_engine(self):
+        """Return the replica engine if it is up and fresh enough, else None"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._check()
+                    self._checked_at = time.monotonic()
+        return self.engine if self.healthy else None
+
+    def _on_error(self, context):
+        # Lost connection mid-request: stop routing here until the next check
+        if context.is_disconnect:
+            self.healthy = False
+            self._checked_at = time.monotonic()
+
+
+def get_monitor(app=None):
+    """Return the app's replica monitor, or None if no replica is configured"""
+    app = app or current_app
+    if 'replica' not in app.extensions:
+        url = app.config.get('SQLALCHEMY_REPLICA_URI')
+        app.extensions['replica'] = ReplicaMonitor(
+            url,
+            app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+            app.config.get('REPLICA_MAX_LAG', 5),
+            app.config.get('REPLICA_CHECK_INTERVAL', 10),
+        ) if url else None
+    return app.extensions['replica']
+
+
+class RoutingSession(FlaskSession):
+    """Session that sends reads to the replica when the caller opted in"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if clause is not None and getattr(clause, 'is_dml', False):
+            # Core INSERT/UPDATE/DELETE through the session count as writes too
+            self.info[WROTE_KEY] = True
+        if (bind is None and self.info.get(USE_REPLICA_KEY)
+                and not self._flushing and not self.info.get(WROTE_KEY)):
+            monitor = get_monitor()
+            engine = monitor.usable_engine() if monitor else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_to_primary(session, flush_context):
+    """Read-after-write: once a session writes, later reads use the primary"""
+    session.info[WROTE_KEY] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    if session.info.get(WROTE_KEY) and has_request_context():
+        flask_session[LAST_WRITE_KEY] = time.time()
+
+
+def _recently_wrote():
+    if not has_request_context():
+        return False
+    last_write = flask_session.get(LAST_WRITE_KEY)
+    return last_write is not None and time.time() - last_write < current_app.config.get('REPLICA_MAX_LAG', 5)
+
+
+@contextmanager
+def replica_session(db):
+    """Route reads of `db.session` to the replica for the duration of the block"""
+    previous = db.session.info.get(USE_REPLICA_KEY)
+    db.session.info[USE_REPLICA_KEY] = not _recently_wrote()
+    try:
+        yield db.session
+    finally:
+        db.session.info[USE_REPLICA_KEY] = previous
+
+
+def replica_stream(db, chunks):
+    """Wrap a lazily evaluated generator so its queries also use the replica"""
+    with replica_session(db):
+        yield from chunks
+
+
+def replica_reads(f):
+    """Decorator for read-only views that tolerate replica staleness"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from app import db
+        with replica_session(db):
+            return f(*args, **kwargs)
+    return decorated_function
@@ -1,10 +1,18 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+import os
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from werkzeug.security import check_password_hash
 from app import app, db
-from models import Admin, User, Order, SubscriptionPlan, Payment, BroadcastMessage, SystemSettings, OrderStatus, PaymentStatus
+from models import Admin, User, Order, SubscriptionPlan, Payment, BroadcastMessage, SystemSettings, OrderStatus, PaymentStatus, OrderArchive, PaymentArchive
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
 import json
+from replica import replica_reads, replica_stream
+from transitions import transition_order, TransitionConflict, after_staff_transition
+from work_queue import (
+    claim_orders, renew_claims, release_claims, my_claims, queue_overview,
+    not_claimed_by_other, release_values
+)
+from families import allocate_slot, free_slot, create_family, inventory, NoFamilyAvailable
 
 def login_required(f):
     """Decorator for requiring admin login"""
@@ -53,6 +61,7 @@ def logout():
 
 @app.route('/admin/dashboard')
 @login_required
+@replica_reads
 def dashboard():
     """Admin dashboard with statistics"""
     # Get statistics
@@ -61,6 +70,13 @@ def dashboard():
     completed_orders = Order.query.filter_by(status=OrderStatus.COMPLETED).count()
     total_revenue = db.session.query(func.sum(Payment.amount)).filter_by(status=PaymentStatus.COMPLETED).scalar() or 0
     
+    # Lifetime totals including archived rows, only on request
+    include_archived = request.args.get('include_archived') == '1'
+    if include_archived:
+        total_orders += OrderArchive.query.count()
+        completed_orders += OrderArchive.query.filter_by(status=OrderStatus.COMPLETED).count()
+        total_revenue += db.session.query(func.sum(PaymentArchive.amount)).filter_by(status=PaymentStatus.COMPLETED).scalar() or 0
+    
     # Get recent orders
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
     
@@ -100,6 +116,11 @@ def dashboard():
     
     daily_stats.reverse()
     
+    # Conversion funnel from the incrementally maintained rollup
+    from funnel import funnel_report
+    from cohorts import cohort_report
+    funnel = funnel_report(days=30, refresh=False)
+    
     return render_template('dashboard.html', 
                          total_users=total_users,
                          total_orders=total_orders,
@@ -108,10 +129,14 @@ def dashboard():
                          monthly_orders=monthly_orders,
                          monthly_revenue=monthly_revenue,
                          recent_orders=recent_orders,
+                         include_archived=include_archived,
+                         funnel=funnel,
+                         cohorts=cohort_report(),
                          daily_stats=json.dumps(daily_stats))
 
 @app.route('/admin/users')
 @login_required
+@replica_reads
 def users():
     """Users management page"""
     page = request.args.get('page', 1, type=int)
@@ -134,11 +159,13 @@ def users():
 
 @app.route('/admin/orders')
 @login_required
+@replica_reads
 def orders():
     """Orders management page"""
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', '')
     search = request.args.get('search', '')
+    include_archived = request.args.get('include_archived') == '1'
     
     query = Order.query
     
@@ -152,32 +179,56 @@ def orders():
             (User.first_name.contains(search))
         )
     
-    orders = query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    if include_archived:
+        from archive import paginate_with_archive
+        archive_query = OrderArchive.query
+        if status_filter:
+            archive_query = archive_query.filter(OrderArchive.status == OrderStatus(status_filter))
+        if search:
+            archive_query = archive_query.join(User).filter(
+                (OrderArchive.id.contains(search)) |
+                (User.username.contains(search)) |
+                (User.first_name.contains(search))
+            )
+        orders = paginate_with_archive(query, archive_query, Order, OrderArchive, page, 20)
+    else:
+        orders = query.order_by(Order.created_at.desc()).paginate(
+            page=page, per_page=20, error_out=False
+        )
     
     return render_template('orders.html', orders=orders, 
                          status_filter=status_filter, search=search,
+                         include_archived=include_archived,
                          order_statuses=OrderStatus)
 
 @app.route('/admin/payments')
 @login_required
+@replica_reads
 def payments():
     """Payments management page"""
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', '')
+    include_archived = request.args.get('include_archived') == '1'
     
     query = Payment.query
     
     if status_filter:
         query = query.filter(Payment.status == PaymentStatus(status_filter))
     
-    payments = query.order_by(Payment.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    if include_archived:
+        from archive import paginate_with_archive
+        archive_query = PaymentArchive.query
+        if status_filter:
+            archive_query = archive_query.filter(PaymentArchive.status == PaymentStatus(status_filter))
+        payments = paginate_with_archive(query, archive_query, Payment, PaymentArchive, page, 20)
+    else:
+        payments = query.order_by(Payment.created_at.desc()).paginate(
+            page=page, per_page=20, error_out=False
+        )
     
     return render_template('payments.html', payments=payments,
                          status_filter=status_filter,
+                         include_archived=include_archived,
                          payment_statuses=PaymentStatus)
 
 @app.route('/admin/broadcast', methods=['GET', 'POST'])
@@ -287,24 +338,117 @@ def ban_user(user_id):
 @login_required
 def update_order_status(order_id):
     """Update order status"""
-    order = Order.query.get_or_404(order_id)
     new_status = request.json.get('status')
     admin_notes = request.json.get('notes', '')
+    expected_version = request.json.get('version')
     
     try:
-        order.status = OrderStatus(new_status)
-        order.admin_notes = admin_notes
-        
-        if new_status == 'completed':
-            order.completed_at = datetime.utcnow()
-        
-        db.session.commit()
-        return jsonify({'success': True, 'message': f'Статус заказа обновлен на {new_status}'})
+        # Orders another operator holds in the work queue are left alone;
+        # moving an order on drops its claim
+        changed = transition_order(db.session, order_id, new_status,
+                                   expected_version=expected_version, admin_notes=admin_notes,
+                                   conditions=(not_claimed_by_other(session['admin_id']),),
+                                   **release_values())
     except ValueError:
         return jsonify({'success': False, 'message': 'Неверный статус заказа'}), 400
+    except TransitionConflict:
+        db.session.rollback()
+        return jsonify({'success': False,
+                        'message': 'Заказ не найден, изменен другим пользователем или не может перейти в этот статус'}), 409
+    
+    # Frees a cancelled order's family seat and notifies the customer through the outbox
+    after_staff_transition(db.session, changed)
+    db.session.commit()
+    return jsonify({'success': True, 'message': f'Статус заказа обновлен на {new_status}'})
+
+@app.route('/api/order/<order_id>/allocate', methods=['POST'])
+@login_required
+def allocate_order_slot(order_id):
+    """Assign a paid order a seat in the best-fitting family account"""
+    try:
+        slot = allocate_slot(db.session, order_id)
+    except LookupError:
+        return jsonify({'success': False, 'message': 'Заказ не найден или не оплачен'}), 404
+    except NoFamilyAvailable as e:
+        db.session.rollback()
+        return jsonify({'success': False,
+                        'message': f'Нет семейного аккаунта со свободным местом до {e.expires_at:%d.%m.%Y}'}), 409
+    db.session.commit()
+    return jsonify({'success': True, 'slot': slot.to_dict(), 'family': slot.family.to_dict()})
+
+@app.route('/api/families')
+@login_required
+def families_inventory():
+    """Seat inventory across family accounts"""
+    return jsonify(inventory(db.session))
+
+@app.route('/api/families', methods=['POST'])
+@login_required
+def add_family():
+    """Add a family account with all seats free"""
+    data = request.get_json(silent=True) or {}
+    try:
+        paid_until = datetime.fromisoformat(data['paid_until'])
+        family = create_family(
+            db.session, data['label'], data['owner_login'], paid_until,
+            **{key: data[key] for key in ('capacity', 'owner_password', 'invite_link', 'country', 'notes')
+               if data.get(key) is not None}
+        )
+        db.session.commit()
+    except (KeyError, TypeError, ValueError):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Нужны label, owner_login и paid_until (ISO)'}), 400
+    return jsonify({'success': True, 'family': family.to_dict()})
+
+@app.route('/api/families/slots/<int:slot_id>/free', methods=['POST'])
+@login_required
+def free_family_slot(slot_id):
+    """Return a seat to the pool after its member was removed from the family"""
+    if not free_slot(db.session, slot_id):
+        return jsonify({'success': False, 'message': 'Место не найдено или не ожидает освобождения'}), 409
+    db.session.commit()
+    return jsonify({'success': True})
+
+@app.route('/api/queue')
+@login_required
+def work_queue():
+    """Work queue state and the orders the current operator holds"""
+    return jsonify({**queue_overview(db.session), 'mine': my_claims(db.session, session['admin_id'])})
+
+@app.route('/api/queue/claim', methods=['POST'])
+@login_required
+def work_queue_claim():
+    """Claim the next batch of paid orders"""
+    limit = (request.get_json(silent=True) or {}).get('limit') or request.args.get('limit', type=int)
+    try:
+        limit = max(1, min(int(limit), 50)) if limit else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Неверный размер пачки'}), 400
+    orders = claim_orders(db.session, session['admin_id'], **({'limit': limit} if limit else {}))
+    db.session.commit()
+    return jsonify({'success': True, 'orders': orders})
+
+@app.route('/api/queue/renew', methods=['POST'])
+@login_required
+def work_queue_renew():
+    """Extend the current operator's leases"""
+    order_ids = (request.get_json(silent=True) or {}).get('order_ids')
+    renewed = renew_claims(db.session, session['admin_id'], order_ids)
+    db.session.commit()
+    return jsonify({'success': True, 'renewed': renewed})
+
+@app.route('/api/queue/release', methods=['POST'])
+@login_required
+def work_queue_release():
+    """Return the current operator's orders to the queue"""
+    order_ids = (request.get_json(silent=True) or {}).get('order_ids')
+    released = release_claims(db.session, session['admin_id'], order_ids)
+    db.session.commit()
+    return jsonify({'success': True, 'released': released})
 
 @app.route('/api/stats/chart')
 @login_required
+@replica_reads
 def stats_chart():
     """Get chart data for dashboard"""
     days = request.args.get('days', 30, type=int)
@@ -337,6 +481,106 @@ def stats_chart():
     chart_data.reverse()
     return jsonify(chart_data)
 
+@app.route('/admin/export/<entity>')
+@login_required
+def export_data(entity):
+    """Stream orders, payments or users as CSV or JSON Lines"""
+    from exports import EXPORT_FORMATS, iter_export, export_filename, parse_date
+
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', '0') in ('1', 'true', 'yes')
+
+    try:
+        filters = {
+            'date_from': parse_date(request.args.get('date_from')),
+            'date_to': parse_date(request.args.get('date_to')),
+            'status': request.args.get('status') or None,
+            'include_archived': request.args.get('include_archived') == '1',
+        }
+        chunks = iter_export(entity, fmt, compress, **filters)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    headers = {
+        'Content-Disposition': f'attachment; filename={export_filename(entity, fmt, compress)}'
+    }
+    mimetype = 'application/gzip' if compress else EXPORT_FORMATS[fmt]
+    return Response(stream_with_context(replica_stream(db, chunks)), mimetype=mimetype, headers=headers)
+
+@app.route('/admin/events')
+@login_required
+def admin_events():
+    """Server-sent events feed of new orders, status changes and payments"""
+    from events import broker, sse_stream, ensure_listener
+
+    q = broker.subscribe()
+    if q is None:
+        return jsonify({'error': 'Too many open event streams, try again later'}), 503, {'Retry-After': '30'}
+    ensure_listener(db.engine)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(sse_stream(q), mimetype='text/event-stream', headers=headers)
+    # Frees the slot even if the client leaves before the first frame
+    response.call_on_close(lambda: broker.unsubscribe(q))
+    return response
+
+@app.route('/api/stats/funnel')
+@login_required
+def stats_funnel():
+    """Order funnel and time-to-status report"""
+    from funnel import funnel_report
+    
+    days = request.args.get('days', 30, type=int)
+    plan_id = request.args.get('plan_id') or None
+    return jsonify(funnel_report(days=max(1, min(days, 3650)), plan_id=plan_id, refresh=False))
+
+@app.route('/api/stats/cohorts')
+@login_required
+@replica_reads
+def stats_cohorts():
+    """Cohort retention, repeat rate and LTV curves from the last analytics run"""
+    from cohorts import cohort_report
+    cohorts = request.args.get('cohorts', 12, type=int)
+    months = request.args.get('months', 12, type=int)
+    return jsonify(cohort_report(cohorts=max(1, min(cohorts, 120)), months=max(0, min(months, 120))))
+
+@app.route('/api/stats/throttle')
+@login_required
+def stats_throttle():
+    """Bot rate limiting counters, as last published by the bot"""
+    from throttling import read_metrics
+    return jsonify(read_metrics() or {})
+
+@app.route('/api/stats/sql')
+@login_required
+def stats_sql():
+    """Rolling per-route request and database timings"""
+    route_stats = app.extensions.get('sql_profiling')
+    if route_stats is None:
+        return jsonify({'error': 'SQL profiling is disabled'}), 404
+    return jsonify({'routes': route_stats.snapshot()})
+
+@app.route('/api/stats/pool')
+@login_required
+def stats_pool():
+    """Connection pool sizing and metrics of this worker process"""
+    from db_pool import pool_stats
+    from replica import get_monitor
+    engines = {'primary': pool_stats(db.engine)}
+    monitor = get_monitor()
+    if monitor is not None and monitor.engine is not None:
+        engines['replica'] = pool_stats(monitor.engine)
+    return jsonify({'pid': os.getpid(), 'sizing': app.extensions.get('db_pool'), 'engines': engines})
+
+@app.route('/api/stats/sql/reset', methods=['POST'])
+@login_required
+def stats_sql_reset():
+    """Start a fresh profiling window"""
+    route_stats = app.extensions.get('sql_profiling')
+    if route_stats is None:
+        return jsonify({'error': 'SQL profiling is disabled'}), 404
+    route_stats.reset()
+    return jsonify({'success': True})
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
@@ -0,0 +1,185 @@
+"""
+Row-tuple serializers for the versioned JSON API
+
+Each resource declares its public fields as column expressions. A request
+picks a sparse fieldset and related resources to include; the query then
+selects exactly those columns, with the includes as outer joins, and each
+row tuple becomes a dict with zip() - no ORM objects, no relationship
+loads, no per-field isoformat() calls.
+
+Datetimes and enums are left as they are for the encoder: orjson writes
+them natively when it is installed; otherwise the standard json module
+converts them in `default`. Both produce the same ISO-8601 strings and
+enum values as the models' to_dict().
+"""
+
+import decimal
+import enum
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from models import User, Order, SubscriptionPlan, Payment
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FieldError(ValueError):
+    """Unknown resource, field or include in a request"""
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(payload):
+        """Encode to JSON bytes"""
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(payload):
+        """Encode to JSON bytes"""
+        return json.dumps(payload, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class Resource:
+    """A model exposed through the API: public fields, defaults and includes"""
+
+    def __init__(self, name, model, fields, default_fields, includes=None, order_by=()):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.default_fields = default_fields
+        # include name -> (resource name, join condition)
+        self.includes = includes or {}
+        self.order_by = order_by
+
+    def pick(self, requested):
+        """Validate a sparse fieldset; the id always comes along"""
+        if not requested:
+            return list(self.default_fields)
+        unknown = [name for name in requested if name not in self.fields]
+        if unknown:
+            raise FieldError(f"Unknown {self.name} fields: {', '.join(unknown)}")
+        return ['id'] + [name for name in dict.fromkeys(requested) if name != 'id']
+
+
+RESOURCES = {
+    'orders': Resource('orders', Order, {
+        'id': Order.id,
+        'user_id': Order.user_id,
+        'plan_id': Order.plan_id,
+        'spotify_login': Order.spotify_login,
+        'status': Order.status,
+        'version': Order.version,
+        'total_amount': Order.total_amount,
+        'payment_url': Order.payment_url,
+        'digiseller_order_id': Order.digiseller_order_id,
+        'notes': Order.notes,
+        'admin_notes': Order.admin_notes,
+        'claimed_by': Order.claimed_by,
+        'claimed_until': Order.claimed_until,
+        'created_at': Order.created_at,
+        'updated_at': Order.updated_at,
+        'completed_at': Order.completed_at,
+    }, ['id', 'user_id', 'plan_id', 'status', 'total_amount', 'created_at', 'updated_at'], includes={
+        'user': ('users', Order.user_id == User.id),
+        'plan': ('plans', Order.plan_id == SubscriptionPlan.id),
+    }, order_by=(Order.created_at.desc(), Order.id.desc())),
+    'users': Resource('users', User, {
+        'id': User.id,
+        'username': User.username,
+        'first_name': User.first_name,
+        'last_name': User.last_name,
+        'phone_number': User.phone_number,
+        'language_code': User.language_code,
+        'role': User.role,
+        'is_active': User.is_active,
+        'is_banned': User.is_banned,
+        'ban_reason': User.ban_reason,
+        'created_at': User.created_at,
+        'updated_at': User.updated_at,
+        'last_activity': User.last_activity,
+    }, ['id', 'username', 'first_name', 'last_name', 'is_banned', 'created_at', 'last_activity'],
+        order_by=(User.created_at.desc(), User.id.desc())),
+    'payments': Resource('payments', Payment, {
+        'id': Payment.id,
+        'order_id': Payment.order_id,
+        'user_id': Payment.user_id,
+        'amount': Payment.amount,
+        'currency': Payment.currency,
+        'status': Payment.status,
+        'payment_method': Payment.payment_method,
+        'external_payment_id': Payment.external_payment_id,
+        'payment_data': Payment.payment_data,
+        'paid_at': Payment.paid_at,
+        'created_at': Payment.created_at,
+        'updated_at': Payment.updated_at,
+    }, ['id', 'order_id', 'user_id', 'amount', 'currency', 'status', 'paid_at', 'created_at'], includes={
+        'order': ('orders', Payment.order_id == Order.id),
+        'user': ('users', Payment.user_id == User.id),
+    }, order_by=(Payment.created_at.desc(), Payment.id.desc())),
+    # Only reachable as an include
+    'plans': Resource('plans', SubscriptionPlan, {
+        'id': SubscriptionPlan.id,
+        'name': SubscriptionPlan.name,
+        'duration_months': SubscriptionPlan.duration_months,
+        'price': SubscriptionPlan.price,
+        'is_active': SubscriptionPlan.is_active,
+    }, ['id', 'name', 'duration_months', 'price']),
+}
+
+
+class Projection:
+    """A SELECT for one resource, fieldset and include list, and its row serializer"""
+
+    def __init__(self, resource_name, fields=None, include=(), fields_by_include=None):
+        resource = RESOURCES[resource_name]
+        fields_by_include = fields_by_include or {}
+        unknown = [name for name in include if name not in resource.includes]
+        if unknown:
+            raise FieldError(f"Unknown {resource_name} includes: {', '.join(unknown)}")
+
+        self.resource = resource
+        self.keys = resource.pick(fields)
+        columns = [resource.fields[name] for name in self.keys]
+        # (include name, keys, start, end) slices of the row
+        self.nested = []
+        joins = []
+        for name in dict.fromkeys(include):
+            target_name, condition = resource.includes[name]
+            target = RESOURCES[target_name]
+            keys = target.pick(fields_by_include.get(name))
+            start = len(columns)
+            columns.extend(target.fields[key] for key in keys)
+            self.nested.append((name, keys, start, len(columns)))
+            joins.append((target.model, condition))
+
+        query = select(*columns).select_from(resource.model)
+        for model, condition in joins:
+            query = query.outerjoin(model, condition)
+        self.query = query
+
+    def serialize(self, row):
+        keys = self.keys
+        item = dict(zip(keys, row[:len(keys)]))
+        for name, nested_keys, start, end in self.nested:
+            # The included id is the first column; NULL means no related row
+            item[name] = dict(zip(nested_keys, row[start:end])) if row[start] is not None else None
+        return item
+
+    def serialize_all(self, rows):
+        if not self.nested:
+            keys = self.keys
+            return [dict(zip(keys, row)) for row in rows]
+        return [self.serialize(row) for row in rows]
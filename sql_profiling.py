@@ -0,0 +1,175 @@
+"""
+Per-request SQL profiling for the Flask admin
+
+Cursor execution hooks count statements and time spent in the database
+for the current request. Each response carries a Server-Timing header
+(visible in the browser's network panel), statements slower than
+SLOW_QUERY_MS go to the 'slow_query' logger together with the shape of
+their parameters (never the values), and every route keeps rolling
+statistics over its last ROUTE_STATS_WINDOW requests for /api/stats/sql.
+
+Importing the module has no effect; init_app() installs the hooks.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import SLOW_QUERY_MS, ROUTE_STATS_WINDOW
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('slow_query')
+
+STATEMENT_PREVIEW = 1000
+
+
+def param_shape(parameters, executemany=False):
+    """Describe bound parameters by type only, e.g. {'id': 'int'} or ['str', 'int']"""
+    if executemany:
+        return {'rows': len(parameters), 'row': param_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'db_time', 'slowest', 'slowest_statement')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def add(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = statement
+
+
+class RouteStats:
+    """Rolling window of (duration, db_time, queries) samples per route"""
+
+    def __init__(self, window=ROUTE_STATS_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._slowest = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, duration, profile):
+        with self._lock:
+            samples = self._samples.get(route)
+            if samples is None:
+                samples = self._samples[route] = deque(maxlen=self.window)
+            samples.append((duration, profile.db_time, profile.queries))
+            self._totals[route] = self._totals.get(route, 0) + 1
+            slowest = self._slowest.get(route)
+            if profile.slowest_statement and (slowest is None or profile.slowest > slowest[0]):
+                self._slowest[route] = (profile.slowest, profile.slowest_statement[:STATEMENT_PREVIEW])
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._slowest.clear()
+            self._totals.clear()
+
+    def snapshot(self):
+        with self._lock:
+            items = [(route, list(samples)) for route, samples in self._samples.items()]
+            slowest = dict(self._slowest)
+            totals = dict(self._totals)
+
+        def ms(value):
+            return round(value * 1000, 2)
+
+        routes = []
+        for route, samples in items:
+            durations = sorted(s[0] for s in samples)
+            db_times = sorted(s[1] for s in samples)
+            count = len(samples)
+            routes.append({
+                'route': route,
+                'requests': totals.get(route, count),
+                'window': count,
+                'avg_ms': ms(sum(durations) / count),
+                'p95_ms': ms(durations[min(count - 1, int(count * 0.95))]),
+                'avg_db_ms': ms(sum(db_times) / count),
+                'p95_db_ms': ms(db_times[min(count - 1, int(count * 0.95))]),
+                'avg_queries': round(sum(s[2] for s in samples) / count, 1),
+                'max_queries': max(s[2] for s in samples),
+                'slowest_query_ms': ms(slowest[route][0]) if route in slowest else None,
+                'slowest_query': slowest[route][1] if route in slowest else None,
+            })
+        routes.sort(key=lambda r: r['avg_db_ms'] * r['window'], reverse=True)
+        return routes
+
+
+route_stats = RouteStats()
+
+
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._profiling_started = time.perf_counter()
+
+
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_profiling_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+
+    profile = g.get('sql_profile') if has_request_context() else None
+    if profile is not None:
+        profile.add(statement, elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_logger.warning(
+            f"Slow query: {elapsed * 1000:.1f} ms",
+            extra={
+                'duration_ms': round(elapsed * 1000, 2),
+                'statement': statement[:STATEMENT_PREVIEW],
+                'params_shape': param_shape(parameters, executemany),
+                'route': request.endpoint if has_request_context() else None,
+                'database': conn.engine.url.render_as_string(hide_password=True).split('@')[-1],
+            }
+        )
+
+
+def init_app(app):
+    """Profile every request of `app` and expose the results"""
+    if not event.contains(Engine, 'before_cursor_execute', _start_timer):
+        event.listen(Engine, 'before_cursor_execute', _start_timer)
+        event.listen(Engine, 'after_cursor_execute', _stop_timer)
+    app.extensions['sql_profiling'] = route_stats
+
+    @app.before_request
+    def _start_profile():
+        g.sql_profile = RequestProfile()
+        g.sql_profile_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('sql_profile', None)
+        started = g.pop('sql_profile_started', None)
+        if profile is None or started is None:
+            return response
+        duration = time.perf_counter() - started
+
+        response.headers.add('Server-Timing', (
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries", '
+            f'db-max;dur={profile.slowest * 1000:.1f}, '
+            f'app;dur={duration * 1000:.1f}'
+        ))
+        if request.url_rule is not None:
+            route_stats.record(f"{request.method} {request.url_rule.rule}", duration, profile)
+        return response
@@ -0,0 +1,177 @@
+"""
+Tuned embedded SQLite mode for single-node deployments
+
+Enabled automatically when DATABASE_URL starts with sqlite://. Every
+connection gets WAL journaling, synchronous=NORMAL, memory-mapped I/O and a
+larger page cache. Write transactions go through a single-writer queue: a
+thread lock inside the process plus an flock on a sidecar file across
+processes, so the bot and the web app wait their turn in Python instead of
+failing with "database is locked".
+
+The slot is taken before the first write statement a connection runs, ORM
+flush or Core DML alike, and held until the connection goes back to the
+pool. The bot runs its database work on the event loop thread, so waiting
+for the slot stalls every chat; the wait is bounded by
+SQLITE_WRITER_TIMEOUT_MS and then fails like a busy database would.
+"""
+
+import fcntl
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are KiB, so -65536 is a 64 MiB page cache per connection
+SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", "-65536"))
+# Longest wait for the writer slot; kept short because the bot waits on its event loop
+SQLITE_WRITER_TIMEOUT_MS = int(os.environ.get("SQLITE_WRITER_TIMEOUT_MS", "5000"))
+
+WRITER_KEY = 'sqlite_writer_held'
+_WRITE_STATEMENT = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
+
+def is_sqlite(url):
+    return bool(url) and url.startswith('sqlite')
+
+
+def sqlite_engine_options():
+    """Engine options replacing the Postgres-oriented recycle/pre-ping settings"""
+    return {
+        "connect_args": {
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            "check_same_thread": False,
+        },
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_pragmas(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__.split('.')[0] not in ('sqlite3', 'pysqlite2'):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+class WriterQueue:
+    """Serializes write transactions within and across processes"""
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        # Reentrant so nested app contexts in one thread cannot deadlock
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self._pid = None
+
+    def _file(self):
+        # Reopen after fork: flock is shared by descriptors inherited across fork
+        if self._pid != os.getpid():
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=timeout):
+            raise self._timed_out(timeout)
+        if self._depth == 0:
+            try:
+                self._flock(deadline, timeout)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def _flock(self, deadline, timeout):
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(self._file(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(timeout)
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.05)
+
+    def _timed_out(self, timeout):
+        # Raised from inside statement execution, so SQLAlchemy wraps it like SQLITE_BUSY
+        return sqlite3.OperationalError(f"database is locked: no writer slot after {timeout:.1f}s")
+
+    def release(self):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                fcntl.flock(self._file(), fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+
+_writer_queue = None
+
+
+def enable_writer_queue(database_path):
+    """Install hooks that take the writer slot before a connection's first write"""
+    global _writer_queue
+    if _writer_queue is not None:
+        return
+    _writer_queue = WriterQueue(f"{database_path}-writer.lock")
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _acquire_writer(conn, cursor, statement, parameters, context, executemany):
+        if conn.dialect.name != 'sqlite' or not _WRITE_STATEMENT.match(statement):
+            return
+        info = conn.info
+        if not info.get(WRITER_KEY):
+            _writer_queue.acquire(SQLITE_WRITER_TIMEOUT_MS / 1000)
+            info[WRITER_KEY] = True
+
+    # Checkin comes after the session or connection has committed or rolled back
+    @event.listens_for(Pool, 'checkin')
+    def _release_writer(dbapi_connection, connection_record):
+        if connection_record is not None and connection_record.info.pop(WRITER_KEY, False):
+            _writer_queue.release()
+
+    @event.listens_for(Pool, 'invalidate')
+    def _release_invalidated(dbapi_connection, connection_record, exception):
+        if connection_record.info.pop(WRITER_KEY, False):
+            _writer_queue.release()
+
+
+def configure_app(app):
+    """Switch engine options to SQLite tuning if the app points at SQLite"""
+    url = app.config.get("SQLALCHEMY_DATABASE_URI")
+    if not is_sqlite(url):
+        return False
+
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options()
+
+    database_path = url.split(':///', 1)[-1].split('?', 1)[0] if ':///' in url else ''
+    if database_path and database_path != ':memory:':
+        # Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+        if not os.path.isabs(database_path):
+            database_path = os.path.join(app.instance_path, database_path)
+            os.makedirs(app.instance_path, exist_ok=True)
+        enable_writer_queue(database_path)
+    logger.info("SQLite mode enabled: WAL, synchronous=NORMAL, single-writer queue")
+    return True
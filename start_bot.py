@@ -6,19 +6,7 @@ import asyncio
 import logging
 import os
 import sys
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from app import app
-from models import init_default_data
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 async def main():
@@ -31,22 +19,34 @@ async def main():
         logger.info("Please set BOT_TOKEN environment variable with your bot token from @BotFather")
         sys.exit(1)
     
-    # Initialize database
-    with app.app_context():
-        init_default_data()
-        logger.info("Database initialized")
+    # aiogram is imported only once the token is known to be usable
+    from aiogram import Bot, Dispatcher
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from bot_session import create_bot_session
+    from update_executor import ChatEventIsolation
     
     # Create bot and dispatcher
-    bot = Bot(token=bot_token)
+    bot = Bot(token=bot_token, session=create_bot_session())
     storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    # One chat's updates run in order, different chats run concurrently
+    dp = Dispatcher(storage=storage, events_isolation=ChatEventIsolation())
     
     # Import and register handlers
     from bot_handlers import register_handlers
     register_handlers(dp)
     
+    from middlewares import CorrelationMiddleware, BanMiddleware, ThrottlingMiddleware
+    dp.update.outer_middleware(CorrelationMiddleware())
+    dp.update.outer_middleware(BanMiddleware())
+    dp.update.outer_middleware(ThrottlingMiddleware())
+    
     logger.info("Bot handlers registered")
     
+    # Deliver queued notifications alongside polling
+    from outbox import OutboxDispatcher
+    outbox_dispatcher = OutboxDispatcher(bot)
+    outbox_dispatcher.start()
+    
     # Start polling
     try:
         logger.info("Starting bot polling...")
@@ -54,9 +54,12 @@ async def main():
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
     finally:
+        await outbox_dispatcher.stop()
         await bot.session.close()
 
 if __name__ == "__main__":
+    from logging_setup import setup_logging
+    setup_logging('bot')
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
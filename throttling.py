@@ -0,0 +1,191 @@
+"""
+Per-user, per-action rate limiting for the bot
+
+Each (user, action) pair gets a token bucket. Buckets live in an LRU map
+bounded by THROTTLE_MAX_KEYS; buckets idle for longer than
+THROTTLE_IDLE_SECONDS are evicted, since a refilled bucket is the same as
+no bucket. Limits come from the 'throttle_limits' system setting, a JSON
+object such as {"start": {"rate": 0.1, "burst": 3}}, where rate is tokens
+per second, and are re-read every THROTTLE_SETTINGS_INTERVAL seconds.
+
+Counters are published to the 'throttle_metrics' setting on the same
+schedule, so the admin panel can show them without talking to the bot.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+LIMITS_KEY = 'throttle_limits'
+METRICS_KEY = 'throttle_metrics'
+THROTTLE_MAX_KEYS = int(os.environ.get("THROTTLE_MAX_KEYS", "50000"))
+THROTTLE_IDLE_SECONDS = float(os.environ.get("THROTTLE_IDLE_SECONDS", "600"))
+THROTTLE_SETTINGS_INTERVAL = float(os.environ.get("THROTTLE_SETTINGS_INTERVAL", "60"))
+
+# rate is tokens per second, burst is the bucket size
+DEFAULT_LIMITS = {
+    'start': {'rate': 0.2, 'burst': 3},
+    'select_plan': {'rate': 0.1, 'burst': 3},
+    'payment': {'rate': 0.1, 'burst': 2},
+    'command': {'rate': 0.5, 'burst': 5},
+    'callback': {'rate': 1.0, 'burst': 8},
+    'message': {'rate': 0.5, 'burst': 5},
+}
+
+# Callback data prefixes mapped to the action they are limited as
+CALLBACK_ACTIONS = (
+    ('select_plan_', 'select_plan'),
+    ('plan_', 'select_plan'),
+    ('payment_completed', 'payment'),
+)
+
+
+def classify(event):
+    """Return the throttled action of an Update, or None for other update types"""
+    if event.message is not None:
+        text = event.message.text or ''
+        if text.startswith('/start'):
+            return 'start'
+        if text.startswith('/'):
+            return 'command'
+        return 'message'
+    if event.callback_query is not None:
+        data = event.callback_query.data or ''
+        for prefix, action in CALLBACK_ACTIONS:
+            if data.startswith(prefix):
+                return action
+        return 'callback'
+    return None
+
+
+def parse_limits(raw):
+    """Merge the JSON setting over DEFAULT_LIMITS, ignoring malformed entries"""
+    limits = {action: dict(limit) for action, limit in DEFAULT_LIMITS.items()}
+    if not raw:
+        return limits
+    try:
+        configured = json.loads(raw)
+    except ValueError:
+        logger.warning(f"Invalid {LIMITS_KEY} setting, using defaults")
+        return limits
+    for action, limit in configured.items():
+        try:
+            limits[action] = {'rate': float(limit['rate']), 'burst': float(limit['burst'])}
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Invalid throttle limit for {action}: {limit}")
+    return limits
+
+
+class Throttler:
+    """Token buckets per (user, action) in a bounded LRU map"""
+
+    def __init__(self, limits=None, max_keys=THROTTLE_MAX_KEYS, idle_seconds=THROTTLE_IDLE_SECONDS):
+        self.limits = limits or parse_limits(None)
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        # key -> [tokens, updated_at, notified]
+        self._buckets = OrderedDict()
+        self.allowed = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.evicted = 0
+
+    def hit(self, user_id, action, now=None):
+        """Take a token; returns (allowed, first_rejection)"""
+        limit = self.limits.get(action)
+        if limit is None:
+            return True, False
+        now = time.monotonic() if now is None else now
+        key = (user_id, action)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(limit['burst']), now, False]
+            self._evict(now)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit['burst'], bucket[0] + (now - bucket[1]) * limit['rate'])
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            self.allowed[action] += 1
+            return True, False
+
+        self.throttled[action] += 1
+        first = not bucket[2]
+        bucket[2] = True
+        return False, first
+
+    def _evict(self, now):
+        # Oldest entries first; stop at the first one still in use
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now - bucket[1] < self.idle_seconds:
+                break
+            del self._buckets[key]
+            self.evicted += 1
+
+    def snapshot(self):
+        return {
+            'allowed': dict(self.allowed),
+            'throttled': dict(self.throttled),
+            'buckets': len(self._buckets),
+            'evicted': self.evicted,
+            'limits': self.limits,
+        }
+
+
+class ThrottleSettings:
+    """Reloads limits and publishes metrics through system_settings"""
+
+    def __init__(self, throttler, interval=THROTTLE_SETTINGS_INTERVAL):
+        self.throttler = throttler
+        self.interval = interval
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def due(self):
+        return time.monotonic() - self._synced_at >= self.interval
+
+    def sync(self):
+        """Read limits and write metrics; safe to call from a worker thread"""
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            from app import app, db
+            from models import SystemSettings, insert_ignore
+            with app.app_context():
+                raw = db.session.execute(
+                    db.select(SystemSettings.value).where(SystemSettings.key == LIMITS_KEY)
+                ).scalar()
+                self.throttler.limits = parse_limits(raw)
+
+                metrics = json.dumps(dict(self.throttler.snapshot(), pid=os.getpid(), ts=time.time()))
+                insert_ignore(SystemSettings, [{
+                    'key': METRICS_KEY, 'value': metrics,
+                    'description': 'Счетчики ограничения частоты запросов бота',
+                }], 'key')
+                db.session.execute(
+                    db.update(SystemSettings).where(SystemSettings.key == METRICS_KEY).values(value=metrics)
+                )
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Не удалось синхронизировать настройки ограничений: {e}")
+        finally:
+            self._synced_at = time.monotonic()
+            self._lock.release()
+
+
+def read_metrics():
+    """Latest throttle metrics published by the bot, or None"""
+    from app import db
+    from models import SystemSettings
+    raw = db.session.execute(
+        db.select(SystemSettings.value).where(SystemSettings.key == METRICS_KEY)
+    ).scalar()
+    return json.loads(raw) if raw else None
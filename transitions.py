@@ -0,0 +1,142 @@
+"""
+Order state machine
+
+ORDER_TRANSITIONS in models.py lists which statuses an order may move to.
+transition_order() applies a change with a single conditional statement:
+
+    UPDATE orders SET status = :new, previous_status = status, version = version + 1
+    WHERE id = :id AND status IN (:allowed) [AND version = :expected]
+    RETURNING ...
+
+so a concurrent admin or bot update can never be silently overwritten and
+no SELECT is needed before or after. The event log and the admin live feed
+are fed from the returned row.
+"""
+
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select, update
+from models import Order, OrderStatus, ORDER_TRANSITIONS, User
+from events import emit_status_change, status_change
+from families import release_order_slot
+from funnel import log_order_event
+from messages import resolve_locale, text
+from outbox import enqueue
+
+logger = logging.getLogger(__name__)
+
+Transition = namedtuple('Transition', 'order_id user_id plan_id old_status status version returned')
+
+
+class IllegalTransition(ValueError):
+    """No status can move to the requested one"""
+
+
+class TransitionConflict(Exception):
+    """The order is missing, in a status that cannot move, or was changed concurrently"""
+
+    def __init__(self, order_id, status):
+        super().__init__(f"Order {order_id} cannot move to {status.value}")
+        self.order_id = order_id
+        self.status = status
+
+
+def allowed_sources(status):
+    """Statuses an order may be in to move to `status`"""
+    return [source for source, targets in ORDER_TRANSITIONS.items() if status in targets]
+
+
+def can_transition(old_status, new_status):
+    return new_status in ORDER_TRANSITIONS.get(old_status, ())
+
+
+def transition_order(session, order_id, new_status, expected_version=None, returning=(), conditions=(),
+                     **values):
+    """Move an order to `new_status` in one statement
+
+    Extra column values are written by the same UPDATE, extra `conditions`
+    join its WHERE clause, and columns named in `returning` come back in
+    Transition.returned. Raises IllegalTransition
+    for a status nothing can reach and TransitionConflict when no row
+    matched. The caller commits.
+    """
+    new_status = OrderStatus(new_status)
+    sources = allowed_sources(new_status)
+    if not sources:
+        raise IllegalTransition(f"No order can move to {new_status.value}")
+
+    now = datetime.utcnow()
+    if new_status == OrderStatus.COMPLETED:
+        values.setdefault('completed_at', now)
+
+    condition = [Order.id == order_id, Order.status.in_(sources)]
+    if expected_version is not None:
+        condition.append(Order.version == expected_version)
+    condition.extend(conditions)
+    stmt = (update(Order)
+            .where(*condition)
+            .values(status=new_status, previous_status=Order.status,
+                    version=Order.version + 1, updated_at=now, **values)
+            .execution_options(synchronize_session=False))
+    columns = (Order.user_id, Order.plan_id, Order.previous_status, Order.version,
+               *(getattr(Order, name) for name in returning))
+
+    connection = session.connection(bind_arguments={'mapper': inspect(Order)})
+    if connection.dialect.update_returning:
+        row = session.execute(stmt.returning(*columns)).first()
+    else:
+        # No RETURNING (MySQL): the row is stable until commit once updated
+        row = None
+        if session.execute(stmt).rowcount == 1:
+            row = session.execute(select(*columns).where(Order.id == order_id)).first()
+    if row is None:
+        raise TransitionConflict(order_id, new_status)
+
+    user_id, plan_id, old_status, version = row[:4]
+    result = Transition(order_id, user_id, plan_id, old_status, new_status, version,
+                        dict(zip(returning, row[4:])))
+
+    # A loaded copy now has a stale version; reload it on next access
+    loaded = session.identity_map.get(session.identity_key(Order, order_id))
+    if loaded is not None:
+        session.expire(loaded)
+
+    log_order_event(connection, order_id, user_id, plan_id, old_status.value, new_status.value)
+    emit_status_change(connection, session, order_id, user_id, old_status.value, new_status.value)
+    logger.info(f"Order {order_id}: {old_status.value} -> {new_status.value} (v{version})")
+    return result
+
+
+# Order status -> message catalog key of the customer notification
+STATUS_NOTIFICATIONS = {
+    OrderStatus.PROCESSING: 'order_status_processing',
+    OrderStatus.COMPLETED: 'order_status_completed',
+    OrderStatus.CANCELLED: 'order_status_cancelled',
+    OrderStatus.REFUNDED: 'order_status_refunded',
+}
+
+
+def after_staff_transition(session, changed):
+    """Follow-ups of an operator's status change, in the same transaction
+
+    A cancelled or refunded order gives up its family seat (the member is
+    removed by hand, see families.py) and the customer is notified through
+    the outbox in their own language. The caller commits.
+    """
+    if changed.status in (OrderStatus.CANCELLED, OrderStatus.REFUNDED):
+        release_order_slot(session, changed.order_id)
+    key = STATUS_NOTIFICATIONS.get(changed.status)
+    if key:
+        language_code = session.execute(select(User.language_code).where(User.id == changed.user_id)).scalar()
+        enqueue(session, changed.user_id, text(key, resolve_locale(language_code), order_id=changed.order_id),
+                kind='order_status')
+
+
+@event.listens_for(Order, 'before_update')
+def _remember_previous_status(mapper, connection, target):
+    # Keeps previous_status right for plain ORM assignments too
+    change = status_change(target)
+    if change and change[0] is not None:
+        target.previous_status = OrderStatus(change[0])
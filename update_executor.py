@@ -0,0 +1,114 @@
+"""
+Порядок апдейтов внутри чата при параллельной обработке разных чатов
+
+Поллинг aiogram запускает каждый апдейт отдельной задачей, поэтому два
+быстрых нажатия одного пользователя обрабатываются одновременно и шаги
+FSM (выбор плана -> логин -> оплата) читают и пишут состояние вперемешку.
+
+ChatEventIsolation подключается к диспетчеру как events_isolation:
+FSMContextMiddleware захватывает ее до чтения состояния и держит до конца
+обработчика. На каждый чат заводится своя очередь — asyncio.Lock, чьи
+ожидающие встают в порядке прихода апдейтов. Очередь создается при первом
+апдейте чата и удаляется, как только в ней никого не осталось, так что
+память растет с числом активных чатов, а не всех, кто когда-либо писал.
+
+Общий предел одновременно выполняемых обработчиков берется уже после
+очереди чата: апдейты, ждущие своей очереди, не занимают мест, и один
+пользователь, нажимающий кнопку десять раз, не тормозит остальных.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from aiogram.fsm.storage.base import BaseEventIsolation
+
+from config import UPDATE_CONCURRENCY, UPDATE_SLOW_WAIT_MS
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatQueue:
+    """Очередь апдейтов одного чата"""
+
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Задач, которые выполняются или ждут в очереди
+        self.users = 0
+
+
+class ChatEventIsolation(BaseEventIsolation):
+    """Последовательная обработка в пределах чата, параллельная — между чатами"""
+
+    def __init__(self, concurrency=UPDATE_CONCURRENCY, slow_wait_ms=UPDATE_SLOW_WAIT_MS):
+        self.concurrency = concurrency
+        self.slow_wait_ms = slow_wait_ms
+        self._queues = {}
+        self._slots = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self.running = 0
+        self.waiting = 0
+        self.handled = 0
+        self.peak_chats = 0
+
+    @staticmethod
+    def chat_key(key):
+        """Ключ очереди: чат, а не пара чат/пользователь из StorageKey"""
+        return key.bot_id, key.chat_id
+
+    @asynccontextmanager
+    async def lock(self, key):
+        chat = self.chat_key(key)
+        queue = self._queues.get(chat)
+        if queue is None:
+            queue = self._queues[chat] = _ChatQueue()
+            self.peak_chats = max(self.peak_chats, len(self._queues))
+        queue.users += 1
+        self.waiting += 1
+        started = time.perf_counter()
+        running = False
+        try:
+            async with queue.lock:
+                if self._slots is not None:
+                    await self._slots.acquire()
+                try:
+                    self.waiting -= 1
+                    self.running += 1
+                    running = True
+                    self._log_wait(chat, started)
+                    yield
+                finally:
+                    if self._slots is not None:
+                        self._slots.release()
+        finally:
+            if running:
+                self.running -= 1
+                self.handled += 1
+            else:
+                # Отменили, пока апдейт ждал очереди
+                self.waiting -= 1
+            queue.users -= 1
+            if not queue.users and self._queues.get(chat) is queue:
+                del self._queues[chat]
+
+    def _log_wait(self, chat, started):
+        waited_ms = (time.perf_counter() - started) * 1000
+        if waited_ms >= self.slow_wait_ms:
+            logger.info(f"Апдейт чата {chat[1]} ждал очереди {waited_ms:.0f} мс "
+                        f"(выполняется {self.running}, ждут {self.waiting})")
+
+    def stats(self):
+        """Текущая загрузка: активные чаты, выполняемые и ждущие апдейты"""
+        return {
+            'concurrency': self.concurrency,
+            'chats': len(self._queues),
+            'peak_chats': self.peak_chats,
+            'running': self.running,
+            'waiting': self.waiting,
+            'handled': self.handled,
+        }
+
+    async def close(self):
+        self._queues.clear()
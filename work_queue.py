@@ -0,0 +1,176 @@
+"""
+Operator work queue for paid orders
+
+Each operator claims the next batch of PAID orders, longest waiting since
+payment first. The payment time is that of the order's latest 'paid' event
+(funnel.py), or its creation time for orders older than the event log.
+A claim is a lease: claimed_by and claimed_until on the order, renewed while
+the operator works and dropped when the order moves on. Orders whose lease
+ran out go back to the queue, so a closed browser tab blocks nothing for
+longer than QUEUE_LEASE_SECONDS.
+
+On PostgreSQL the batch is picked with SELECT ... FOR UPDATE SKIP LOCKED, so
+operators claiming at the same moment get disjoint batches without waiting
+on each other's row locks. Elsewhere one conditional UPDATE stamps a random
+claim token on the batch and the claimed rows are read back by that token;
+SQLite serializes writers, so two such UPDATEs never take the same order.
+"""
+
+import logging
+import secrets
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select, update
+
+from config import QUEUE_CLAIM_BATCH, QUEUE_LEASE_SECONDS
+from models import Admin, Order, OrderEvent, OrderStatus, User
+
+logger = logging.getLogger(__name__)
+
+QUEUE_STATUS = OrderStatus.PAID
+
+
+
+def paid_at():
+    """When the order was paid: its latest 'paid' event, else its creation time"""
+    paid = (select(func.max(OrderEvent.created_at))
+            .where(OrderEvent.order_id == Order.id, OrderEvent.to_status == QUEUE_STATUS.value)
+            .correlate(Order)
+            .scalar_subquery())
+    return func.coalesce(paid, Order.created_at)
+
+
+_QUEUE_COLUMNS = (Order.id, Order.user_id, Order.plan_id, Order.spotify_login, Order.total_amount,
+                  Order.version, Order.created_at, Order.claimed_until, User.username, User.first_name)
+
+
+def claimable(now):
+    """Paid orders that nobody holds a live lease on"""
+    return and_(Order.status == QUEUE_STATUS,
+                or_(Order.claimed_until.is_(None), Order.claimed_until < now))
+
+
+def not_claimed_by_other(admin_id, now=None):
+    """Condition for changing an order: unclaimed, expired or held by `admin_id`"""
+    now = now or datetime.utcnow()
+    return or_(Order.claimed_by.is_(None), Order.claimed_by == admin_id,
+               Order.claimed_until.is_(None), Order.claimed_until < now)
+
+
+def release_values():
+    """Column values that drop a claim, for UPDATEs that move an order on"""
+    return {'claimed_by': None, 'claimed_until': None, 'claim_token': None}
+
+
+def _rows(session, where, now):
+    waiting_since = paid_at().label('paid_at')
+    query = (select(*_QUEUE_COLUMNS, waiting_since)
+             .join(User, User.id == Order.user_id)
+             .where(where)
+             .order_by(waiting_since, Order.id))
+    return [
+        {
+            'id': row.id,
+            'user_id': row.user_id,
+            'username': row.username,
+            'first_name': row.first_name,
+            'plan_id': row.plan_id,
+            'spotify_login': row.spotify_login,
+            'total_amount': row.total_amount,
+            'version': row.version,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'paid_at': row.paid_at.isoformat() if row.paid_at else None,
+            'waiting_seconds': int((now - row.paid_at).total_seconds()) if row.paid_at else None,
+            'claimed_until': row.claimed_until.isoformat() if row.claimed_until else None,
+        }
+        for row in session.execute(query)
+    ]
+
+
+def claim_orders(session, admin_id, limit=QUEUE_CLAIM_BATCH, lease_seconds=QUEUE_LEASE_SECONDS):
+    """Claim up to `limit` waiting orders for `admin_id`; the caller commits
+
+    Returns the claimed orders, longest waiting first. Commit promptly: on PostgreSQL
+    the row locks taken here are held until then.
+    """
+    now = datetime.utcnow()
+    token = secrets.token_hex(16)
+    values = {'claimed_by': admin_id, 'claimed_until': now + timedelta(seconds=lease_seconds),
+              'claim_token': token}
+    candidates = (select(Order.id)
+                  .where(claimable(now))
+                  .order_by(paid_at(), Order.id)
+                  .limit(limit))
+
+    if session.get_bind(mapper=Order).dialect.name == 'postgresql':
+        ids = session.execute(candidates.with_for_update(skip_locked=True)).scalars().all()
+        if not ids:
+            return []
+        session.execute(update(Order).where(Order.id.in_(ids)).values(**values)
+                        .execution_options(synchronize_session=False))
+    else:
+        # Claim-token fallback: re-check claimability in the UPDATE itself
+        claimed = session.execute(
+            update(Order)
+            .where(Order.id.in_(candidates.scalar_subquery()), claimable(now))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            return []
+
+    orders = _rows(session, Order.claim_token == token, now)
+    logger.info(f"Admin {admin_id} claimed {len(orders)} orders from the work queue")
+    return orders
+
+
+def renew_claims(session, admin_id, order_ids=None, lease_seconds=QUEUE_LEASE_SECONDS):
+    """Extend the operator's live leases (all of them by default); returns how many"""
+    now = datetime.utcnow()
+    condition = [Order.claimed_by == admin_id, Order.status == QUEUE_STATUS, Order.claimed_until >= now]
+    if order_ids:
+        condition.append(Order.id.in_(order_ids))
+    return session.execute(
+        update(Order).where(*condition)
+        .values(claimed_until=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def release_claims(session, admin_id, order_ids=None):
+    """Hand the operator's orders back to the queue; returns how many"""
+    condition = [Order.claimed_by == admin_id]
+    if order_ids:
+        condition.append(Order.id.in_(order_ids))
+    return session.execute(
+        update(Order).where(*condition).values(**release_values())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def my_claims(session, admin_id):
+    """Orders the operator currently holds, longest waiting first"""
+    now = datetime.utcnow()
+    return _rows(session, and_(Order.status == QUEUE_STATUS, Order.claimed_by == admin_id,
+                               Order.claimed_until >= now), now)
+
+
+def queue_overview(session):
+    """Queue depth, oldest wait and live claims per operator"""
+    now = datetime.utcnow()
+    waiting, oldest = session.execute(
+        select(func.count(), func.min(paid_at())).where(claimable(now))
+    ).one()
+    per_operator = session.execute(
+        select(Admin.id, Admin.username, func.count(Order.id))
+        .join(Order, Order.claimed_by == Admin.id)
+        .where(Order.status == QUEUE_STATUS, Order.claimed_until >= now)
+        .group_by(Admin.id, Admin.username)
+    ).all()
+    return {
+        'waiting': waiting,
+        'oldest_waiting_seconds': int((now - oldest).total_seconds()) if oldest else None,
+        'claimed': sum(count for _, _, count in per_operator),
+        'operators': [{'admin_id': admin_id, 'username': username, 'claimed': count}
+                      for admin_id, username, count in per_operator],
+    }